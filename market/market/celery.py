@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_init
 
 from django.conf import settings
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'market.settings')
@@ -8,4 +9,18 @@ app = Celery('market')
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def configure_prefetch(sender=None, **kwargs):
+    """
+    Выставляет prefetch multiplier воркера по очередям, которые он слушает (-Q).
+
+    Если воркер слушает несколько очередей, берётся наименьшее значение: долгие задачи
+    не должны забирать в буфер воркера сообщения, которые мог бы обработать другой воркер.
+    """
+    queues_config = getattr(settings, 'CELERY_QUEUES_CONFIG', {})
+    consumed = [name for name in sender.app.amqp.queues.consume_from if name in queues_config]
+    if consumed:
+        sender.prefetch_multiplier = min(queues_config[name]['prefetch_multiplier'] for name in consumed)
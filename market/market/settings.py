@@ -12,7 +12,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-import sentry_sdk
+from django.core.exceptions import ImproperlyConfigured
+from kombu import Exchange, Queue
 
 
 load_dotenv()
@@ -27,17 +28,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-i2zyh9pw_kswas^arb@w)rcj!-u2!ji1jq8(a8vvs%4wj4c)n2'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True') == 'True'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
 
 INSTALLED_APPS = [
-    'baton',
-
-    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -51,18 +49,37 @@ INSTALLED_APPS = [
 
     'djoser',
 
-    'django_extensions',
-
-    'drf_spectacular',
-    'drf_spectacular_sidecar',
     'celery',
     'cachalot',
     'django_redis',
-    'silk',
-    'baton.autodiscover', # последняя в списке
 ]
 
+# Необязательные приложения. Каждое замедляет старт процесса, поэтому в профиле
+# market.settings_production они выключены и включаются переменными окружения.
+# Админка (baton).
+ADMIN_ENABLED = os.getenv('ADMIN_ENABLED', 'True') == 'True'
+# Схема OpenAPI, Swagger UI и Redoc (drf_spectacular).
+API_DOCS_ENABLED = os.getenv('API_DOCS_ENABLED', 'True') == 'True'
+# Команды разработчика (django_extensions).
+DEV_TOOLS_ENABLED = os.getenv('DEV_TOOLS_ENABLED', 'True') == 'True'
+# Профилировщик silk. Его middleware только синхронное: под ASGI оно переводит каждый запрос
+# в поток, поэтому для ASGI его стоит отключать (SILK_ENABLED=False).
+SILK_ENABLED = os.getenv('SILK_ENABLED', 'True') == 'True'
+
+if ADMIN_ENABLED:
+    INSTALLED_APPS.insert(0, 'baton')
+    INSTALLED_APPS.insert(1, 'django.contrib.admin')
+if DEV_TOOLS_ENABLED:
+    INSTALLED_APPS.append('django_extensions')
+if API_DOCS_ENABLED:
+    INSTALLED_APPS += ['drf_spectacular', 'drf_spectacular_sidecar']
+if SILK_ENABLED:
+    INSTALLED_APPS.append('silk')
+if ADMIN_ENABLED:
+    INSTALLED_APPS.append('baton.autodiscover')  # последняя в списке
+
 MIDDLEWARE = [
+    'marketAPI.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,10 +87,15 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'silk.middleware.SilkyMiddleware',
+    'marketAPI.middleware.ASGIURLConfMiddleware',
+    'marketAPI.profiling.ProfilingMiddleware',
 ]
+if SILK_ENABLED:
+    MIDDLEWARE.append('silk.middleware.SilkyMiddleware')
 
 ROOT_URLCONF = 'market.urls'
+# Под ASGI каталог и корзина обслуживаются async-представлениями.
+ASGI_URLCONF = 'market.urls_asgi'
 
 TEMPLATES = [
     {
@@ -97,12 +119,63 @@ WSGI_APPLICATION = 'market.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# База данных выбирается переменной окружения DATABASE_ENGINE:
+# sqlite (по умолчанию) - один узел, файл в режиме WAL;
+# postgresql - продакшен, постоянные соединения или пул соединений psycopg.
+DATABASE_ENGINE = os.getenv('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DATABASE_NAME', 'market'),
+            'USER': os.getenv('DATABASE_USER', 'market'),
+            'PASSWORD': os.getenv('DATABASE_PASSWORD', ''),
+            'HOST': os.getenv('DATABASE_HOST', '127.0.0.1'),
+            'PORT': os.getenv('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    if os.getenv('DATABASE_POOL_MAX_SIZE'):
+        # Пул psycopg заменяет постоянные соединения: Django не позволяет использовать их вместе.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE')),
+            'timeout': int(os.getenv('DATABASE_POOL_TIMEOUT', 10)),
+        }
+elif DATABASE_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+            'OPTIONS': {
+                # Оформление заказа списывает остатки условным UPDATE: транзакции сразу берут
+                # блокировку на запись и ждут друг друга, а не падают с "database is locked".
+                'transaction_mode': 'IMMEDIATE',
+                # Сколько ждать блокировку на запись (busy timeout), секунд.
+                'timeout': 20,
+                # WAL: чтение не блокируется записью; synchronous=NORMAL безопасен в режиме WAL
+                # и не делает fsync на каждую транзакцию.
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            },
+            # Файловая тестовая БД, чтобы нагрузочные тесты могли писать из нескольких потоков.
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f'Unknown DATABASE_ENGINE: {DATABASE_ENGINE}')
 
 
 # Password validation
@@ -148,7 +221,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'marketAPI.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
 
@@ -156,15 +229,24 @@ REST_FRAMEWORK = {
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
 
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'marketAPI.throttling.AnonRateThrottle',
+        'marketAPI.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '30/minute',
         'user': '60/minute'
     },
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
+if API_DOCS_ENABLED:
+    REST_FRAMEWORK['DEFAULT_SCHEMA_CLASS'] = 'drf_spectacular.openapi.AutoSchema'
+
+# Как часто процесс сверяет справочники (типы пользователей, категории) с версией в общем кэше.
+REFERENCE_CACHE_CHECK_INTERVAL = 5
+
+# Кэш аутентификации по токену: общий кэш и LRU-кэш каждого процесса.
+AUTH_TOKEN_CACHE_TIMEOUT = 60 * 5
+AUTH_TOKEN_LOCAL_CACHE_TTL = 5
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 1024
 
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND")
 EMAIL_HOST = os.getenv("EMAIL_HOST")
@@ -172,6 +254,17 @@ EMAIL_PORT = os.getenv("EMAIL_PORT")
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS")
+# Адрес отправителя писем о заказах; по умолчанию - учётная запись SMTP.
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL") or EMAIL_HOST_USER or 'webmaster@localhost'
+
+# Outbox писем: пачки, ограничение скорости (писем в секунду, 0 - без ограничения), повторы с паузой,
+# удваивающейся с каждой попыткой (секунды)
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_RATE_LIMIT = 10
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BACKOFF = 30
+EMAIL_OUTBOX_LEASE = 300
+EMAIL_OUTBOX_RETENTION_DAYS = 30
 
 AUTH_USER_MODEL = 'marketAPI.User'
 
@@ -207,6 +300,41 @@ SPECTACULAR_SETTINGS = {
     'REDOC_DIST': 'SIDECAR',
 }
 
+# Схема OpenAPI строится при деплое (manage.py build_openapi_schema) и отдаётся из файла.
+# Если файла нет, схема строится первым запросом и хранится в кэше (секунды).
+OPENAPI_SCHEMA_FILE = os.getenv('OPENAPI_SCHEMA_FILE', BASE_DIR / 'openapi.json')
+OPENAPI_SCHEMA_CACHE_TIMEOUT = 60 * 60
+
+# Списки админки для таблиц больше этого числа строк показывают число строк по статистике базы данных.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+
+# Повторы POST /orders/ с заголовком Idempotency-Key (секунды)
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+
+# Каталог кэшируется версионным кэшем marketAPI.catalog_cache с инвалидацией по магазинам,
+# поэтому cachalot не должен сбрасывать все запросы к этим таблицам при каждой загрузке.
+CACHALOT_UNCACHABLE_TABLES = frozenset((
+    'django_migrations',
+    'marketAPI_product',
+    'marketAPI_extraparameter',
+    # Журнал изменений каталога пишется каждым заказом, а запрос к нему каждый раз с новым временем.
+    'marketAPI_catalogchange',
+))
+CATALOG_CACHE_TIMEOUT = 60 * 15
+# Пересчёт истёкшей записи каталога выполняет один запрос, остальные ждут или получают старое значение.
+CATALOG_CACHE_LOCK_TIMEOUT = 10
+CATALOG_CACHE_WAIT_TIMEOUT = 5
+# Коэффициент вероятностного раннего обновления (XFetch), 0 отключает его.
+CATALOG_CACHE_EARLY_REFRESH_BETA = 1.0
+
+# Журнал изменений каталога (GET products/changes/): записей на странице, задержка перед выдачей
+# записи (секунды, чтобы не перескочить ещё не зафиксированные транзакции) и срок хранения (дни).
+CATALOG_CHANGES_PAGE_SIZE = 500
+CATALOG_CHANGES_SETTLE_SECONDS = 2
+CATALOG_CHANGES_RETENTION_DAYS = 7
+
 REDIS_HOST = '127.0.0.1'
 REDIS_PORT = 6379
 
@@ -215,18 +343,122 @@ CELERY_BROKER_URL = 'redis://localhost:6379/0'  # Замените на URL ва
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-email-outbox': {
+        'task': 'marketAPI.tasks.dispatch_email_outbox',
+        'schedule': 30.0,
+    },
+    'purge-email-outbox': {
+        'task': 'marketAPI.tasks.purge_email_outbox',
+        'schedule': 60.0 * 60 * 24,
+    },
+    'purge-catalog-changes': {
+        'task': 'marketAPI.tasks.purge_catalog_changes',
+        'schedule': 60.0 * 60 * 24,
+    },
+}
+
+# Очереди Celery. Письма не должны ждать за долгими загрузками каталогов, поэтому у каждой
+# очереди свои воркеры, например:
+#   celery -A market worker -Q notifications -c 4
+#   celery -A market worker -Q imports -c 2
+#   celery -A market worker -Q maintenance,default -c 1
+# prefetch_multiplier применяется к воркеру по очередям, которые он слушает (см. market/celery.py),
+# остальные параметры - к задачам, направленным в очередь. Приоритет 0-9: транспорт Redis опрашивает
+# priority_steps по возрастанию во всех очередях сразу, поэтому меньше - важнее (у RabbitMQ наоборот).
+CELERY_QUEUES_CONFIG = {
+    'notifications': {'priority': 0, 'prefetch_multiplier': 4, 'acks_late': False,
+                      'time_limit': 60, 'soft_time_limit': 45},
+    'imports': {'priority': 6, 'prefetch_multiplier': 1, 'acks_late': True,
+                'time_limit': 30 * 60, 'soft_time_limit': 28 * 60},
+    'maintenance': {'priority': 9, 'prefetch_multiplier': 1, 'acks_late': True,
+                    'time_limit': 60 * 60, 'soft_time_limit': 55 * 60},
+    'default': {'priority': 3, 'prefetch_multiplier': 4, 'acks_late': False,
+                'time_limit': 5 * 60, 'soft_time_limit': 4 * 60},
+}
+CELERY_TASK_QUEUE_MAP = {
+    'marketAPI.tasks.dispatch_email_outbox': 'notifications',
+    'marketAPI.tasks.import_partner_catalog': 'imports',
+    'marketAPI.tasks.purge_email_outbox': 'maintenance',
+    'marketAPI.tasks.purge_catalog_changes': 'maintenance',
+}
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = [Queue(name, Exchange(name), routing_key=name) for name in CELERY_QUEUES_CONFIG]
+CELERY_TASK_ROUTES = {
+    task: {'queue': queue, 'priority': CELERY_QUEUES_CONFIG[queue]['priority']}
+    for task, queue in CELERY_TASK_QUEUE_MAP.items()
+}
+CELERY_TASK_ANNOTATIONS = {
+    task: {option: CELERY_QUEUES_CONFIG[queue][option] for option in ('acks_late', 'time_limit', 'soft_time_limit')}
+    for task, queue in CELERY_TASK_QUEUE_MAP.items()
+}
+CELERY_TASK_DEFAULT_PRIORITY = CELERY_QUEUES_CONFIG['default']['priority']
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'queue_order_strategy': 'priority',
+}
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+
+# Каталоги с большим числом товаров загружаются в очереди imports, а не в запросе
+PARTNER_IMPORT_ASYNC_THRESHOLD = 500
+
+# Профилирование: полная запись silk и трассировка Sentry только для доли запросов,
+# медленные запросы записываются всегда (см. marketAPI/profiling.py).
+# PROFILING_ENABLED=False - аварийное отключение всего профилирования.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.01))
+# Ставки по префиксам путей, побеждает самый длинный префикс.
+PROFILING_ROUTE_RATES = {
+    '/orders/': 0.05,
+    '/update/': 0.5,
+    '/admin/': 0.0,
+    '/silk/': 0.0,
+    '/metrics': 0.0,
+}
+# Запросы дольше порога записываются в silk с SQL-запросами; пустое значение или 0 отключает запись.
+PROFILING_SLOW_REQUEST_MS = int(os.getenv('PROFILING_SLOW_REQUEST_MS', 1000) or 0) or None
+
+
+# Обёртки импортируют marketAPI.profiling при вызове: модуль настроек не должен импортировать
+# приложение (а с ним django.conf.settings) до того, как настройки загружены.
+def _should_intercept(request):
+    from marketAPI import profiling
+    return profiling.should_intercept(request)
+
+
+def _traces_sampler(sampling_context):
+    from marketAPI import profiling
+    return profiling.traces_sampler(sampling_context)
+
+
+SILKY_INTERCEPT_FUNC = _should_intercept
+
+# Метрики Prometheus на /metrics (см. marketAPI/metrics.py). 'redis' - суммировать
+# по всем процессам и воркерам Celery, 'local' - только счётчики отвечающего процесса.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_BACKEND = os.getenv('METRICS_BACKEND', 'redis')
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 10))
+# Если задан, /metrics требует заголовок Authorization: Bearer <токен>, иначе открыт только
+# для METRICS_ALLOWED_IPS (через запятую, по умолчанию - локальные адреса).
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
 
 #SENRY
-sentry_sdk.init(
-    dsn="https://17a60ebe481a48d1c64fb655b8d6f606@o4508176631463936.ingest.de.sentry.io/4508176633233488",
-    # Set traces_sample_rate to 1.0 to capture 100%
-    # of transactions for tracing.
-    traces_sample_rate=1.0,
-    # Set profiles_sample_rate to 1.0 to profile 100%
-    # of sampled transactions.
-    # We recommend adjusting this value in production.
-    profiles_sample_rate=1.0,
+# Пустой SENTRY_DSN отключает Sentry: sentry_sdk тогда не импортируется.
+SENTRY_DSN = os.getenv(
+    'SENTRY_DSN',
+    'https://17a60ebe481a48d1c64fb655b8d6f606@o4508176631463936.ingest.de.sentry.io/4508176633233488',
 )
+if SENTRY_DSN:
+    import sentry_sdk
+
+    sentry_sdk.init(
+        dsn=SENTRY_DSN,
+        # Доля транзакций выбирается так же, как для silk.
+        traces_sampler=_traces_sampler,
+        # Доля профилируемых среди выбранных транзакций.
+        profiles_sample_rate=float(os.getenv('SENTRY_PROFILES_SAMPLE_RATE', 0.1)),
+    )
 
 CACHES = {
     "default": {
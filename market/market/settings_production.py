@@ -0,0 +1,21 @@
+"""
+Профиль для продакшена: DJANGO_SETTINGS_MODULE=market.settings_production.
+
+Веб-процессы и воркеры Celery загружают только приложения, нужные API: без админки (baton),
+документации API (drf_spectacular), django_extensions и silk. Sentry подключается, только если
+задан SENTRY_DSN. Любую интеграцию можно вернуть переменной окружения, например ADMIN_ENABLED=True
+для отдельного процесса с админкой. Время старта: python manage.py startup_time.
+"""
+import os
+
+for name, value in {
+    'DEBUG': 'False',
+    'ADMIN_ENABLED': 'False',
+    'API_DOCS_ENABLED': 'False',
+    'DEV_TOOLS_ENABLED': 'False',
+    'SILK_ENABLED': 'False',
+    'SENTRY_DSN': '',
+}.items():
+    os.environ.setdefault(name, value)
+
+from .settings import *  # noqa: E402,F401,F403
@@ -1,11 +1,10 @@
-from baton.autodiscover import admin
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from marketAPI.metrics import metrics_view
 from marketAPI.views import UpdateUserAddressView, ProductView, PartnerUpdateView, OrderProductModelViewSet, \
-    BasketProductViewSet, trigger_error
-
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+    BasketProductViewSet, SalesReportView, ProductChangesView, trigger_error
 
 router = DefaultRouter()
 router.register(r'basket', BasketProductViewSet, basename='basket')
@@ -13,22 +12,40 @@ router.register(r'orders', OrderProductModelViewSet, basename='orders')
 
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('baton/', include("baton.urls")),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
     path('lk/address/', UpdateUserAddressView.as_view(), name='update-user-address'),
     path('update/', PartnerUpdateView.as_view(), name='partner-update'),
     path('products/', ProductView.as_view(), name='product-list'),
+    path('products/changes/', ProductChangesView.as_view(), name='product-changes'),
     path('product/<int:pk>/', ProductView.as_view(), name='product-detail'),
+    path('reports/sales/', SalesReportView.as_view(), name='sales-report'),
     path('', include(router.urls)),
 
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-
-    path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    path('metrics', metrics_view, name='metrics'),
 
     path('sentry-debug/', trigger_error), # check sentry
 ]
 
-urlpatterns += [path('silk/', include('silk.urls', namespace='silk'))]
+if settings.ADMIN_ENABLED:
+    from baton.autodiscover import admin
+
+    urlpatterns = [
+        path('admin/', admin.site.urls),
+        path('baton/', include("baton.urls")),
+    ] + urlpatterns
+
+if settings.API_DOCS_ENABLED:
+    from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
+
+    from marketAPI.schema import schema_view
+
+    urlpatterns += [
+        path('api/schema/', schema_view, name='schema'),
+
+        path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+        path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    ]
+
+if settings.SILK_ENABLED:
+    urlpatterns += [path('silk/', include('silk.urls', namespace='silk'))]
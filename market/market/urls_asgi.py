@@ -0,0 +1,15 @@
+"""
+URL-схема для ASGI: каталог и корзина обслуживаются async-представлениями,
+остальные адреса - те же, что в market/urls.py.
+"""
+from django.urls import path
+
+from marketAPI import async_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('products/', async_views.products, name='product-list'),
+    path('product/<int:pk>/', async_views.products, name='product-detail'),
+    path('basket/', async_views.basket, name='basket-list'),
+] + sync_urlpatterns
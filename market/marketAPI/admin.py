@@ -1,16 +1,80 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import User, Shop, UserType, Order, OrderProduct, Product, ProductCategory, ExtraParameter, Basket, BasketProduct
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .models import User, Shop, UserType, Order, OrderProduct, Product, ProductCategory, ExtraParameter, Basket, BasketProduct, \
+    EmailOutbox
+
+
+def estimated_count(model, using='default'):
+    """
+    Число строк таблицы по статистике планировщика, без COUNT(*).
+
+    PostgreSQL хранит оценку в pg_class.reltuples (обновляется autovacuum и ANALYZE),
+    SQLite - в sqlite_stat1 после ANALYZE.
+
+    Возвращает:
+        int | None: Оценка или None, если статистики ещё нет.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)',
+                           [connection.ops.quote_name(table)])
+            row = cursor.fetchone()
+            # -1: таблицу ещё ни разу не анализировали.
+            return int(row[0]) if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # Первое число в stat - строк в таблице, одинаково для всех её индексов.
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор списка без фильтров и поиска берёт число строк из статистики базы данных,
+    если таблица больше ADMIN_ESTIMATED_COUNT_THRESHOLD строк. Точный COUNT(*) на такой
+    таблице - полный проход по ней на каждое открытие списка.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Список для таблиц, растущих вместе с каталогом и заказами: приблизительное число строк
+    и без второго COUNT(*) всей таблицы для надписи «из N» при фильтрации.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = ('email', 'first_name', 'last_name', 'is_active', 'is_staff')
-    search_fields = ('email', 'first_name', 'last_name')
+    search_fields = ('^email', '^last_name')
     list_filter = ('is_active', 'is_staff')
+    raw_id_fields = ('shop',)
 
 @admin.register(Shop)
 class ShopAdmin(admin.ModelAdmin):
     list_display = ('name', 'accepting_status', 'url')
-    search_fields = ('name',)
+    search_fields = ('^name',)
 
 @admin.register(UserType)
 class UserTypeAdmin(admin.ModelAdmin):
@@ -21,19 +85,24 @@ class UserTypeAdmin(admin.ModelAdmin):
 class OrderProductInline(admin.TabularInline):
     model = OrderProduct
     extra = 0
+    raw_id_fields = ('product', 'shop')
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ('user', 'created_at', 'total_price', 'status')
     list_filter = ('status',)
-    search_fields = ('user__email',)
+    list_select_related = ('user',)
+    search_fields = ('^user__email',)
+    raw_id_fields = ('user',)
     inlines = [OrderProductInline,]
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ('name', 'price', 'model', 'product_quantity', 'shop')
-    search_fields = ('name', 'model')
+    search_fields = ('^name', '^model')
     list_filter = ('shop',)
+    list_select_related = ('shop',)
+    autocomplete_fields = ('shop', 'category')
 
 @admin.register(ProductCategory)
 class ProductCategoryAdmin(admin.ModelAdmin):
@@ -41,16 +110,33 @@ class ProductCategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 @admin.register(ExtraParameter)
-class ExtraParameterAdmin(admin.ModelAdmin):
+class ExtraParameterAdmin(LargeTableAdmin):
     list_display = ('name', 'value', 'product')
-    search_fields = ('name', 'product__name')
+    search_fields = ('^product__name',)
+    list_select_related = ('product',)
+    autocomplete_fields = ('product',)
 
 @admin.register(Basket)
-class BasketAdmin(admin.ModelAdmin):
+class BasketAdmin(LargeTableAdmin):
     list_display = ('user',)
-    search_fields = ('user__email',)
+    list_select_related = ('user',)
+    search_fields = ('^user__email',)
+    raw_id_fields = ('user',)
 
 @admin.register(BasketProduct)
-class BasketProductAdmin(admin.ModelAdmin):
-    list_display = ('basket', 'product', 'quantity')
-    search_fields = ('basket__user__email', 'product__name')
\ No newline at end of file
+class BasketProductAdmin(LargeTableAdmin):
+    list_display = ('customer', 'product', 'quantity')
+    list_select_related = ('basket__user', 'product')
+    search_fields = ('^basket__user__email', '^product__name')
+    raw_id_fields = ('basket', 'product')
+
+    @admin.display(description='customer', ordering='basket__user__email')
+    def customer(self, obj):
+        return obj.basket.user
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(LargeTableAdmin):
+    list_display = ('recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient',)
+    raw_id_fields = ('order', 'shop')
@@ -0,0 +1,54 @@
+import asyncio
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def _redis_client():
+    """
+    Асинхронный клиент Redis для кэша по умолчанию или None, если кэш не django_redis.
+
+    Клиент привязан к циклу событий, поэтому создаётся отдельно для каждого цикла.
+    Ключи и значения кодируются так же, как в django_redis, и совпадают с синхронным кэшем.
+    """
+    config = settings.CACHES['default']
+    if not config['BACKEND'].startswith('django_redis.'):
+        return None
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        from redis import asyncio as redis_asyncio
+        location = config['LOCATION']
+        if isinstance(location, (list, tuple)):
+            location = location[0]
+        client = _clients[loop] = redis_asyncio.Redis.from_url(location)
+    return client
+
+
+async def get_many(keys):
+    """
+    Асинхронный аналог cache.get_many(): одно обращение к Redis без перехода в поток.
+
+    Для других кэшей используется cache.aget_many().
+    """
+    keys = list(keys)
+    client = _redis_client()
+    if client is None:
+        return await cache.aget_many(keys)
+
+    values = await client.mget([cache.make_key(key) for key in keys])
+    return {key: cache.client.decode(value) for key, value in zip(keys, values) if value is not None}
+
+
+def script(source):
+    """
+    Возвращает зарегистрированный Lua-скрипт для асинхронного клиента или None.
+    """
+    client = _redis_client()
+    if client is None:
+        return None
+    return client.register_script(source)
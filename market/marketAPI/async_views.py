@@ -0,0 +1,154 @@
+"""
+Async-версии самых нагруженных представлений: каталог и корзина.
+
+DRF не поддерживает async-представления, поэтому это обычные async-представления Django,
+которые повторяют ответы ProductView и BasketProductViewSet (list, create): аутентификация
+по токену, троттлинг, ошибки в формате DRF. Сессионная и Basic-аутентификация не поддерживаются.
+Подключаются через market/urls_asgi.py только под ASGI (ASGIURLConfMiddleware), под WSGI
+работают синхронные представления.
+"""
+import json
+from functools import wraps
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from rest_framework import exceptions, status
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import catalog_cache
+from .authentication import aauthenticate
+from .models import Basket, BasketProduct, Product, Shop
+from .serializer import BasketProductSerializer, DetailedProductSerializer, ProductSerializer
+from .throttling import athrottle
+from .views import catalog_entries, merge_catalog
+
+
+def to_int(value):
+    """
+    Целое из JSON или формы, как в полях DRF: bool, дробные числа и строки вроде '--5' или '²' не принимаются.
+
+    Исключения:
+        ValueError: Значение не является целым числом.
+    """
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return int(str(value))
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # Кодировщик DRF: Decimal, даты и ленивые строки сериализуются так же, как в Response.
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def api_view(methods):
+    """
+    Аутентификация, троттлинг и ошибки в формате DRF для async-представлений.
+
+    Параметры:
+        methods (list): Разрешённые HTTP-методы.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                request.user = await aauthenticate(request) or AnonymousUser()
+                await athrottle(request)
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as e:
+                response = json_response({'detail': e.detail}, status=e.status_code)
+                if isinstance(e, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    response['WWW-Authenticate'] = 'Token'
+                if getattr(e, 'wait', None):
+                    response['Retry-After'] = str(int(e.wait))
+                return response
+        # Как в DRF: CSRF проверяется только для сессионной аутентификации, здесь её нет.
+        return csrf_exempt(wrapper)
+    return decorator
+
+
+@api_view(['GET'])
+async def products(request, pk=None):
+    """
+    Async-версия ProductView.get: список товаров или детали товара.
+
+    Если все магазины есть в кэше каталога, ответ собирается без обращения к базе данных
+    и без перехода в поток, кроме запроса списка магазинов.
+    """
+    if pk is None:
+        category = request.GET.get('category')
+        if category is not None and not category.isdecimal():
+            return json_response({'Status': False, 'Error': 'Invalid category'}, status=status.HTTP_400_BAD_REQUEST)
+
+        shop_ids = [shop_id async for shop_id in
+                    Shop.objects.filter(accepting_status=True).values_list('pk', flat=True)]
+        shop_products = await catalog_cache.acached_querysets(catalog_entries(shop_ids, category))
+        return json_response(ProductSerializer(merge_catalog(shop_products), many=True).data)
+
+    found = await catalog_cache.acached_querysets(
+        [(Product.objects.filter(pk=pk).prefetch_related('extra_parameters'), [('product', pk)])]
+    )
+    if not found[0]:
+        return json_response({'Status': False, 'Error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+    return json_response(DetailedProductSerializer(found[0][0]).data)
+
+
+@api_view(['GET', 'POST'])
+async def basket(request):
+    """
+    Async-версия BasketProductViewSet.list и create.
+
+    GET возвращает позиции корзины с товарами одним запросом (пустой список без корзины),
+    POST добавляет позицию (тело: product, quantity) и требует аутентификации.
+    """
+    if request.method == 'GET':
+        if not request.user.is_authenticated:
+            return json_response([])
+        positions = [position async for position in
+                     BasketProduct.objects.filter(basket__user_id=request.user.pk).select_related('product')]
+        return json_response(BasketProductSerializer(positions, many=True).data)
+
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+
+    try:
+        data = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+    except ValueError:
+        raise exceptions.ParseError()
+
+    errors = {}
+    product_id = data.get('product')
+    quantity = data.get('quantity', 1)
+    if product_id in (None, ''):
+        errors['product'] = ['This field is required.']
+    else:
+        try:
+            product_id = to_int(product_id)
+        except ValueError:
+            errors['product'] = [f'Incorrect type. Expected pk value, received {type(product_id).__name__}.']
+        else:
+            if not await Product.objects.filter(pk=product_id).aexists():
+                errors['product'] = [f'Invalid pk "{product_id}" - object does not exist.']
+    try:
+        quantity = to_int(quantity)
+    except ValueError:
+        errors['quantity'] = ['A valid integer is required.']
+    else:
+        low, high = connection.ops.integer_field_range('IntegerField')
+        if not low <= quantity <= high:
+            errors['quantity'] = [f'Ensure this value is less than or equal to {high}.' if quantity > high
+                                  else f'Ensure this value is greater than or equal to {low}.']
+    if errors:
+        return json_response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    user_basket, _ = await Basket.objects.aget_or_create(user_id=request.user.pk)
+    if await BasketProduct.objects.filter(basket=user_basket, product_id=product_id).aexists():
+        return json_response({'non_field_errors': ['The fields basket, product must make a unique set.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+    position = await BasketProduct.objects.acreate(basket=user_basket, product_id=product_id, quantity=quantity)
+    return json_response({'id': position.pk, 'basket': user_basket.pk, 'product': position.product_id,
+                         'quantity': position.quantity}, status=status.HTTP_201_CREATED)
@@ -0,0 +1,188 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import DEFERRED
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from . import async_cache
+from .models import User
+
+# Поля пользователя в общем кэше: только то, что нужно для аутентификации и проверки прав.
+# Хэш пароля и личные данные в Redis не попадают, остальные поля загружаются из базы при обращении.
+CACHED_USER_FIELDS = ('id', 'is_active', 'is_staff', 'is_superuser', 'type_id', 'shop_id')
+
+
+def _token_key(key):
+    # В кэш не попадает сам токен, только его хэш.
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def _user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _user_from_cache(values):
+    """
+    Пользователь из записи общего кэша: поля CACHED_USER_FIELDS заполнены, остальные отложены.
+    """
+    if values is None:
+        return None
+    fields = [field.attname for field in User._meta.concrete_fields]
+    return User.from_db('default', fields, [values.get(name, DEFERRED) for name in fields])
+
+
+class _LocalCache:
+    """
+    Небольшой LRU-кэш процесса с ограниченным временем жизни записей.
+    """
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        ttl = settings.AUTH_TOKEN_LOCAL_CACHE_TTL
+        size = settings.AUTH_TOKEN_LOCAL_CACHE_SIZE
+        if not ttl or not size:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > size:
+                self._items.popitem(last=False)
+
+    def discard(self, key=None, user_id=None):
+        with self._lock:
+            if key is not None:
+                self._items.pop(key, None)
+            if user_id is not None:
+                for item_key in [item_key for item_key, (user, _) in self._items.items() if user.pk == user_id]:
+                    del self._items[item_key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+local_cache = _LocalCache()
+
+
+def invalidate_token(key):
+    """
+    Удаляет токен из кэша (выход из системы, удаление токена).
+    """
+    local_cache.discard(key=key)
+    cache.delete(_token_key(key))
+
+
+def invalidate_user(user_id):
+    """
+    Удаляет из кэша пользователя, например после смены пароля или деактивации.
+
+    Все его токены перестают находиться в кэше, следующий запрос снова проверит их по базе.
+    """
+    local_cache.discard(user_id=user_id)
+    cache.delete(_user_key(user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кэшированием пользователя.
+
+    Токен ищется сначала в LRU-кэше процесса (AUTH_TOKEN_LOCAL_CACHE_TTL секунд),
+    затем в общем кэше (AUTH_TOKEN_CACHE_TIMEOUT секунд) и только потом в базе данных.
+    В общем кэше токен хранит id пользователя, а пользователь - отдельную запись только с полями
+    CACHED_USER_FIELDS, поэтому смена пароля или деактивация сбрасывает все токены пользователя
+    одним удалением.
+    Записи сбрасываются сигналами из marketAPI.signals. Локальный кэш других процессов
+    не сбрасывается и устаревает не позже чем через AUTH_TOKEN_LOCAL_CACHE_TTL секунд.
+    """
+
+    def authenticate_credentials(self, key):
+        user = local_cache.get(key)
+        if user is None:
+            user = self._get_cached_user(key)
+            if user is None:
+                user = self._get_user(key)
+            local_cache.set(key, user)
+        return user, Token(key=key, user=user)
+
+    def _get_cached_user(self, key):
+        user_id = cache.get(_token_key(key))
+        if user_id is None:
+            return None
+        return _user_from_cache(cache.get(_user_key(user_id)))
+
+    def _get_user(self, key):
+        try:
+            token = Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        return _store(token)
+
+
+def _store(token):
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+    timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+    values = {field: getattr(token.user, field) for field in CACHED_USER_FIELDS}
+    cache.set_many({_token_key(token.key): token.user_id, _user_key(token.user_id): values}, timeout=timeout)
+    return token.user
+
+
+async def aauthenticate(request):
+    """
+    Асинхронная аутентификация по заголовку Authorization: Token <key> для async-представлений.
+
+    Порядок поиска тот же, что в CachedTokenAuthentication, общий кэш читается
+    асинхронным клиентом Redis.
+
+    Возвращает:
+        User или None, если заголовка нет.
+
+    Исключения:
+        AuthenticationFailed: Неверный заголовок или токен.
+    """
+    auth = request.headers.get('Authorization', '').split()
+    if not auth or auth[0].lower() != 'token':
+        return None
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed('Invalid token header.')
+    key = auth[1]
+
+    user = local_cache.get(key)
+    if user is not None:
+        return user
+
+    user_id = (await async_cache.get_many([_token_key(key)])).get(_token_key(key))
+    if user_id is not None:
+        user = _user_from_cache((await async_cache.get_many([_user_key(user_id)])).get(_user_key(user_id)))
+    if user is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        user = await sync_to_async(_store)(token)
+    local_cache.set(key, user)
+    return user
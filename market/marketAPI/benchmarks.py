@@ -0,0 +1,18 @@
+"""
+Общие функции для нагрузочных тестов и команд bench_*.
+"""
+
+
+def percentile(values, p):
+    """
+    Перцентиль по ближайшему рангу.
+
+    Параметры:
+        values (list): Измерения, например задержки в секундах.
+        p (int): Перцентиль от 0 до 100.
+
+    Возвращает:
+        Значение, которое не превышают p процентов измерений.
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
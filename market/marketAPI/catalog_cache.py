@@ -0,0 +1,176 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import async_cache, metrics, single_flight
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_local = threading.local()
+
+
+def _count(name, value=1):
+    with _stats_lock:
+        _stats[name] += value
+    if value:
+        metrics.catalog_cache_requests.inc(value, outcome=name)
+
+
+def stats():
+    """
+    Счётчики кэша каталога в текущем процессе: hits, stale, misses, early_refreshes, invalidations.
+    """
+    with _stats_lock:
+        return {name: _stats[name] for name in ('hits', 'stale', 'misses', 'early_refreshes', 'invalidations')}
+
+
+def _version_key(scope):
+    kind, pk = scope
+    return f'catalog:version:{kind}:{pk}'
+
+
+def get_versions(scopes):
+    """
+    Возвращает текущие версии областей каталога одним запросом к кэшу.
+
+    Область - пара (вид, id): ('shop', 1), ('category', 5), ('product', 42).
+    Версия - метка времени последней инвалидации, поэтому после вытеснения ключа из кэша
+    новая версия не совпадёт ни с одной из старых.
+    """
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = cache.get_many(list(keys.values()))
+    missing = {key: time.time_ns() for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {scope: found[key] for scope, key in keys.items()}
+
+
+async def aget_versions(scopes):
+    """
+    Асинхронный get_versions(): версии читаются без перехода в поток.
+
+    Возвращает:
+        dict: Версии найденных областей. Отсутствующие области не создаются.
+    """
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = await async_cache.get_many(keys.values())
+    return {scope: found[key] for scope, key in keys.items() if key in found}
+
+
+def _bump(scopes):
+    cache.set_many({_version_key(scope): time.time_ns() for scope in scopes}, timeout=None)
+    _count('invalidations', len(scopes))
+
+
+def invalidate(*scopes):
+    """
+    Сбрасывает закэшированные запросы, зависящие от указанных областей.
+
+    Версии меняются после фиксации текущей транзакции, чтобы параллельный запрос не успел
+    закэшировать старые данные под новой версией. Внутри deferred_invalidation() области
+    накапливаются и сбрасываются один раз при выходе из блока.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.update(scopes)
+        return
+    scopes = set(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+@contextmanager
+def deferred_invalidation():
+    """
+    Собирает инвалидации внутри блока (например, при загрузке каталога) и выполняет их один раз.
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = set()
+    try:
+        yield
+    finally:
+        pending, _local.pending = _local.pending, None
+        if pending:
+            invalidate(*pending)
+
+
+def _entry_key(name, scopes):
+    parts = ':'.join(f'{kind}{pk}' for kind, pk in sorted(scopes, key=str))
+    return f'catalog:{name}:{parts}'
+
+
+def _entry_version(scopes, versions):
+    return tuple(versions[scope] for scope in sorted(scopes, key=str))
+
+
+def _queryset_name(queryset):
+    return hashlib.md5(str(queryset.query).encode()).hexdigest()
+
+
+def cached_querysets(entries, timeout=None):
+    """
+    Возвращает результаты нескольких запросов каталога, вычисляя только отсутствующие в кэше.
+
+    Запись каждого запроса хранит версии его областей, поэтому загрузка каталога магазина X
+    сбрасывает только запросы, зависящие от магазина X. Кэш читается и пишется пачкой:
+    два-три обращения к кэшу вне зависимости от числа запросов.
+
+    Устаревшую или истекающую запись пересчитывает только один запрос (см. single_flight),
+    остальные в это время получают предыдущее значение.
+
+    Параметры:
+        entries (list): Пары (queryset, scopes).
+        timeout (int, optional): Время жизни записи, по умолчанию CATALOG_CACHE_TIMEOUT.
+
+    Возвращает:
+        list: Списки объектов для каждого запроса в том же порядке.
+    """
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    versions = get_versions({scope for _, scopes in entries for scope in scopes})
+
+    results = single_flight.fetch_many(
+        [(_entry_key(_queryset_name(queryset), scopes), _entry_version(scopes, versions),
+          lambda queryset=queryset: list(queryset))
+         for queryset, scopes in entries],
+        timeout=timeout,
+        lock_timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT,
+        wait_timeout=settings.CATALOG_CACHE_WAIT_TIMEOUT,
+        beta=settings.CATALOG_CACHE_EARLY_REFRESH_BETA,
+    )
+    outcomes = Counter(outcome for _, outcome in results)
+    _count('hits', outcomes[single_flight.HIT] + outcomes[single_flight.WAIT])
+    _count('stale', outcomes[single_flight.STALE])
+    _count('misses', outcomes[single_flight.MISS])
+    _count('early_refreshes', outcomes[single_flight.EARLY_REFRESH])
+    return [value for value, _ in results]
+
+
+async def acached_querysets(entries, timeout=None):
+    """
+    Асинхронный cached_querysets().
+
+    Если все записи свежие, ответ собирается двумя асинхронными обращениями к кэшу без
+    перехода в поток. При любом промахе вызывается cached_querysets() в потоке: пересчёт
+    обращается к базе данных и защищён блокировкой single_flight.
+    """
+    scopes = {scope for _, entry_scopes in entries for scope in entry_scopes}
+    versions = await aget_versions(scopes)
+    if len(versions) == len(scopes):
+        keys = [_entry_key(_queryset_name(queryset), entry_scopes) for queryset, entry_scopes in entries]
+        records = await async_cache.get_many(keys)
+        beta = settings.CATALOG_CACHE_EARLY_REFRESH_BETA
+        if all(single_flight.is_fresh(records.get(key), _entry_version(entry_scopes, versions), beta)
+               for key, (_, entry_scopes) in zip(keys, entries)):
+            _count('hits', len(entries))
+            return [records[key]['value'] for key in keys]
+    return await sync_to_async(cached_querysets)(entries, timeout=timeout)
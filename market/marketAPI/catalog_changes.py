@@ -0,0 +1,112 @@
+"""
+Журнал изменений каталога для инкрементальной синхронизации.
+
+Каждое изменение товара записывается в CatalogChange в той же транзакции, что и само изменение:
+загрузка каталога и резервирование остатков пишут журнал явно (bulk_create и update не отправляют
+сигналы), правки через админку и другие save()/delete() - через сигналы. Клиент получает курсор
+(GET products/changes/ без since), выгружает полный список products/ и дальше запрашивает только
+изменения после курсора: стоимость синхронизации зависит от числа изменений, а не от размера каталога.
+
+На PostgreSQL id записей выдаются до фиксации транзакций, поэтому запись с меньшим id может стать
+видимой позже записи с большим. Чтобы клиент не перескочил её, отдаются только записи старше
+CATALOG_CHANGES_SETTLE_SECONDS секунд.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import CatalogChange, Product
+
+
+class CursorExpired(Exception):
+    """
+    Записи после курсора удалены из журнала (CATALOG_CHANGES_RETENTION_DAYS): нужна полная синхронизация.
+    """
+
+
+def record(product_ids, action=CatalogChange.UPSERT):
+    """
+    Записывает изменения товаров в журнал одним запросом.
+
+    Параметры:
+        product_ids (iterable): id изменённых или удалённых товаров.
+        action (str): CatalogChange.UPSERT или CatalogChange.DELETE.
+    """
+    return CatalogChange.objects.bulk_create(
+        [CatalogChange(product_id=product_id, action=action) for product_id in sorted(set(product_ids))]
+    )
+
+
+def _settled():
+    return timezone.now() - timedelta(seconds=settings.CATALOG_CHANGES_SETTLE_SECONDS)
+
+
+def current_cursor():
+    """
+    Курсор, с которого клиент начинает получать изменения после полной выгрузки каталога.
+
+    Учитываются только устоявшиеся записи, как и в changes(): иначе курсор мог бы оказаться
+    за ещё не видимой записью с меньшим id, и клиент её пропустил бы.
+    """
+    return (CatalogChange.objects.filter(created_at__lte=_settled())
+            .order_by('-pk').values_list('pk', flat=True).first() or 0)
+
+
+def changes(since, limit=None):
+    """
+    Изменения каталога после курсора.
+
+    Несколько записей об одном товаре сворачиваются в последнюю. Данные товаров - текущие, поэтому
+    товар, удалённый после последней записи на странице, попадает в deleted.
+
+    Параметры:
+        since (int): Курсор из прошлого ответа.
+        limit (int, optional): Записей журнала на странице, по умолчанию CATALOG_CHANGES_PAGE_SIZE.
+
+    Возвращает:
+        dict: {'cursor': курсор для следующего запроса, 'has_more': есть ли ещё страницы,
+            'upserted': товары с параметрами (queryset), 'deleted': список id удалённых товаров}.
+
+    Исключения:
+        CursorExpired: Записи после since уже удалены из журнала.
+    """
+    limit = limit or settings.CATALOG_CHANGES_PAGE_SIZE
+    entries = list(
+        CatalogChange.objects.filter(pk__gt=since, created_at__lte=_settled())
+        .order_by('pk').values_list('pk', 'product_id', 'action')[:limit + 1]
+    )
+    if since and (not entries or entries[0][0] > since + 1):
+        oldest = CatalogChange.objects.order_by('pk').values_list('pk', flat=True).first()
+        if oldest is not None and oldest > since + 1:
+            raise CursorExpired(since)
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    latest = {}
+    for _, product_id, action in entries:
+        latest[product_id] = action
+
+    upserted = (Product.objects.filter(pk__in=[pk for pk, action in latest.items() if action == CatalogChange.UPSERT])
+                .prefetch_related('extra_parameters').order_by('pk'))
+    found = {product.pk for product in upserted}
+    return {
+        'cursor': entries[-1][0] if entries else since,
+        'has_more': has_more,
+        'upserted': upserted,
+        'deleted': sorted(pk for pk in latest if pk not in found),
+    }
+
+
+def purge():
+    """
+    Удаляет записи журнала старше CATALOG_CHANGES_RETENTION_DAYS дней. Последняя запись остаётся,
+    чтобы курсор не начинался заново.
+
+    Возвращает:
+        int: Количество удалённых записей.
+    """
+    border = timezone.now() - timedelta(days=settings.CATALOG_CHANGES_RETENTION_DAYS)
+    latest = CatalogChange.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    deleted, _ = CatalogChange.objects.filter(created_at__lt=border, pk__lt=latest).delete()
+    return deleted
@@ -0,0 +1,67 @@
+from django.db.models import Prefetch
+from django.template.loader import get_template
+
+from .models import Order, OrderProduct
+
+ORDER_CONFIRMATION = 'order_confirmation'
+SUPPLIER_DIGEST = 'supplier_digest'
+
+
+def load_orders(order_ids):
+    """
+    Загружает заказы для писем одним набором запросов вне зависимости от их числа и размера.
+
+    Позиции заказов хранят снимок товара, поэтому join с Product не нужен.
+
+    Возвращает:
+        dict: {order_id: Order}.
+    """
+    lines = OrderProduct.objects.select_related('shop__user').order_by('pk')
+    orders = Order.objects.filter(pk__in=order_ids).select_related('user').prefetch_related(
+        Prefetch('order_products', queryset=lines)
+    )
+    return {order.pk: order for order in orders}
+
+
+def order_confirmation(order):
+    """
+    Формирует письмо покупателю с подтверждением заказа.
+
+    Возвращает:
+        tuple: (email, subject, message).
+    """
+    message = get_template('marketAPI/emails/order_confirmation.txt').render(
+        {'order': order, 'lines': order.order_products.all()}
+    )
+    return order.user.email, 'Подтверждение заказа', message.strip()
+
+
+def supplier_digest(order, shop_id):
+    """
+    Формирует уведомление магазину о заказе: одно письмо со всеми позициями этого магазина.
+
+    Возвращает:
+        tuple: (email, subject, message).
+    """
+    lines = [line for line in order.order_products.all() if line.shop_id == shop_id]
+    shop = lines[0].shop
+    if len(lines) == 1:
+        subject = f"Уведомление о заказе: {lines[0].product_name} был заказан"
+    else:
+        subject = f"Уведомление о заказе: заказано товаров - {len(lines)}"
+    message = get_template('marketAPI/emails/supplier_digest.txt').render({'shop': shop, 'lines': lines})
+    return shop.user.email, subject, message.strip()
+
+
+def render(kind, order, shop_id=None):
+    """
+    Формирует письмо из outbox по его типу.
+
+    Возвращает:
+        tuple: (email, subject, message).
+    """
+    if kind == ORDER_CONFIRMATION:
+        return order_confirmation(order)
+    if kind == SUPPLIER_DIGEST:
+        return supplier_digest(order, shop_id)
+    raise ValueError(f'Unknown email kind: {kind}')
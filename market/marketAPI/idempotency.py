@@ -0,0 +1,88 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import locks
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def _fingerprint(request):
+    """
+    Хэш метода, пути и тела запроса: повтор с тем же ключом должен быть тем же запросом.
+    """
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response({'Status': False, 'Error': 'Idempotency-Key was already used with a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view_method):
+    """
+    Делает POST-обработчик идемпотентным по заголовку Idempotency-Key.
+
+    Первый запрос с ключом выполняется как обычно, его успешный ответ сохраняется в кэше
+    на IDEMPOTENCY_KEY_TTL секунд вместе с хэшем метода, пути и тела запроса. Повторы с тем же
+    ключом получают сохранённый ответ с заголовком Idempotent-Replayed и не обращаются
+    к базе данных, а повтор с другим телом получает ответ 422. Ошибки (например, 409 при
+    нехватке товара) не сохраняются: после исправления корзины повтор с тем же ключом выполнится
+    заново. Если первый запрос ещё выполняется, повтор ждёт его результата до
+    IDEMPOTENCY_WAIT_TIMEOUT секунд, а затем получает ответ 409. Ключи различаются для каждого
+    пользователя и пути.
+
+    Запросы без заголовка обрабатываются без изменений.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        cache_key = f'idempotency:{request.user.pk}:{request.path}:{key}'
+        lock_key = f'{cache_key}:lock'
+        fingerprint = _fingerprint(request)
+        token = locks.new_token()
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+
+        while True:
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            # Блокировку снимает только владелец (locks): её мог взять повтор после IDEMPOTENCY_LOCK_TIMEOUT.
+            if locks.acquire(lock_key, token, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                break
+
+            if time.monotonic() >= deadline:
+                return Response({'Status': False, 'Error': 'A request with this Idempotency-Key is in progress'},
+                                status=status.HTTP_409_CONFLICT)
+            time.sleep(0.05)
+
+        try:
+            # Первая попытка могла завершиться между проверкой кэша и захватом блокировки.
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            response = view_method(self, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                cache.set(cache_key, {'data': response.data, 'status': response.status_code,
+                                      'fingerprint': fingerprint},
+                          timeout=settings.IDEMPOTENCY_KEY_TTL)
+            return response
+        finally:
+            locks.release([lock_key], token)
+
+    return wrapper
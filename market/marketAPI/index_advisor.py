@@ -0,0 +1,349 @@
+"""
+Подбор индексов по записанным SQL-запросам.
+
+Запросы берутся из silk (SQLQuery: полная запись и медленные запросы ProfilingMiddleware)
+или собираются capture() через execute_wrapper. Одинаковые запросы с разными значениями
+объединяются в группы по нормализованному тексту, группы сортируются по суммарному времени.
+Для самых дорогих групп строится план (EXPLAIN QUERY PLAN на SQLite, EXPLAIN на PostgreSQL):
+если таблица модели marketAPI читается полным проходом, индекс предлагается по столбцам
+из условий на равенство, затем по одному столбцу из диапазона или сортировки. Каждое
+предложение проверяется: индекс создаётся в транзакции, которая откатывается, план строится
+заново, а запрос с записанными параметрами выполняется до и после создания индекса.
+"""
+import json
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.db import DatabaseError, connection, migrations, models, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+APP_LABEL = 'marketAPI'
+
+# Не больше стольких столбцов в предлагаемом индексе.
+MAX_COLUMNS = 3
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b'), '?'),
+    # silk подставляет строковые параметры в текст запроса без кавычек.
+    (re.compile(r'(=|<>|!=|<=|>=|<|>|\bLIKE)\s+(?![?"(]|T\d+\.|SELECT\b)[^\s,)]+', re.IGNORECASE), r'\1 ?'),
+    (re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE), 'IN (?)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+_COLUMN = r'(?:"(?P<table>\w+)"|(?P<alias>T\d+))\."(?P<column>\w+)"'
+_EQUALITY = re.compile(_COLUMN + r'\s*(?:=|\bIN\b|\bIS\b)', re.IGNORECASE)
+_RANGE = re.compile(_COLUMN + r'\s*(?:<=|>=|<|>|\bBETWEEN\b)', re.IGNORECASE)
+_ALIAS = re.compile(r'"(\w+)"\s+(?:AS\s+)?"?(T\d+)"?\b')
+_WHERE = re.compile(r'\bWHERE\b(.*?)(?=\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)', re.IGNORECASE | re.DOTALL)
+_ORDER_BY = re.compile(r'\bORDER BY\b(.*?)(?=\bLIMIT\b|\bOFFSET\b|$)', re.IGNORECASE | re.DOTALL)
+
+
+def normalize(sql):
+    """
+    Текст запроса без значений: литералы и параметры заменены на ?, списки IN (...) свёрнуты.
+    """
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+@dataclass
+class QueryGroup:
+    fingerprint: str
+    calls: int = 0
+    total_ms: float = 0.0
+    # Самый медленный вызов с параметрами, если они известны (capture()).
+    example: tuple = None
+    example_ms: float = -1.0
+
+    def add(self, sql, params, duration_ms):
+        self.calls += 1
+        self.total_ms += duration_ms
+        if params is not None and duration_ms > self.example_ms:
+            self.example, self.example_ms = (sql, params), duration_ms
+
+
+def group(samples):
+    """
+    Объединяет запросы в группы.
+
+    Параметры:
+        samples: Записи (sql, параметры или None, длительность в мс).
+
+    Возвращает:
+        list[QueryGroup]: Группы по убыванию суммарного времени.
+    """
+    groups = {}
+    for sql, params, duration_ms in samples:
+        fingerprint = normalize(sql)
+        groups.setdefault(fingerprint, QueryGroup(fingerprint)).add(sql, params, duration_ms)
+    return sorted(groups.values(), key=lambda item: -item.total_ms)
+
+
+def from_silk(since=None):
+    """
+    Запросы из silk: (sql, None, длительность в мс). Параметры silk не хранит.
+    """
+    from silk.models import SQLQuery
+
+    queries = SQLQuery.objects.all()
+    if since is not None:
+        queries = queries.filter(start_time__gte=since)
+    rows = queries.values_list('query', 'start_time', 'end_time', 'time_taken')
+    for sql, start, end, time_taken in rows.iterator():
+        # Медленные запросы ProfilingMiddleware записываются bulk_create без time_taken.
+        if time_taken is None:
+            time_taken = (end - start).total_seconds() * 1000 if start and end else 0.0
+        yield sql, None, time_taken
+
+
+@contextmanager
+def capture():
+    """
+    Собирает запросы текущего соединения внутри блока with: (sql, параметры, длительность в мс).
+    """
+    samples = []
+
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not many:
+                samples.append((sql, params, (time.perf_counter() - started) * 1000))
+
+    with connection.execute_wrapper(wrapper):
+        yield samples
+
+
+def _runnable(query_group):
+    """
+    Запрос для EXPLAIN: пример с параметрами или нормализованный текст с NULL вместо значений.
+    """
+    if query_group.example is not None:
+        return query_group.example
+    sql = query_group.fingerprint.replace('%', '%%').replace('?', '%s')
+    return sql, [None] * sql.count('%s')
+
+
+def _aliases(sql):
+    return {alias: table for table, alias in _ALIAS.findall(sql)}
+
+
+def scanned_tables(sql, params):
+    """
+    Таблицы, которые план запроса читает полным проходом.
+    """
+    aliases = _aliases(sql)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[3] for row in cursor.fetchall()]
+            # SCAN <таблица или псевдоним> [USING INDEX ...]; полный проход по покрывающему индексу дешевле.
+            names = [detail.split()[1] for detail in details
+                     if detail.startswith('SCAN ') and 'COVERING INDEX' not in detail]
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            names, nodes = [], [plan[0]['Plan']]
+            while nodes:
+                node = nodes.pop()
+                if node['Node Type'] == 'Seq Scan':
+                    names.append(node.get('Alias') or node['Relation Name'])
+                nodes += node.get('Plans', [])
+        else:
+            return set()
+    return {aliases.get(name, name) for name in names}
+
+
+def predicate_columns(sql, table):
+    """
+    Столбцы таблицы из условий запроса: на равенство, на диапазон и из сортировки.
+    """
+    aliases = _aliases(sql)
+
+    def columns(pattern, text):
+        found = []
+        for match in pattern.finditer(text):
+            name = match['table'] or aliases.get(match['alias'])
+            if name == table and match['column'] not in found:
+                found.append(match['column'])
+        return found
+
+    where = ' '.join(_WHERE.findall(sql))
+    order_by = ' '.join(_ORDER_BY.findall(sql))
+    return columns(_EQUALITY, where), columns(_RANGE, where), columns(re.compile(_COLUMN), order_by)
+
+
+def existing_indexes(model):
+    """
+    Столбцы уже существующих индексов модели, включая первичный ключ, уникальные поля и внешние ключи.
+    """
+    meta = model._meta
+    indexes = [(meta.pk.column,)]
+    indexes += [(f.column,) for f in meta.local_fields if (f.unique or f.db_index) and f.column]
+    column = {f.name: f.column for f in meta.local_fields}
+    fields = [index.fields for index in meta.indexes if index.fields]
+    fields += [constraint.fields for constraint in meta.constraints if getattr(constraint, 'fields', None)]
+    fields += list(meta.unique_together)
+    indexes += [tuple(column[name.lstrip('-')] for name in names) for names in fields]
+    return indexes
+
+
+def candidate(sql, model):
+    """
+    Столбцы индекса для таблицы модели или None, если индекс не поможет или уже есть.
+    """
+    equality, ranges, order_by = predicate_columns(sql, model._meta.db_table)
+    columns = equality + [column for column in ranges + order_by if column not in equality][:1]
+    columns = tuple(columns[:MAX_COLUMNS])
+    if not columns or any(index[:len(columns)] == columns for index in existing_indexes(model)):
+        return None
+    return columns
+
+
+def _timed(sql, params, repeat=3):
+    best = None
+    with connection.cursor() as cursor:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@dataclass
+class Suggestion:
+    model: type
+    index: models.Index
+    query_group: QueryGroup
+    rows: int
+    # Время примера до и после создания индекса, мс; None, если параметры запроса неизвестны.
+    before_ms: float = None
+    after_ms: float = None
+    share: float = 0.0
+
+    @property
+    def saved_ms(self):
+        """
+        Оценка экономии по всем записанным вызовам; без замера - всё время группы как верхняя граница.
+        """
+        if self.before_ms is None:
+            return self.query_group.total_ms
+        return max(0.0, self.before_ms - self.after_ms) * self.query_group.calls
+
+    def describe(self):
+        fields = ', '.join(repr(name) for name in self.index.fields)
+        lines = [
+            f'{self.model.__name__}: models.Index(fields=[{fields}], name={self.index.name!r})',
+            f'  {self.query_group.calls} calls, {self.query_group.total_ms:.1f}ms '
+            f'({self.share:.0%} of recorded SQL time), table rows: {self.rows}',
+        ]
+        if self.before_ms is None:
+            lines.append(f'  estimated saving: up to {self.saved_ms:.1f}ms (parameters unknown, not timed)')
+        else:
+            lines.append(f'  per call {self.before_ms:.2f}ms -> {self.after_ms:.2f}ms, '
+                         f'estimated saving {self.saved_ms:.1f}ms')
+        lines.append(f'  query: {self.query_group.fingerprint[:200]}')
+        return lines
+
+
+def _field_names(model, columns):
+    by_column = {f.column: f.name for f in model._meta.local_fields}
+    return [by_column[column] for column in columns]
+
+
+def _try_index(model, index, sql, params, timed):
+    """
+    Создаёт индекс в откатываемой транзакции.
+
+    Возвращает:
+        tuple: (таблица всё ещё читается полным проходом, время до, время после).
+    """
+    before = after = None
+    with transaction.atomic():
+        if timed:
+            before = _timed(sql, params)
+        # Без контекстного менеджера: редактор схемы SQLite нельзя открыть внутри atomic().
+        connection.cursor().execute(str(index.create_sql(model, connection.schema_editor())))
+        still_scanned = model._meta.db_table in scanned_tables(sql, params)
+        if timed:
+            after = _timed(sql, params)
+        transaction.set_rollback(True)
+    return still_scanned, before, after
+
+
+def advise(samples, top=20):
+    """
+    Предлагает индексы для самых дорогих групп запросов.
+
+    Параметры:
+        samples: Записи (sql, параметры или None, длительность в мс), например from_silk() или capture().
+        top (int): Сколько самых дорогих групп анализировать.
+
+    Возвращает:
+        list[Suggestion]: Предложения по убыванию оценки экономии.
+    """
+    models_by_table = {model._meta.db_table: model for model in apps.get_app_config(APP_LABEL).get_models()}
+    groups = group(samples)
+    total_ms = sum(item.total_ms for item in groups) or 1.0
+    suggestions = {}
+    for query_group in groups[:top]:
+        if not query_group.fingerprint.upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            continue
+        sql, params = _runnable(query_group)
+        try:
+            with transaction.atomic():
+                tables = scanned_tables(sql, params)
+        except DatabaseError:
+            continue
+        for table in tables:
+            model = models_by_table.get(table)
+            columns = candidate(sql, model) if model is not None else None
+            if columns is None or (model, columns) in suggestions:
+                continue
+            index = models.Index(fields=_field_names(model, columns))
+            index.set_name_with_model(model)
+            # Запросы на запись не выполняются даже в откатываемой транзакции.
+            timed = query_group.example is not None and query_group.fingerprint.upper().startswith('SELECT')
+            try:
+                still_scanned, before, after = _try_index(model, index, sql, params, timed)
+            except DatabaseError:
+                continue
+            if still_scanned:
+                continue
+            suggestions[model, columns] = Suggestion(
+                model, index, query_group, model._default_manager.count(), before, after,
+                share=query_group.total_ms / total_ms,
+            )
+    return sorted(suggestions.values(), key=lambda item: (-item.saved_ms, -item.query_group.total_ms))
+
+
+def draft_migration(suggestions, name='suggested_indexes'):
+    """
+    Черновик миграции с AddIndex для предложений.
+
+    Индексы нужно также добавить в Meta.indexes моделей, иначе makemigrations предложит их удалить.
+
+    Возвращает:
+        tuple: (путь к файлу миграции, текст миграции).
+    """
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    leaves = loader.graph.leaf_nodes(APP_LABEL)
+    number = max((int(migration_name[:4]) for _, migration_name in leaves if migration_name[:4].isdigit()),
+                 default=0) + 1
+    migration = migrations.Migration(f'{number:04d}_{name}', APP_LABEL)
+    migration.dependencies = leaves
+    migration.operations = [migrations.AddIndex(model_name=item.model._meta.model_name, index=item.index)
+                            for item in suggestions]
+    writer = MigrationWriter(migration)
+    return writer.path, writer.as_string()
@@ -0,0 +1,295 @@
+"""
+Нагрузочный тест основных сценариев через HTTP.
+
+seed() создаёт магазины с каталогами, партнёров и покупателей (повторный запуск использует
+уже созданные данные), run() запускает виртуальных пользователей, которые в случайном порядке
+с весами SCENARIOS смотрят каталог и товары, кладут товар в корзину, оформляют заказ
+и загружают прайс партнёра. Запросы идут на сервер по адресу base_url: отдельный процесс
+или start_server() в текущем процессе. offline() переключает кэш, Celery и почту
+на локальные бэкенды, чтобы тест работал без Redis, брокера и SMTP.
+"""
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import requests
+import yaml
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import transaction
+from django.test.utils import override_settings
+
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import SimpleRateThrottle
+
+from .benchmarks import percentile
+from .models import BasketProduct, Product, ProductCategory, Shop, User, UserType
+
+# Доли сценариев в смеси: в основном просмотр каталога, реже покупки и загрузка прайсов.
+SCENARIOS = {
+    'browse': 50,
+    'detail': 30,
+    'add_to_basket': 12,
+    'checkout': 5,
+    'partner_upload': 3,
+}
+
+EMAIL_DOMAIN = 'loadtest.local'
+STOCK = 10 ** 9
+
+
+@dataclass
+class Dataset:
+    product_ids: list
+    customer_tokens: list
+    # (токен партнёра, данные прайса для /update/)
+    partners: list
+
+
+def _partner_catalog(shop, products):
+    return {
+        'shop': shop.name,
+        'categories': [{'id': category.pk, 'name': category.name}
+                       for category in ProductCategory.objects.filter(product__shop=shop).distinct()],
+        'goods': [{'id': product.pk, 'category': product.category_id, 'model': product.model, 'name': product.name,
+                   'price': float(product.price), 'quantity': STOCK, 'parameters': {'Цвет': 'чёрный'}}
+                  for product in products],
+    }
+
+
+def seed(shops=5, products=200, customers=50):
+    """
+    Создаёт данные для теста или дополняет созданные прошлым запуском.
+
+    Параметры:
+        shops (int): Магазинов, у каждого свой партнёр.
+        products (int): Товаров в каждом магазине.
+        customers (int): Покупателей, по одному на виртуального пользователя.
+
+    Возвращает:
+        Dataset: id товаров, токены покупателей и партнёров с прайсами.
+    """
+    for user_type in ('admin', 'customer', 'shop'):
+        UserType.objects.get_or_create(type=user_type)
+    shop_type = UserType.objects.get(type='shop')
+    categories = [ProductCategory.objects.get_or_create(name=f'Нагрузочный тест {i}')[0] for i in range(5)]
+
+    partners = []
+    with transaction.atomic():
+        for i in range(shops):
+            shop, _ = Shop.objects.get_or_create(name=f'Нагрузочный тест {i}', defaults={'url': 'loadtest'})
+            existing = shop.products.count()
+            Product.objects.bulk_create([
+                Product(name=f'Товар {i}-{j}', model=f'loadtest/{i}/{j}', price=100 + j, product_quantity=STOCK,
+                        category=categories[j % len(categories)], shop=shop)
+                for j in range(existing, products)
+            ])
+            partner, _ = User.objects.get_or_create(email=f'partner{i}@{EMAIL_DOMAIN}',
+                                                    defaults={'type': shop_type, 'shop': shop})
+            token, _ = Token.objects.get_or_create(user=partner)
+            partners.append((token.key, _partner_catalog(shop, shop.products.order_by('pk')[:products])))
+
+        tokens = []
+        for i in range(customers):
+            customer = User.objects.filter(email=f'customer{i}@{EMAIL_DOMAIN}').first()
+            if customer is None:
+                # Без пароля: хэширование пароля заняло бы больше времени, чем сам тест.
+                customer = User.objects.create_user(email=f'customer{i}@{EMAIL_DOMAIN}', password=None)
+            tokens.append(Token.objects.get_or_create(user=customer)[0].key)
+        BasketProduct.objects.filter(basket__user__email__endswith=f'@{EMAIL_DOMAIN}').delete()
+
+    product_ids = list(Product.objects.filter(shop__name__startswith='Нагрузочный тест')
+                       .values_list('pk', flat=True))
+    return Dataset(product_ids, tokens, partners)
+
+
+class Stats:
+    """
+    Задержки и статусы ответов по эндпоинтам.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, latency, ok):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed):
+        """
+        Возвращает строки отчёта: запросы в секунду, p50, p95, p99 и ошибки по каждому эндпоинту.
+        """
+        rows = []
+        everything = [latency for values in self.latencies.values() for latency in values]
+        for endpoint, values in sorted(self.latencies.items()) + [('total', everything)]:
+            if not values:
+                continue
+            errors = sum(self.errors.values()) if endpoint == 'total' else self.errors[endpoint]
+            rows.append(
+                f'{endpoint:<24} {len(values):>7} req {len(values) / elapsed:>8.1f} req/s  '
+                f'p50={percentile(values, 50) * 1000:.1f}ms p95={percentile(values, 95) * 1000:.1f}ms '
+                f'p99={percentile(values, 99) * 1000:.1f}ms errors={errors}'
+            )
+        return rows
+
+
+@dataclass
+class VirtualUser:
+    base_url: str
+    token: str
+    dataset: Dataset
+    stats: Stats
+    rng: random.Random
+    basket: set = field(default_factory=set)
+
+    def __post_init__(self):
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Token {self.token}'
+
+    def request(self, endpoint, method, path, expected, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+        except requests.RequestException:
+            response = None
+        ok = response is not None and response.status_code == expected
+        self.stats.record(endpoint, time.perf_counter() - started, ok)
+        return response
+
+    def browse(self):
+        self.request('GET /products/', 'GET', '/products/', 200)
+
+    def detail(self):
+        product_id = self.rng.choice(self.dataset.product_ids)
+        self.request('GET /product/<id>/', 'GET', f'/product/{product_id}/', 200)
+
+    def add_to_basket(self):
+        product_id = self.rng.choice(self.dataset.product_ids)
+        if product_id in self.basket:
+            return
+        response = self.request('POST /basket/', 'POST', '/basket/', 201,
+                                json={'product': product_id, 'quantity': self.rng.randint(1, 3)})
+        if response is not None and response.status_code == 201:
+            self.basket.add(product_id)
+
+    def checkout(self):
+        if not self.basket:
+            self.add_to_basket()
+        response = self.request('POST /orders/', 'POST', '/orders/', 201, json={'delivery_address': 'Москва'})
+        if response is not None and response.status_code == 201:
+            self.basket.clear()
+
+    def partner_upload(self):
+        token, catalog = self.rng.choice(self.dataset.partners)
+        # Партнёр меняет цены: загрузка каждый раз обновляет товары, а не только сверяет их.
+        goods = [{**good, 'price': round(good['price'] * self.rng.uniform(0.95, 1.05), 2)}
+                 for good in catalog['goods']]
+        content = yaml.safe_dump({**catalog, 'goods': goods}, allow_unicode=True).encode()
+        self.request('POST /update/', 'POST', '/update/', 200,
+                     headers={'Authorization': f'Token {token}'}, files={'file': ('shop.yaml', content)})
+
+    def run(self, deadline, requests_left):
+        names, weights = zip(*SCENARIOS.items())
+        while time.monotonic() < deadline and requests_left():
+            getattr(self, self.rng.choices(names, weights)[0])()
+        self.session.close()
+
+
+def run(base_url, dataset, concurrency=10, duration=30, max_requests=None, seed_value=None):
+    """
+    Запускает виртуальных пользователей и ждёт окончания теста.
+
+    Параметры:
+        base_url (str): Адрес сервера без завершающего слэша.
+        dataset (Dataset): Данные из seed().
+        concurrency (int): Одновременных пользователей, не больше числа покупателей в dataset.
+        duration (float): Длительность теста в секундах.
+        max_requests (int, optional): Остановиться после стольких сценариев.
+        seed_value (int, optional): Начальное значение генератора для повторяемой смеси сценариев.
+
+    Возвращает:
+        tuple: (Stats, фактическая длительность в секундах).
+    """
+    stats = Stats()
+    counter = iter(range(max_requests)) if max_requests else None
+    counter_lock = threading.Lock()
+
+    def requests_left():
+        if counter is None:
+            return True
+        with counter_lock:
+            return next(counter, None) is not None
+
+    rng = random.Random(seed_value)
+    users = [VirtualUser(base_url, token, dataset, stats, random.Random(rng.random()))
+             for token in dataset.customer_tokens[:concurrency]]
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=user.run, args=(deadline, requests_left)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - started
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def start_server():
+    """
+    Запускает многопоточный WSGI-сервер Django в текущем процессе на свободном порту.
+
+    Возвращает:
+        str: Адрес сервера.
+    """
+    server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietRequestHandler, allow_reuse_address=False)
+    server.set_app(WSGIHandler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def offline():
+    """
+    Локальные бэкенды на время теста: кэш в памяти, задачи Celery выполняются сразу,
+    письма остаются в памяти. Лимиты троттлинга снимаются, DEBUG выключается, как в продакшене.
+    """
+    from market.celery import app
+
+    os.environ.setdefault('DEFAULT_FROM_EMAIL', f'market@{EMAIL_DOMAIN}')
+    eager = app.conf.task_always_eager
+    rates = dict(SimpleRateThrottle.THROTTLE_RATES)
+    app.conf.task_always_eager = True
+    SimpleRateThrottle.THROTTLE_RATES.update({'anon': None, 'user': None})
+    try:
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            DEFAULT_FROM_EMAIL=os.environ['DEFAULT_FROM_EMAIL'],
+            EMAIL_OUTBOX_RATE_LIMIT=0,
+            METRICS_BACKEND='local',
+            ALLOWED_HOSTS=['127.0.0.1', 'localhost'],
+            DEBUG=False,
+        ):
+            yield
+    finally:
+        app.conf.task_always_eager = eager
+        SimpleRateThrottle.THROTTLE_RATES.clear()
+        SimpleRateThrottle.THROTTLE_RATES.update(rates)
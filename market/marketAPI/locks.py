@@ -0,0 +1,66 @@
+"""
+Короткие блокировки в общем кэше с токеном владельца.
+
+Блокировку снимает только её владелец: если работа длилась дольше времени жизни блокировки,
+её мог уже взять другой запрос, и безусловное удаление сняло бы чужую. В Redis токен пишется
+без сериализации django_redis, а проверка и удаление выполняются одним Lua-скриптом. С другими
+кэшами (например, в тестах) проверка и удаление - два обращения к кэшу.
+"""
+import uuid
+
+from django.core.cache import cache
+
+RELEASE_SCRIPT = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        released = released + redis.call('DEL', key)
+    end
+end
+return released
+"""
+
+
+def _redis_client():
+    get_client = getattr(getattr(cache, 'client', None), 'get_client', None)
+    return get_client(write=True) if get_client is not None else None
+
+
+def new_token():
+    return uuid.uuid4().hex
+
+
+def acquire(key, token, timeout):
+    """
+    Берёт блокировку, если она свободна.
+
+    Параметры:
+        key (str): Ключ блокировки в кэше.
+        token (str): Токен владельца, см. new_token().
+        timeout (int): Время жизни блокировки в секундах.
+
+    Возвращает:
+        bool: Взята ли блокировка.
+    """
+    client = _redis_client()
+    if client is None:
+        return cache.add(key, token, timeout=timeout)
+    return bool(client.set(cache.make_key(key), token, nx=True, ex=timeout))
+
+
+def release(keys, token):
+    """
+    Снимает блокировки, которые всё ещё принадлежат токену.
+
+    Параметры:
+        keys (list): Ключи блокировок.
+        token (str): Токен, с которым они брались.
+    """
+    if not keys:
+        return
+    client = _redis_client()
+    if client is None:
+        owned = [key for key, value in cache.get_many(keys).items() if value == token]
+        cache.delete_many(owned)
+        return
+    client.register_script(RELEASE_SCRIPT)(keys=[cache.make_key(key) for key in keys], args=[token])
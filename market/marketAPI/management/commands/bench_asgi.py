@@ -0,0 +1,72 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+from rest_framework.throttling import SimpleRateThrottle
+
+from marketAPI.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность при параллельных соединениях: ASGI-приложение '
+        '(async-представления каталога и корзины) и WSGI-приложение с пулом из --threads потоков, '
+        'как у WSGI-сервера. Запросы выполняются в процессе через тестовые клиенты Django, '
+        'без сетевого сервера. Для честного сравнения запускать с SILK_ENABLED=False.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/products/', help='Адрес для запросов.')
+        parser.add_argument('--token', help='Токен для заголовка Authorization (для /basket/).')
+        parser.add_argument('--requests', type=int, default=2000, help='Сколько запросов выполнить.')
+        parser.add_argument('--connections', type=int, default=100, help='Одновременных соединений.')
+        parser.add_argument('--threads', type=int, default=8, help='Потоков WSGI-сервера.')
+        parser.add_argument('--rate', default='1000000/minute', help='Лимиты троттлинга на время теста.')
+
+    def handle(self, *args, **options):
+        if settings.SILK_ENABLED:
+            self.stdout.write('warning: silk enabled, its sync middleware moves ASGI requests to threads')
+        headers = {'Authorization': f'Token {options["token"]}'} if options['token'] else {}
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        SimpleRateThrottle.THROTTLE_RATES.update({scope: options['rate'] for scope in ('anon', 'user')})
+
+        for name, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+            started = time.perf_counter()
+            latencies, codes = run(options, headers)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name}: {len(latencies) / elapsed:.0f} req/s, '
+                f'p50={percentile(latencies, 50) * 1000:.1f}ms p95={percentile(latencies, 95) * 1000:.1f}ms '
+                f'p99={percentile(latencies, 99) * 1000:.1f}ms, statuses {sorted(set(codes))}'
+            )
+
+    def run_wsgi(self, options, headers):
+        def request(_):
+            started = time.perf_counter()
+            response = Client().get(options['path'], headers=headers)
+            return time.perf_counter() - started, response.status_code
+
+        # Запросы сверх --threads ждут свободный поток, как соединения у WSGI-сервера.
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(request, range(options['requests'])))
+        return [latency for latency, _ in results], [code for _, code in results]
+
+    def run_asgi(self, options, headers):
+        async def run():
+            semaphore = asyncio.Semaphore(options['connections'])
+            client = AsyncClient()
+
+            async def request():
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(options['path'], headers=headers)
+                    return time.perf_counter() - started, response.status_code
+
+            return await asyncio.gather(*(request() for _ in range(options['requests'])))
+
+        results = asyncio.run(run())
+        return [latency for latency, _ in results], [code for _, code in results]
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from marketAPI.benchmarks import percentile
+from marketAPI.tasks import queue_probe
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет задержку задач очереди notifications, пока воркеры заняты долгими загрузками каталогов. '
+        'Нужны брокер, result backend и запущенные воркеры, например: '
+        'celery -A market worker -Q notifications -c 2 и celery -A market worker -Q imports -c 2. '
+        'С --single-queue все задачи идут в очередь default, как до разделения очередей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imports', type=int, default=4, help='Сколько долгих задач поставить в imports.')
+        parser.add_argument('--import-seconds', type=float, default=20, help='Длительность одной долгой задачи.')
+        parser.add_argument('--emails', type=int, default=50, help='Сколько задач поставить в notifications.')
+        parser.add_argument('--interval', type=float, default=0.1, help='Пауза между задачами notifications.')
+        parser.add_argument('--single-queue', action='store_true')
+        parser.add_argument('--timeout', type=float, default=300)
+
+    def handle(self, *args, **options):
+        def route(queue):
+            queue = 'default' if options['single_queue'] else queue
+            return {'queue': queue, 'priority': settings.CELERY_QUEUES_CONFIG[queue]['priority']}
+
+        for _ in range(options['imports']):
+            queue_probe.apply_async((time.time(), options['import_seconds']), **route('imports'))
+        time.sleep(1)
+
+        probes = []
+        for _ in range(options['emails']):
+            probes.append(queue_probe.apply_async((time.time(),), **route('notifications')))
+            time.sleep(options['interval'])
+        waits = [probe.get(timeout=options['timeout']) for probe in probes]
+
+        mode = 'single queue' if options['single_queue'] else 'dedicated queues'
+        self.stdout.write(
+            f'{mode}: {options["imports"]} imports x {options["import_seconds"]}s, {len(waits)} notifications\n'
+            f'notification queue wait: p50={percentile(waits, 50) * 1000:.0f}ms '
+            f'p95={percentile(waits, 95) * 1000:.0f}ms max={max(waits) * 1000:.0f}ms'
+        )
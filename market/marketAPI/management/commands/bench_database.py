@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, transaction
+
+from marketAPI.benchmarks import percentile
+from marketAPI.models import Product
+from marketAPI.services import reserve_stock, release_stock
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест базы данных: параллельные потоки читают каталог и списывают остатки '
+        'так же, как оформление заказа (резерв и возврат товара в одной транзакции, '
+        'остатки не меняются). Сравнение профилей: запустить с DATABASE_ENGINE=sqlite '
+        'и DATABASE_ENGINE=postgresql на одних и тех же данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Параллельных потоков.')
+        parser.add_argument('--seconds', type=float, default=10, help='Длительность теста.')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Доля пишущих операций.')
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.filter(product_quantity__gt=0).values_list('pk', flat=True)[:50])
+        if not product_ids:
+            raise CommandError('Нужен хотя бы один товар с ненулевым остатком.')
+
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f'{connection.vendor}: CONN_MAX_AGE={settings_dict["CONN_MAX_AGE"]} '
+            f'pool={bool(settings_dict["OPTIONS"].get("pool"))}, {options["threads"]} threads'
+        )
+
+        deadline = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        latencies = {'read': [], 'write': []}
+        errors = []
+
+        def worker(number):
+            every = max(1, round(1 / options['write_ratio'])) if options['write_ratio'] else 0
+            step = 0
+            try:
+                while time.monotonic() < deadline:
+                    step += 1
+                    kind = 'write' if every and step % every == 0 else 'read'
+                    product_id = product_ids[(number + step) % len(product_ids)]
+                    started = time.perf_counter()
+                    try:
+                        if kind == 'write':
+                            with transaction.atomic():
+                                reserve_stock([(product_id, 1)])
+                                release_stock([(product_id, 1)])
+                        else:
+                            list(Product.objects.filter(shop__accepting_status=True)[:20])
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    with lock:
+                        latencies[kind].append(time.perf_counter() - started)
+                    # Как после ответа на запрос: соединение закрывается или остаётся открытым
+                    # в зависимости от CONN_MAX_AGE.
+                    close_old_connections()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(worker, range(options['threads'])))
+
+        for kind, values in latencies.items():
+            if not values:
+                continue
+            self.stdout.write(
+                f'{kind}: {len(values) / options["seconds"]:.0f} ops/s, '
+                f'p50={percentile(values, 50) * 1000:.1f}ms p95={percentile(values, 95) * 1000:.1f}ms '
+                f'p99={percentile(values, 99) * 1000:.1f}ms'
+            )
+        if errors:
+            self.stdout.write(f'errors: {len(errors)}, first: {errors[0]}')
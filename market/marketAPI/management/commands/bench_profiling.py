@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from rest_framework.throttling import SimpleRateThrottle
+
+MODES = {
+    # Аварийное отключение: ProfilingMiddleware сразу передаёт запрос дальше.
+    'off': {'PROFILING_ENABLED': False},
+    # Продакшен для невыбранного запроса: только замер времени и текста SQL.
+    'slow-only': {'PROFILING_ENABLED': True, 'PROFILING_SAMPLE_RATE': 0.0, 'PROFILING_ROUTE_RATES': {},
+                  'PROFILING_SLOW_REQUEST_MS': 60 * 1000},
+    # Выборка по умолчанию из настроек.
+    'sampled': {'PROFILING_ENABLED': True},
+    # Полная запись silk каждого запроса, как было раньше.
+    'full': {'PROFILING_ENABLED': True, 'PROFILING_SAMPLE_RATE': 1.0, 'PROFILING_ROUTE_RATES': {}},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет накладные расходы профилирования на запрос в каждом режиме: off, slow-only '
+        '(невыбранный запрос), sampled (ставки из настроек) и full (silk записывает всё). '
+        'Запросы выполняются в процессе через тестовый клиент.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/products/', help='Адрес для запросов.')
+        parser.add_argument('--requests', type=int, default=500, help='Запросов в каждом режиме.')
+
+    def handle(self, *args, **options):
+        if not settings.SILK_ENABLED:
+            self.stdout.write('warning: silk disabled, full mode only samples Sentry traces')
+        SimpleRateThrottle.THROTTLE_RATES.update({'anon': '1000000/minute', 'user': '1000000/minute'})
+        client = Client()
+
+        results = {}
+        for mode, overrides in MODES.items():
+            with override_settings(ALLOWED_HOSTS=['testserver'], **overrides):
+                client.get(options['path'])
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    client.get(options['path'])
+                results[mode] = (time.perf_counter() - started) / options['requests'] * 1e6
+
+        for mode, per_request in results.items():
+            self.stdout.write(f'{mode}: {per_request:.0f}us per request, '
+                              f'overhead {per_request - results["off"]:+.0f}us')
@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from rest_framework import throttling as drf_throttling
+from rest_framework.test import APIRequestFactory
+
+from marketAPI import throttling
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает накладные расходы троттлинга DRF и троттлинга со скользящим окном в Redis: '
+        'время одной проверки и число пропущенных запросов при параллельной нагрузке. '
+        'Запускать с настройками, где CACHES указывает на Redis, иначе оба варианта используют '
+        'реализацию DRF.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Сколько проверок выполнить.')
+        parser.add_argument('--limit', type=int, default=100, help='Лимит запросов в окне.')
+        parser.add_argument('--threads', type=int, default=8, help='Параллельных потоков.')
+
+    def handle(self, *args, **options):
+        request = APIRequestFactory().get('/products/', REMOTE_ADDR='10.0.0.1')
+        request.user = AnonymousUser()
+        self.stdout.write(f'cache backend: {settings.CACHES["default"]["BACKEND"]}')
+
+        for name, throttle_class in (('drf', drf_throttling.AnonRateThrottle),
+                                     ('redis', throttling.AnonRateThrottle)):
+            def check(limit):
+                throttle = throttle_class()
+                throttle.rate = f'{limit}/hour'
+                throttle.num_requests, throttle.duration = throttle.parse_rate(throttle.rate)
+                return throttle.allow_request(request, None)
+
+            # Время одной проверки: лимит не достигается.
+            self.reset(throttle_class, request)
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                check(options['requests'] + 1)
+            per_request = (time.perf_counter() - started) / options['requests'] * 1e6
+
+            # Параллельные запросы: сколько пропущено при лимите --limit.
+            self.reset(throttle_class, request)
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                allowed = sum(pool.map(lambda _: check(options['limit']), range(options['limit'] * 3)))
+
+            self.stdout.write(
+                f'{name}: {per_request:.0f}us per check, '
+                f'{allowed} of {options["limit"] * 3} concurrent requests allowed with limit {options["limit"]}'
+            )
+
+    def reset(self, throttle_class, request):
+        """
+        Очищает историю запросов: список DRF и окно в Redis, которое хранится под своим ключом.
+        """
+        key = throttle_class().get_cache_key(request, None)
+        cache.delete(key)
+        cache.delete(throttling.SLIDING_WINDOW_PREFIX + key)
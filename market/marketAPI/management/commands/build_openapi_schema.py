@@ -0,0 +1,33 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from marketAPI import schema
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит схему OpenAPI и записывает её в OPENAPI_SCHEMA_FILE, откуда её отдаёт /api/schema/. '
+        'Запускать при сборке или деплое. С --check только сверяет файл с текущим кодом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Завершиться с ошибкой, если файл отсутствует или устарел.')
+
+    def handle(self, *args, **options):
+        path = settings.OPENAPI_SCHEMA_FILE
+        if options['check']:
+            try:
+                with open(path, 'rb') as file:
+                    stored = json.load(file)
+            except FileNotFoundError:
+                raise CommandError(f'{path} not found')
+            if stored != schema.generate():
+                raise CommandError(f'{path} is out of date, run build_openapi_schema')
+            self.stdout.write(f'{path} is up to date')
+            return
+
+        built = schema.build(path)
+        self.stdout.write(f'{path}: {len(built.get("paths", {}))} paths')
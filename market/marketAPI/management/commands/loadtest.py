@@ -0,0 +1,51 @@
+from contextlib import ExitStack
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from marketAPI import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест основных сценариев через HTTP: каталог, карточка товара, корзина, '
+        'оформление заказа и загрузка прайса партнёра. Создаёт данные, запускает сервер в текущем '
+        'процессе (или использует --url) и выводит запросы в секунду и p50/p95/p99 по эндпоинтам. '
+        'По умолчанию работает без Redis, брокера и SMTP, например: DATABASE_ENGINE=sqlite '
+        'DATABASE_NAME=/tmp/loadtest.sqlite3 SILK_ENABLED=False python manage.py loadtest --migrate'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Адрес уже запущенного сервера с той же базой данных.')
+        parser.add_argument('--online', action='store_true',
+                            help='Использовать кэш, Celery и почту из настроек вместо локальных бэкендов.')
+        parser.add_argument('--migrate', action='store_true', help='Применить миграции перед тестом.')
+        parser.add_argument('--shops', type=int, default=5, help='Магазинов с каталогом.')
+        parser.add_argument('--products', type=int, default=200, help='Товаров в магазине.')
+        parser.add_argument('--concurrency', type=int, default=10, help='Одновременных пользователей.')
+        parser.add_argument('--duration', type=float, default=30, help='Длительность теста в секундах.')
+        parser.add_argument('--requests', type=int, help='Остановиться после стольких сценариев.')
+        parser.add_argument('--seed', type=int, help='Начальное значение генератора для повторяемой смеси.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('Сервер и пользователи работают в разных потоках: нужна файловая SQLite.')
+
+        with ExitStack() as stack:
+            if not options['online']:
+                stack.enter_context(loadtest.offline())
+            if options['migrate']:
+                call_command('migrate', verbosity=0)
+            dataset = loadtest.seed(shops=options['shops'], products=options['products'],
+                                    customers=options['concurrency'])
+            base_url = options['url'] or stack.enter_context(loadtest.start_server())
+            self.stdout.write(f'{base_url}: {len(dataset.product_ids)} products, '
+                              f'{options["concurrency"]} users, {options["duration"]:.0f}s')
+
+            stats, elapsed = loadtest.run(base_url, dataset, concurrency=options['concurrency'],
+                                          duration=options['duration'], max_requests=options['requests'],
+                                          seed_value=options['seed'])
+
+        for row in stats.report(elapsed):
+            self.stdout.write(row)
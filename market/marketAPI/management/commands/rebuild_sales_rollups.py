@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils.dateparse import parse_date
+
+from marketAPI.models import OrderProduct, ProductSalesDaily, ShopSalesDaily
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные сводки продаж по товарам и магазинам из заказов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='Первый пересчитываемый день (YYYY-MM-DD), по умолчанию вся история.')
+        parser.add_argument('--date-to', help='Последний пересчитываемый день (YYYY-MM-DD).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        lines = OrderProduct.objects.exclude(order__status='cancelled').annotate(day=TruncDate('order__created_at'))
+        product_rollups = ProductSalesDaily.objects.all()
+        shop_rollups = ShopSalesDaily.objects.all()
+        for option, lookup in (('date_from', 'gte'), ('date_to', 'lte')):
+            if options[option]:
+                try:
+                    day = parse_date(options[option])
+                except ValueError:
+                    day = None
+                if day is None:
+                    raise CommandError(f'Invalid date: {options[option]}')
+                lines = lines.filter(**{f'day__{lookup}': day})
+                product_rollups = product_rollups.filter(**{f'day__{lookup}': day})
+                shop_rollups = shop_rollups.filter(**{f'day__{lookup}': day})
+
+        revenue = Sum(F('quantity') * F('unit_price'))
+        with transaction.atomic():
+            product_rollups.delete()
+            shop_rollups.delete()
+            products = ProductSalesDaily.objects.bulk_create(
+                (ProductSalesDaily(product_id=row['product_id'], shop_id=row['shop_id'], day=row['day'],
+                                   units=row['units'], revenue=row['revenue'])
+                 for row in lines.values('product_id', 'shop_id', 'day').annotate(
+                    units=Sum('quantity'), revenue=revenue).order_by().iterator()),
+                batch_size=options['batch_size'],
+            )
+            shops = ShopSalesDaily.objects.bulk_create(
+                (ShopSalesDaily(shop_id=row['shop_id'], day=row['day'], units=row['units'],
+                                revenue=row['revenue'])
+                 for row in lines.values('shop_id', 'day').annotate(
+                    units=Sum('quantity'), revenue=revenue).order_by().iterator()),
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(products)} product and {len(shops)} shop rollups'
+        ))
@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Что делает процесс при старте до первого запроса или первой задачи.
+TARGETS = {
+    'web': (
+        'from market.wsgi import application\n'
+        # URL-схема загружается первым запросом: представления, админка, документация API.
+        'from django.urls import get_resolver; get_resolver().url_patterns'
+    ),
+    'celery': (
+        'import django; django.setup()\n'
+        'from market.celery import app\n'
+        'app.loader.import_default_modules()\n'
+        'app.finalize()'
+    ),
+}
+
+PROBE = '''
+import time
+started = time.perf_counter()
+{code}
+print(f'startup-seconds {{time.perf_counter() - started:.4f}}')
+'''
+
+
+def measure(code, settings_module):
+    """
+    Запускает code в новом интерпретаторе с -X importtime.
+
+    Возвращает:
+        tuple: (время старта в секундах, {пакет верхнего уровня: собственное время импорта в секундах}).
+    """
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE.format(code=code)],
+                            capture_output=True, text=True, env=env)
+    if result.returncode:
+        raise CommandError(result.stderr.strip().splitlines()[-1])
+
+    packages = defaultdict(float)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us) / 1e6
+    total = float(result.stdout.split('startup-seconds')[-1])
+    return total, packages
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время старта веб-процесса (загрузка WSGI-приложения и URL-схемы) и воркера Celery '
+        '(django.setup и импорт задач) в новом интерпретаторе и выводит, какие пакеты '
+        'дольше всего импортируются. Для сравнения профилей: --settings-module market.settings_production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-module', default=os.environ.get('DJANGO_SETTINGS_MODULE'),
+                            help='Модуль настроек для измеряемого процесса.')
+        parser.add_argument('--repeat', type=int, default=3, help='Запусков, берётся самый быстрый.')
+        parser.add_argument('--top', type=int, default=10, help='Сколько пакетов показать.')
+        parser.add_argument('target', nargs='*', help='web, celery или оба (по умолчанию).')
+
+    def handle(self, *args, **options):
+        unknown = set(options['target']) - set(TARGETS)
+        if unknown:
+            raise CommandError(f'Unknown target: {", ".join(sorted(unknown))}')
+        for target in options['target'] or TARGETS:
+            runs = [measure(TARGETS[target], options['settings_module']) for _ in range(options['repeat'])]
+            total, packages = min(runs, key=lambda run: run[0])
+            self.stdout.write(f'{target}: {total * 1000:.0f}ms ({options["settings_module"]})')
+            for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+                self.stdout.write(f'  {name:<28} {seconds * 1000:>7.1f}ms')
@@ -0,0 +1,68 @@
+from contextlib import ExitStack
+from datetime import timedelta
+
+from cachalot.api import cachalot_disabled
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils import timezone
+
+from marketAPI import index_advisor, loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Предлагает индексы для моделей marketAPI по записанным SQL-запросам: из silk '
+        '(по умолчанию) или по запросам к --path, выполненным в процессе (--capture). Запросы '
+        'группируются по тексту без значений, для самых дорогих строится план, а каждый '
+        'предложенный индекс проверяется созданием в откатываемой транзакции. Работает с файловой '
+        'SQLite без Redis, например: DATABASE_NAME=db.sqlite3 python manage.py suggest_indexes --capture'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capture', action='store_true',
+                            help='Не читать silk, а выполнить запросы к --path и записать их SQL.')
+        parser.add_argument('--path', action='append', help='Адрес для --capture, можно указать несколько раз.')
+        parser.add_argument('--requests', type=int, default=5, help='Запросов к каждому адресу для --capture.')
+        parser.add_argument('--token', help='Токен пользователя для адресов, требующих авторизации.')
+        parser.add_argument('--hours', type=float, help='Только запросы silk за последние столько часов.')
+        parser.add_argument('--top', type=int, default=20, help='Сколько самых дорогих групп запросов анализировать.')
+        parser.add_argument('--write-migration', action='store_true',
+                            help='Записать предложения черновиком миграции marketAPI.')
+
+    def handle(self, *args, **options):
+        if options['capture']:
+            samples = self.capture(options['path'] or ['/products/'], options['requests'], options['token'])
+        elif apps.is_installed('silk'):
+            since = timezone.now() - timedelta(hours=options['hours']) if options['hours'] else None
+            samples = list(index_advisor.from_silk(since))
+        else:
+            raise CommandError('silk is not installed (SILK_ENABLED=False): use --capture')
+
+        suggestions = index_advisor.advise(samples, top=options['top'])
+        self.stdout.write(f'{len(samples)} queries, {len(index_advisor.group(samples))} distinct, '
+                          f'{len(suggestions)} index suggestions')
+        for suggestion in suggestions:
+            for line in suggestion.describe():
+                self.stdout.write(line)
+
+        if options['write_migration'] and suggestions:
+            path, text = index_advisor.draft_migration(suggestions)
+            with open(path, 'w') as file:
+                file.write(text)
+            self.stdout.write(f'draft migration: {path} (add the indexes to Meta.indexes of the models as well)')
+
+    def capture(self, paths, requests, token):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        client = Client(SERVER_NAME='localhost', **headers)
+        with ExitStack() as stack:
+            stack.enter_context(loadtest.offline())
+            # cachalot отвечал бы на повторные запросы из кэша, не доходя до базы данных.
+            stack.enter_context(cachalot_disabled(all_queries=True))
+            samples = stack.enter_context(index_advisor.capture())
+            for path in paths:
+                for _ in range(requests):
+                    response = client.get(path)
+                    if response.status_code >= 400:
+                        raise CommandError(f'GET {path}: {response.status_code}')
+        return samples
@@ -0,0 +1,276 @@
+"""
+Метрики запросов, SQL, кэша и задач Celery в формате Prometheus.
+
+Значения копятся в памяти процесса. Если кэш по умолчанию - Redis и METRICS_BACKEND = 'redis',
+процессы раз в METRICS_FLUSH_INTERVAL секунд добавляют накопленные приращения в общий хэш,
+и /metrics отдаёт сумму по всем воркерам. Иначе /metrics показывает счётчики своего процесса.
+
+MetricsMiddleware замеряет запросы, обработчики сигналов Celery - задачи. В воркерах Celery
+метрики видны в /metrics только при METRICS_BACKEND = 'redis'.
+"""
+import hmac
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+_lock = threading.Lock()
+_metrics = {}
+# Все значения процесса (для локального режима) и ещё не отправленные в Redis приращения.
+_totals = defaultdict(float)
+_pending = defaultdict(float)
+_flushed_at = 0.0
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+
+def _sample(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+def _add(values):
+    with _lock:
+        for sample, value in values:
+            _totals[sample] += value
+            _pending[sample] += value
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        _metrics[name] = ('counter', documentation)
+
+    def inc(self, value=1, **labels):
+        _add([(_sample(self.name, labels), value)])
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        _metrics[name] = ('histogram', documentation)
+
+    def observe(self, value, **labels):
+        # Корзины хранятся сразу накопительными, как их отдаёт Prometheus.
+        values = [(_sample(f'{self.name}_bucket', {**labels, 'le': le}), 1)
+                  for le in self.buckets if value <= le]
+        values += [
+            (_sample(f'{self.name}_bucket', {**labels, 'le': '+Inf'}), 1),
+            (_sample(f'{self.name}_sum', labels), value),
+            (_sample(f'{self.name}_count', labels), 1),
+        ]
+        _add(values)
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests by view, method and status.')
+http_duration = Histogram('http_request_duration_seconds', 'HTTP request latency by view.')
+http_response_bytes = Counter('http_response_bytes_total', 'Response body size by view.')
+db_queries = Counter('db_queries_total', 'SQL queries executed while handling requests, by view.')
+db_query_seconds = Counter('db_query_seconds_total', 'Time spent in SQL queries, by view.')
+catalog_cache_requests = Counter('catalog_cache_requests_total', 'Catalog cache lookups by outcome.')
+celery_tasks = Counter('celery_tasks_total', 'Celery tasks by name and state.')
+celery_duration = Histogram('celery_task_duration_seconds', 'Celery task run time.', TASK_BUCKETS)
+celery_queue_wait = Histogram('celery_task_queue_wait_seconds', 'Time between publishing and starting a task.',
+                              TASK_BUCKETS)
+
+
+def _redis():
+    if settings.METRICS_BACKEND != 'redis':
+        return None
+    get_client = getattr(getattr(cache, 'client', None), 'get_client', None)
+    return get_client(write=True) if get_client else None
+
+
+def _redis_key():
+    return cache.make_key('metrics')
+
+
+def flush_due():
+    return bool(_pending) and time.monotonic() - _flushed_at >= settings.METRICS_FLUSH_INTERVAL
+
+
+def flush(force=False):
+    """
+    Отправляет накопленные приращения в Redis не чаще раза в METRICS_FLUSH_INTERVAL секунд.
+    """
+    global _flushed_at
+    client = _redis()
+    if client is None:
+        return
+    now = time.monotonic()
+    with _lock:
+        if not _pending or (not force and now - _flushed_at < settings.METRICS_FLUSH_INTERVAL):
+            return
+        pending = dict(_pending)
+        _pending.clear()
+        _flushed_at = now
+
+    pipeline = client.pipeline(transaction=False)
+    for sample, value in pending.items():
+        pipeline.hincrbyfloat(_redis_key(), sample, value)
+    pipeline.execute()
+
+
+def render():
+    """
+    Текст метрик в формате Prometheus.
+    """
+    client = _redis()
+    if client is None:
+        with _lock:
+            values = dict(_totals)
+    else:
+        flush(force=True)
+        values = {sample.decode(): float(value) for sample, value in client.hgetall(_redis_key()).items()}
+
+    lines = []
+    for name, (kind, documentation) in sorted(_metrics.items()):
+        samples = sorted(sample for sample in values
+                         if sample.split('{')[0] in (name, f'{name}_bucket', f'{name}_sum', f'{name}_count'))
+        lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+        lines += [f'{sample} {values[sample]:g}' for sample in samples]
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """
+    Сбрасывает метрики процесса (для тестов).
+    """
+    global _flushed_at
+    with _lock:
+        _totals.clear()
+        _pending.clear()
+        _flushed_at = 0.0
+
+
+class _QueryCounter:
+    """
+    Обёртка execute_wrapper: число и суммарное время SQL-запросов.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def _response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+def _observe_request(request, response, elapsed, queries=None):
+    view = getattr(getattr(request, 'resolver_match', None), 'view_name', None) or 'unresolved'
+    http_requests.inc(view=view, method=request.method, status=response.status_code)
+    http_duration.observe(elapsed, view=view)
+    http_response_bytes.inc(_response_size(response), view=view)
+    if queries is not None:
+        db_queries.inc(queries.count, view=view)
+        db_query_seconds.inc(queries.seconds, view=view)
+
+
+class MetricsMiddleware:
+    """
+    Записывает длительность, статус, размер ответа и SQL-запросы каждого запроса.
+
+    Ставится первым, чтобы учитывать время остальных middleware. Под ASGI SQL-запросы
+    выполняются в других потоках и не учитываются.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        queries = _QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        _observe_request(request, response, time.perf_counter() - started, queries)
+        flush()
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        _observe_request(request, response, time.perf_counter() - started)
+        if flush_due():
+            await sync_to_async(flush)()
+        return response
+
+
+def metrics_view(request):
+    """
+    Метрики в текстовом формате Prometheus.
+
+    Если задан METRICS_TOKEN, требуется заголовок Authorization: Bearer <токен>. Без токена
+    метрики отдаются только адресам из METRICS_ALLOWED_IPS.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+_task_started = {}
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    # Заголовок сообщения, по нему воркер считает время ожидания в очереди.
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    if not settings.METRICS_ENABLED:
+        return
+    _task_started[task_id] = time.perf_counter()
+    # В воркере заголовки сообщения - атрибуты request, в task.apply() - request.headers.
+    published_at = getattr(task.request, 'published_at', None) or (task.request.headers or {}).get('published_at')
+    if published_at is not None:
+        celery_queue_wait.observe(max(0.0, time.time() - published_at), task=task.name)
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is None:
+        return
+    celery_duration.observe(time.perf_counter() - started, task=task.name)
+    celery_tasks.inc(task=task.name, state=state or 'UNKNOWN')
+    flush()
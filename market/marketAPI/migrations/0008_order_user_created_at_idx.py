@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketAPI', '0007_alter_user_shop'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at'], name='order_user_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketAPI', '0008_order_user_created_at_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='marketAPI.product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_daily_sales', to='marketAPI.shop')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shop', 'day'], name='product_sales_shop_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='product_sales_daily_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShopSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='marketAPI.shop')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('shop', 'day'), name='shop_sales_daily_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_snapshot(apps, schema_editor):
+    OrderProduct = apps.get_model('marketAPI', 'OrderProduct')
+    Product = apps.get_model('marketAPI', 'Product')
+
+    last_pk = 0
+    while True:
+        batch = list(OrderProduct.objects.filter(pk__gt=last_pk, unit_price__isnull=True).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            break
+        products = Product.objects.in_bulk({line.product_id for line in batch})
+        for line in batch:
+            product = products[line.product_id]
+            line.unit_price = product.price
+            line.product_name = product.name
+            line.shop_id = product.shop_id
+        OrderProduct.objects.bulk_update(batch, ['unit_price', 'product_name', 'shop'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketAPI', '0010_orderproduct_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_snapshot, migrations.RunPython.noop),
+    ]
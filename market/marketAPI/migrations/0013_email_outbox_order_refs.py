@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketAPI', '0012_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='kind',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='marketAPI.order'),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='marketAPI.shop'),
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='body',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='recipient',
+            field=models.EmailField(blank=True, default='', max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='subject',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
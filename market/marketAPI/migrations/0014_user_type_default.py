@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketAPI', '0013_email_outbox_order_refs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='marketAPI.usertype'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:15
+
+import marketAPI.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('marketAPI', '0014_user_type_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=marketAPI.models.SearchIndex('name', name='product_name_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=marketAPI.models.SearchIndex('model', name='product_model_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=marketAPI.models.SearchIndex('name', name='shop_name_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=marketAPI.models.SearchIndex('email', name='user_email_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=marketAPI.models.SearchIndex('last_name', name='user_last_name_search_idx'),
+        ),
+    ]
@@ -1,6 +1,35 @@
 from django.contrib.auth.base_user import BaseUserManager, AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from . import catalog_cache
+
+
+class SearchIndex(models.Index):
+    """
+    Индекс для поиска в админке без учёта регистра по точному значению (search_fields с '=')
+    и по началу строки (с '^'): Django сравнивает UPPER(поле), поэтому индекс строится по UPPER(поле).
+    На PostgreSQL добавляется класс операторов text_pattern_ops, иначе LIKE 'abc%' не использует
+    индекс при локали, отличной от C.
+    """
+
+    def __init__(self, field_name, *, name):
+        self.field_name = field_name
+        super().__init__(Upper(field_name), name=name)
+
+    def deconstruct(self):
+        path, _, _ = super().deconstruct()
+        return path, (self.field_name,), {'name': self.name}
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            from django.contrib.postgres.indexes import OpClass
+
+            index = models.Index(OpClass(Upper(self.field_name), name='text_pattern_ops'), name=self.name)
+            return index.create_sql(model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
 
 
 class UserManager(BaseUserManager):
@@ -28,17 +57,36 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     address = models.CharField(max_length=200, null=True, blank=True)
     shop = models.OneToOneField('Shop', on_delete=models.CASCADE, null=True, blank=True, related_name='user')
-    type = models.ForeignKey('UserType', on_delete=models.CASCADE, default=2)
+    type = models.ForeignKey('UserType', on_delete=models.CASCADE)
     objects = UserManager()
 
     USERNAME_FIELD = 'email'  # Используем email как уникальное поле
     REQUIRED_FIELDS = []  # Указываем, что username не требуется
 
+    class Meta:
+        indexes = [
+            SearchIndex('email', name='user_email_search_idx'),
+            SearchIndex('last_name', name='user_last_name_search_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Тип по умолчанию - покупатель. Берётся из справочника при сохранении, а не через default
+        # поля, чтобы создание объекта User не обращалось к базе данных.
+        if self.type_id is None:
+            from .reference import user_types
+            self.type = user_types.get_or_create('customer')
+        super().save(*args, **kwargs)
+
 class Shop(models.Model):
     name = models.CharField(max_length=100)
     accepting_status = models.BooleanField(default=True)
     url = models.CharField(max_length=200)
 
+    class Meta:
+        indexes = [
+            SearchIndex('name', name='shop_name_search_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -58,6 +106,12 @@ class Order(models.Model):
     delivery_address = models.CharField(max_length=200, null=True, blank=True)
     product = models.ManyToManyField('Product', related_name='order', blank=True, through="OrderProduct")
     status = models.CharField(max_length=30)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='order_user_created_at_idx'),
+        ]
+
     def __str__(self):
         return str(self.pk)
 
@@ -67,10 +121,31 @@ class OrderProduct(models.Model):
     product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='order_products')
     quantity = models.IntegerField()
 
+    # Снимок товара на момент оформления заказа: цена и название не меняются
+    # после новой выгрузки поставщика, а заказ отображается без join с Product.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    product_name = models.CharField(max_length=100, blank=True, default='')
+    shop = models.ForeignKey('Shop', on_delete=models.SET_NULL, null=True, blank=True, related_name='order_products')
+
     def __str__(self):
         return str(self.order)
 
 
+class CatalogQuerySet(models.QuerySet):
+    def cached(self, *scopes, timeout=None):
+        """
+        Явно включает кэширование запроса в версионном кэше каталога.
+
+        Параметры:
+            *scopes: Области каталога, от которых зависит результат: ('shop', id), ('category', id),
+                ('product', id). Изменение любой из них сбрасывает запись.
+
+        Возвращает:
+            list: Объекты запроса.
+        """
+        return catalog_cache.cached_querysets([(self, scopes)], timeout=timeout)[0]
+
+
 class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -80,6 +155,14 @@ class Product(models.Model):
     category = models.ForeignKey('ProductCategory', on_delete=models.PROTECT, related_name='product')
     shop = models.ForeignKey('Shop', on_delete=models.CASCADE, related_name='products')
 
+    objects = CatalogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            SearchIndex('name', name='product_name_search_idx'),
+            SearchIndex('model', name='product_model_search_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -111,4 +194,106 @@ class BasketProduct(models.Model):
     quantity = models.IntegerField(default=1)
 
     class Meta:
-        unique_together = ('basket', 'product')
\ No newline at end of file
+        unique_together = ('basket', 'product')
+
+class ShopSalesDaily(models.Model):
+    shop = models.ForeignKey('Shop', on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'day'], name='shop_sales_daily_unique'),
+        ]
+
+
+class ProductSalesDaily(models.Model):
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='daily_sales')
+    shop = models.ForeignKey('Shop', on_delete=models.CASCADE, related_name='product_daily_sales')
+    day = models.DateField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='product_sales_daily_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', 'day'], name='product_sales_shop_day_idx'),
+        ]
+
+
+class EmailOutbox(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    # Письма о заказе хранят только тип, заказ и магазин: получатель и текст
+    # формируются в воркере при отправке.
+    kind = models.CharField(max_length=30, blank=True, default='')
+    order = models.ForeignKey('Order', on_delete=models.CASCADE, null=True, blank=True, related_name='emails')
+    shop = models.ForeignKey('Shop', on_delete=models.CASCADE, null=True, blank=True, related_name='emails')
+    recipient = models.EmailField(blank=True, default='')
+    subject = models.CharField(max_length=255, blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='email_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient or self.kind}: {self.subject or self.order_id}'
+
+
+class CatalogChange(models.Model):
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (UPSERT, 'Upsert'),
+        (DELETE, 'Delete'),
+    )
+
+    # Журнал изменений товаров для GET products/changes/: id записи - курсор клиента.
+    # Без внешнего ключа: запись об удалении переживает сам товар.
+    product_id = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default=UPSERT)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.pk}: {self.action} {self.product_id}'
+
+
+class CatalogImport(models.Model):
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    # Файл большого каталога для загрузки в очереди imports: в брокер уходит только id записи.
+    # Содержимое очищается после загрузки.
+    shop = models.ForeignKey('Shop', on_delete=models.CASCADE, related_name='catalog_imports')
+    content = models.BinaryField(blank=True, default=b'')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.shop_id}: {self.status} {self.created_at}'
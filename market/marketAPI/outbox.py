@@ -0,0 +1,175 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from . import emails
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(messages):
+    """
+    Записывает письма в outbox.
+
+    Вызывается внутри транзакции, которая создаёт сам объект (например, заказ): при откате
+    транзакции письма тоже не будут отправлены.
+
+    Параметры:
+        messages (iterable): Письма [(recipient, subject, body), ...].
+    """
+    return EmailOutbox.objects.bulk_create(
+        EmailOutbox(recipient=recipient, subject=subject, body=body) for recipient, subject, body in messages
+    )
+
+
+def enqueue_order(order, shop_ids):
+    """
+    Записывает в outbox письма о новом заказе: подтверждение покупателю и уведомления магазинам.
+
+    Сохраняются только id заказа и магазинов, поэтому стоимость записи не зависит от размера
+    заказа, а тексты писем формируются в воркере.
+
+    Параметры:
+        order (Order): Новый заказ.
+        shop_ids (iterable): id магазинов, чьи товары есть в заказе.
+    """
+    return EmailOutbox.objects.bulk_create(
+        [EmailOutbox(kind=emails.ORDER_CONFIRMATION, order=order)]
+        + [EmailOutbox(kind=emails.SUPPLIER_DIGEST, order=order, shop_id=shop_id) for shop_id in sorted(shop_ids)]
+    )
+
+
+def _render(batch):
+    """
+    Формирует получателя и текст писем, сохранённых только с id заказа.
+
+    Все заказы пачки загружаются одним набором запросов. Письма, которые не удалось
+    сформировать, откладываются как при ошибке отправки.
+
+    Возвращает:
+        list: Письма, готовые к отправке.
+    """
+    pending = [item for item in batch if not item.body]
+    if not pending:
+        return batch
+
+    orders = emails.load_orders({item.order_id for item in pending})
+    rendered = []
+    broken = []
+    for item in pending:
+        try:
+            item.recipient, item.subject, item.body = emails.render(item.kind, orders[item.order_id], item.shop_id)
+        except Exception as e:
+            logger.error(f'Error rendering email {item.pk}: {e}')
+            _fail([item], e)
+            broken.append(item)
+        else:
+            rendered.append(item)
+    EmailOutbox.objects.bulk_update(rendered, ['recipient', 'subject', 'body'])
+    return [item for item in batch if item not in broken]
+
+
+def _claim_batch(batch_size):
+    """
+    Забирает пачку писем, которые пора отправлять, и откладывает их на время обработки,
+    чтобы параллельный диспетчер не отправил их второй раз.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        EmailOutbox.objects.filter(pk__in=[item.pk for item in batch]).update(
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        )
+    return batch
+
+
+def _coalesce(items):
+    """
+    Объединяет письма одному получателю в одно письмо.
+    """
+    if len(items) == 1:
+        return items[0].subject, items[0].body
+    subject = f'Уведомления ({len(items)})'
+    body = '\n\n----------\n\n'.join(f'{item.subject}\n\n{item.body}' for item in items)
+    return subject, body
+
+
+def _fail(items, error):
+    now = timezone.now()
+    backoff = settings.EMAIL_OUTBOX_RETRY_BACKOFF
+    max_attempts = settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+    for item in items:
+        item.attempts += 1
+        item.last_error = str(error)
+        if item.attempts >= max_attempts:
+            item.status = EmailOutbox.FAILED
+        else:
+            item.next_attempt_at = now + timedelta(seconds=backoff * 2 ** (item.attempts - 1))
+    EmailOutbox.objects.bulk_update(items, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def dispatch(batch_size=None):
+    """
+    Отправляет письма из outbox пачками через одно соединение.
+
+    Письма одному получателю в пачке объединяются в одно. Отправка ограничена
+    EMAIL_OUTBOX_RATE_LIMIT писем в секунду. При ошибке письмо откладывается
+    с экспоненциально растущей паузой, после EMAIL_OUTBOX_MAX_ATTEMPTS попыток
+    помечается как failed.
+
+    Параметры:
+        batch_size (int, optional): Размер пачки, по умолчанию EMAIL_OUTBOX_BATCH_SIZE.
+
+    Возвращает:
+        int: Количество отправленных писем.
+    """
+    batch = _render(_claim_batch(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE))
+    if not batch:
+        return 0
+
+    recipients = {}
+    for item in batch:
+        recipients.setdefault(item.recipient, []).append(item)
+
+    rate_limit = settings.EMAIL_OUTBOX_RATE_LIMIT
+    interval = 1 / rate_limit if rate_limit else 0
+    from_email = settings.DEFAULT_FROM_EMAIL
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f'Error opening email connection: {e}')
+        _fail(batch, e)
+        return 0
+
+    sent_items = []
+    try:
+        for recipient, items in recipients.items():
+            started = time.monotonic()
+            subject, body = _coalesce(items)
+            try:
+                connection.send_messages([EmailMessage(subject, body, from_email, [recipient])])
+            except Exception as e:
+                logger.warning(f'Error sending email to {recipient}: {e}')
+                _fail(items, e)
+            else:
+                sent_items += items
+            if interval:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        connection.close()
+        EmailOutbox.objects.filter(pk__in=[item.pk for item in sent_items]).update(
+            status=EmailOutbox.SENT, sent_at=timezone.now()
+        )
+    return len({item.recipient for item in sent_items})
@@ -0,0 +1,163 @@
+"""
+Выборочное профилирование запросов.
+
+Полная запись silk (запрос, ответ, SQL с трассировкой, EXPLAIN) дорогая, поэтому она
+включается только для доли запросов: PROFILING_SAMPLE_RATE по умолчанию и PROFILING_ROUTE_RATES
+по префиксам путей. Для остальных запросов ProfilingMiddleware собирает только текст
+и длительность SQL-запросов и сохраняет их в silk, если запрос выполнялся дольше
+PROFILING_SLOW_REQUEST_MS. PROFILING_ENABLED=False отключает всё, включая выборку Sentry.
+"""
+import logging
+import random
+import time
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def sample_rate(path):
+    """
+    Доля запросов к пути, которые профилируются полностью.
+
+    Берётся ставка самого длинного подходящего префикса из PROFILING_ROUTE_RATES,
+    иначе PROFILING_SAMPLE_RATE.
+    """
+    if not settings.PROFILING_ENABLED:
+        return 0.0
+    rates = settings.PROFILING_ROUTE_RATES
+    prefixes = [prefix for prefix in rates if path.startswith(prefix)]
+    if prefixes:
+        return rates[max(prefixes, key=len)]
+    return settings.PROFILING_SAMPLE_RATE
+
+
+def should_intercept(request):
+    """
+    SILKY_INTERCEPT_FUNC: silk записывает только запросы, выбранные ProfilingMiddleware.
+    """
+    return getattr(request, 'profiling_sampled', False)
+
+
+def traces_sampler(sampling_context):
+    """
+    traces_sampler для Sentry с теми же ставками, что и у silk.
+
+    Если решение уже принято вызывающим сервисом (parent_sampled), оно сохраняется, чтобы
+    распределённая трассировка не рвалась. PROFILING_ENABLED=False отключает и такие транзакции.
+    """
+    if not settings.PROFILING_ENABLED:
+        return 0.0
+    if sampling_context.get('parent_sampled') is not None:
+        return float(sampling_context['parent_sampled'])
+    environ = sampling_context.get('wsgi_environ') or {}
+    scope = sampling_context.get('asgi_scope') or {}
+    path = environ.get('PATH_INFO') or scope.get('path')
+    if path is None:
+        # Не HTTP-транзакция, например задача Celery.
+        return settings.PROFILING_SAMPLE_RATE
+    return sample_rate(path)
+
+
+class _QueryTimer:
+    """
+    Обёртка execute_wrapper: запоминает текст и длительность SQL-запросов.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = timezone.now()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, started, timezone.now()))
+
+
+def _record_slow_request(request, started, elapsed, queries):
+    from silk.models import Request, SQLQuery
+
+    silk_request = Request.objects.create(
+        path=request.path[:190],
+        query_params=request.META.get('QUERY_STRING', ''),
+        method=request.method,
+        start_time=started,
+        end_time=started + timedelta(seconds=elapsed),
+        time_taken=elapsed * 1000,
+        view_name=getattr(getattr(request, 'resolver_match', None), 'view_name', '') or '',
+    )
+    SQLQuery.objects.bulk_create([
+        SQLQuery(query=sql, start_time=query_start, end_time=query_end, request=silk_request, traceback='')
+        for sql, query_start, query_end in queries
+    ])
+
+
+class ProfilingMiddleware:
+    """
+    Решает, профилировать ли запрос, и записывает медленные запросы.
+
+    Должен стоять перед silk.middleware.SilkyMiddleware. Под ASGI SQL-запросы выполняются
+    в других потоках и не собираются: медленный запрос записывается только с временем.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._start(request):
+            return self.get_response(request)
+
+        timer = _QueryTimer()
+        started, clock = timezone.now(), time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - clock
+        if self._is_slow(elapsed):
+            self._record(request, started, elapsed, timer.queries)
+        return response
+
+    async def __acall__(self, request):
+        if not self._start(request):
+            return await self.get_response(request)
+
+        started, clock = timezone.now(), time.perf_counter()
+        response = await self.get_response(request)
+        elapsed = time.perf_counter() - clock
+        if self._is_slow(elapsed):
+            await sync_to_async(self._record)(request, started, elapsed, [])
+        return response
+
+    def _start(self, request):
+        """
+        Возвращает True, если нужно замерить запрос для записи медленных запросов.
+        """
+        if not settings.PROFILING_ENABLED:
+            return False
+        rate = sample_rate(request.path)
+        request.profiling_sampled = rate > 0 and random.random() < rate
+        return not request.profiling_sampled and bool(settings.PROFILING_SLOW_REQUEST_MS)
+
+    def _is_slow(self, elapsed):
+        return elapsed * 1000 >= settings.PROFILING_SLOW_REQUEST_MS
+
+    def _record(self, request, started, elapsed, queries):
+        logger.warning(f'Slow request {request.method} {request.path}: {elapsed * 1000:.0f}ms, '
+                       f'{len(queries)} queries')
+        if apps.is_installed('silk'):
+            try:
+                _record_slow_request(request, started, elapsed, queries)
+            except Exception as e:
+                logger.error(f'Error recording slow request: {e}')
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ProductCategory, UserType
+
+
+class ReferenceCache:
+    """
+    Кэш небольшого справочника в памяти процесса.
+
+    Таблица загружается целиком при первом обращении, после этого поиск по id и по имени
+    не обращается к базе данных. Изменения справочника увеличивают версию в общем кэше
+    (см. marketAPI.signals), а процессы сверяют свою копию с этой версией не чаще раза
+    в REFERENCE_CACHE_CHECK_INTERVAL секунд.
+
+    Параметры:
+        model (Model): Модель справочника.
+        name_field (str): Поле с уникальным именем записи.
+    """
+
+    def __init__(self, model, name_field):
+        self.model = model
+        self.name_field = name_field
+        self._lock = threading.Lock()
+        self._by_id = None
+        self._by_name = None
+        self._version = None
+        self._checked_at = 0
+
+    @property
+    def _version_key(self):
+        return f'reference:{self.model._meta.label_lower}:version'
+
+    def _current_version(self):
+        version = cache.get(self._version_key)
+        if version is None:
+            version = time.time_ns()
+            cache.add(self._version_key, version, timeout=None)
+            version = cache.get(self._version_key, version)
+        return version
+
+    def _rows(self):
+        interval = settings.REFERENCE_CACHE_CHECK_INTERVAL
+        with self._lock:
+            now = time.monotonic()
+            if self._by_id is None or now - self._checked_at >= interval:
+                version = self._current_version()
+                if self._by_id is None or version != self._version:
+                    rows = list(self.model.objects.all())
+                    self._by_id = {row.pk: row for row in rows}
+                    self._by_name = {getattr(row, self.name_field): row for row in rows}
+                    self._version = version
+                self._checked_at = now
+            return self._by_id, self._by_name
+
+    def get(self, pk):
+        """Возвращает запись по id или None."""
+        return self._rows()[0].get(pk)
+
+    def get_by_name(self, name):
+        """Возвращает запись по имени или None."""
+        return self._rows()[1].get(name)
+
+    def id_for(self, name):
+        """Возвращает id записи с указанным именем или None."""
+        row = self.get_by_name(name)
+        return row.pk if row is not None else None
+
+    def get_or_create(self, name):
+        """Возвращает запись по имени, создавая её, если справочник её ещё не содержит."""
+        row = self.get_by_name(name)
+        if row is None:
+            row, _ = self.model.objects.get_or_create(**{self.name_field: name})
+        return row
+
+    def invalidate(self):
+        """
+        Сбрасывает справочник во всех процессах.
+        """
+        cache.set(self._version_key, time.time_ns(), timeout=None)
+        with self._lock:
+            self._by_id = self._by_name = None
+
+
+user_types = ReferenceCache(UserType, 'type')
+categories = ReferenceCache(ProductCategory, 'name')
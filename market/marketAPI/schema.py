@@ -0,0 +1,186 @@
+"""
+Заранее построенная схема OpenAPI.
+
+SpectacularAPIView строит схему заново на каждый запрос, обходя все представления
+и сериализаторы. Здесь схема строится один раз: командой build_openapi_schema при сборке
+или деплое (файл OPENAPI_SCHEMA_FILE), а если файла нет - первым запросом, и тогда
+сохраняется в общем кэше на OPENAPI_SCHEMA_CACHE_TIMEOUT секунд под ключом с хэшем кода
+проекта. Каждый процесс держит готовые ответы в YAML и JSON, уже сжатые gzip, и отдаёт их с ETag.
+"""
+import functools
+import gzip
+import hashlib
+import json
+import threading
+from importlib import import_module
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+
+_lock = threading.Lock()
+_documents = None
+
+FORMATS = {
+    'yaml': 'application/vnd.oai.openapi',
+    'json': 'application/vnd.oai.openapi+json',
+}
+
+
+@functools.cache
+def _code_version():
+    """
+    Хэш исходников URLconf и приложений проекта и версии drf-spectacular: после выкладки новые
+    процессы не берут из общего кэша схему, построенную старым кодом с той же VERSION.
+    """
+    from drf_spectacular import __version__
+
+    base_dir = Path(settings.BASE_DIR).resolve()
+    roots = {Path(import_module(settings.ROOT_URLCONF).__file__).resolve().parent}
+    roots.update(Path(config.path).resolve() for config in apps.get_app_configs()
+                 if Path(config.path).resolve().is_relative_to(base_dir))
+    digest = hashlib.sha256(__version__.encode())
+    for path in sorted(path for root in roots for path in root.rglob('*.py')):
+        digest.update(str(path.relative_to(base_dir)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _cache_key():
+    return f'openapi:schema:{settings.SPECTACULAR_SETTINGS.get("VERSION", "")}:{_code_version()}'
+
+
+def generate():
+    """
+    Строит схему так же, как SpectacularAPIView.
+
+    Возвращает:
+        dict: Схема OpenAPI.
+    """
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(urlconf=spectacular_settings.SERVE_URLCONF)
+    # Круг через JSON: в схеме остаются только типы, которые переживают запись в файл или кэш.
+    return json.loads(render(generator.get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC), 'json'))
+
+
+def render(schema, schema_format):
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+
+    renderer = OpenApiJsonRenderer() if schema_format == 'json' else OpenApiYamlRenderer()
+    return renderer.render(schema, renderer_context={})
+
+
+def build(path=None):
+    """
+    Строит схему, записывает её в файл и сбрасывает кэш (вызывается командой build_openapi_schema).
+
+    Возвращает:
+        dict: Схема OpenAPI.
+    """
+    schema = generate()
+    with open(path or settings.OPENAPI_SCHEMA_FILE, 'wb') as file:
+        file.write(render(schema, 'json'))
+    cache.delete(_cache_key())
+    reset()
+    return schema
+
+
+def load():
+    """
+    Схема из файла, из общего кэша или построенная заново (в таком порядке).
+    """
+    try:
+        with open(settings.OPENAPI_SCHEMA_FILE, 'rb') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        pass
+    schema = cache.get(_cache_key())
+    if schema is None:
+        schema = generate()
+        cache.set(_cache_key(), schema, timeout=settings.OPENAPI_SCHEMA_CACHE_TIMEOUT)
+    return schema
+
+
+def documents():
+    """
+    Готовые ответы: {формат: (тело, тело в gzip, ETag)}.
+
+    Сжатый ответ - другое представление ресурса, поэтому его ETag получает суффикс -gzip.
+    """
+    global _documents
+    if _documents is None:
+        with _lock:
+            if _documents is None:
+                schema = load()
+                prepared = {}
+                for schema_format in FORMATS:
+                    body = render(schema, schema_format)
+                    prepared[schema_format] = (body, gzip.compress(body, mtime=0),
+                                               hashlib.sha256(body).hexdigest()[:32])
+                _documents = prepared
+    return _documents
+
+
+def reset():
+    global _documents
+    with _lock:
+        _documents = None
+
+
+def _negotiate(request):
+    requested = request.GET.get('format')
+    if requested in FORMATS:
+        return requested
+    # application/json и application/vnd.oai.openapi+json; Swagger UI запрашивает JSON.
+    return 'json' if 'json' in request.headers.get('Accept', '') else 'yaml'
+
+
+def _accepts_gzip(request):
+    """
+    Принимает ли клиент gzip с учётом q-значений: 'gzip;q=0' запрещает сжатие, '*' разрешает.
+    """
+    accepted = {}
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.lower()] = quality
+    return accepted.get('gzip', accepted.get('x-gzip', accepted.get('*', 0.0))) > 0
+
+
+@require_GET
+def schema_view(request):
+    """
+    Схема OpenAPI в YAML (по умолчанию) или JSON (?format=json или Accept с json).
+
+    Ответ сжимается gzip, если клиент его принимает (с q больше 0), повторный запрос
+    с If-None-Match получает 304.
+    """
+    schema_format = _negotiate(request)
+    body, compressed, digest = documents()[schema_format]
+    use_gzip = _accepts_gzip(request)
+    etag = f'"{digest}-gzip"' if use_gzip else f'"{digest}"'
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    elif use_gzip:
+        response = HttpResponse(compressed, content_type=FORMATS[schema_format])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(body, content_type=FORMATS[schema_format])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return response
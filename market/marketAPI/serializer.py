@@ -1,6 +1,7 @@
 from djoser.serializers import UserCreateSerializer, UserSerializer
 
-from .models import Product, ExtraParameter, BasketProduct, OrderProduct, User
+from .models import Product, ExtraParameter, BasketProduct, OrderProduct, Order, User, ShopSalesDaily, \
+    ProductSalesDaily
 
 from rest_framework import serializers
 
@@ -38,6 +39,21 @@ class DetailedProductSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'model', 'product_quantity', 'price', 'extra_parameters']
 
 
+class ProductChangeSerializer(serializers.ModelSerializer):
+    extra_parameters = ExtraParametersSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'model', 'product_quantity', 'price', 'category', 'shop', 'extra_parameters']
+
+
+class CatalogChangesSerializer(serializers.Serializer):
+    cursor = serializers.IntegerField()
+    has_more = serializers.BooleanField()
+    upserted = ProductChangeSerializer(many=True)
+    deleted = serializers.ListField(child=serializers.IntegerField())
+
+
 class ProductsSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -78,9 +94,39 @@ class BasketProductCreateSerializer(serializers.ModelSerializer):
         return basket_product
 
 
+class OrderProductSnapshotSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source='product_id')
+    name = serializers.CharField(source='product_name')
+    price = serializers.DecimalField(source='unit_price', max_digits=10, decimal_places=2)
+
+
 class OrderProductSerializer(serializers.ModelSerializer):
-    product = ProductsSerializer(read_only=True)
+    product = OrderProductSnapshotSerializer(source='*', read_only=True)
+
     class Meta:
         model = OrderProduct
         fields = ('id', 'order', 'product', 'quantity')
-        read_only_fields = ('id',)
\ No newline at end of file
+        read_only_fields = ('id',)
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    order_products = OrderProductSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'created_at', 'status', 'delivery_address', 'total_price', 'order_products')
+        read_only_fields = fields
+
+
+class ShopSalesDailySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ShopSalesDaily
+        fields = ('day', 'units', 'revenue')
+
+
+class ProductSalesDailySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ProductSalesDaily
+        fields = ('day', 'product', 'units', 'revenue')
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from . import authentication, catalog_cache, catalog_changes, reference
+from .models import CatalogChange, ExtraParameter, Product, ProductCategory, Shop, User, UserType
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, signal, **kwargs):
+    catalog_cache.invalidate(('product', instance.pk), ('shop', instance.shop_id))
+    catalog_changes.record([instance.pk], CatalogChange.DELETE if signal is post_delete else CatalogChange.UPSERT)
+
+
+@receiver([post_save, post_delete], sender=ExtraParameter)
+def extra_parameter_changed(sender, instance, **kwargs):
+    catalog_cache.invalidate(('product', instance.product_id))
+    catalog_changes.record([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+def category_changed(sender, instance, **kwargs):
+    catalog_cache.invalidate(('category', instance.pk))
+    _invalidate_reference(reference.categories)
+
+
+@receiver([post_save, post_delete], sender=UserType)
+def user_type_changed(sender, instance, **kwargs):
+    _invalidate_reference(reference.user_types)
+
+
+def _invalidate_reference(reference_cache):
+    # Сразу - для текущего процесса, после фиксации - чтобы другие процессы
+    # не успели загрузить справочник до коммита.
+    reference_cache.invalidate()
+    transaction.on_commit(reference_cache.invalidate)
+
+
+@receiver([post_save, post_delete], sender=Shop)
+def shop_changed(sender, instance, **kwargs):
+    catalog_cache.invalidate(('shop', instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Как и для пользователя: сразу и после фиксации, иначе параллельный запрос успеет
+    # снова положить токен в кэш до коммита удаления.
+    # После delete() первичный ключ экземпляра (сам токен) обнуляется, поэтому он запоминается заранее.
+    key = instance.key
+    authentication.invalidate_token(key)
+    transaction.on_commit(lambda: authentication.invalidate_token(key))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Смена пароля, деактивация, удаление: кэшированный пользователь больше не годится.
+    user_id = instance.pk
+    authentication.invalidate_user(user_id)
+    transaction.on_commit(lambda: authentication.invalidate_user(user_id))
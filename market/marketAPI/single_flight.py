@@ -0,0 +1,112 @@
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+from . import locks
+
+HIT = 'hit'
+MISS = 'miss'
+STALE = 'stale'
+EARLY_REFRESH = 'early_refresh'
+WAIT = 'wait'
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _expires_early(record, beta):
+    """
+    Вероятностное раннее обновление (XFetch): чем ближе истечение записи и чем дольше
+    она вычислялась, тем выше шанс, что запрос обновит её заранее.
+    """
+    if not beta:
+        return False
+    return time.time() - record['delta'] * beta * math.log(1 - random.random()) >= record['expires']
+
+
+def is_fresh(record, version, beta=1.0):
+    """
+    Можно ли отдать запись без пересчёта: версия совпадает, срок не истёк и не выпало раннее обновление.
+    """
+    return (record is not None and record['version'] == version and record['expires'] > time.time()
+            and not _expires_early(record, beta))
+
+
+def fetch_many(entries, timeout, lock_timeout=10, wait_timeout=5, stale_timeout=None, beta=1.0):
+    """
+    Возвращает значения из кэша, вычисляя отсутствующие только в одном запросе одновременно.
+
+    Запись хранится вместе с версией данных. Если записи нет, её версия устарела или подошло
+    время раннего обновления, запрос пытается взять короткую блокировку в кэше (см. locks). Взявший
+    блокировку вычисляет значение, остальные получают старое значение, а если его нет,
+    ждут новое до wait_timeout секунд и только потом вычисляют сами.
+
+    Параметры:
+        entries (list): Тройки (key, version, compute), compute - функция без аргументов.
+        timeout (int): Время, в течение которого запись считается свежей.
+        lock_timeout (int): Время жизни блокировки на вычисление.
+        wait_timeout (float): Сколько ждать значение, вычисляемое другим запросом.
+        stale_timeout (int, optional): Сколько хранить запись после истечения, чтобы отдавать
+            её во время пересчёта. По умолчанию равно timeout.
+        beta (float): Коэффициент раннего обновления, 0 отключает его.
+
+    Возвращает:
+        list: Пары (value, outcome) в порядке entries, outcome - одна из констант HIT, MISS,
+            STALE, EARLY_REFRESH, WAIT.
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+    records = cache.get_many([key for key, _, _ in entries])
+    token = locks.new_token()
+
+    results = [None] * len(entries)
+    owned = []
+    waiting = []
+    for index, (key, version, _) in enumerate(entries):
+        record = records.get(key)
+        fresh = record is not None and record['version'] == version and record['expires'] > time.time()
+        if fresh and not _expires_early(record, beta):
+            results[index] = (record['value'], HIT)
+        elif locks.acquire(_lock_key(key), token, lock_timeout):
+            owned.append(index)
+            results[index] = (None, EARLY_REFRESH if fresh else MISS)
+        elif record is not None:
+            results[index] = (record['value'], HIT if fresh else STALE)
+        else:
+            waiting.append(index)
+
+    if owned:
+        computed = {}
+        try:
+            for index in owned:
+                key, version, compute = entries[index]
+                started = time.monotonic()
+                value = compute()
+                computed[key] = {'version': version, 'value': value, 'delta': time.monotonic() - started,
+                                 'expires': time.time() + timeout}
+                results[index] = (value, results[index][1])
+            cache.set_many(computed, timeout=timeout + stale_timeout)
+        finally:
+            # Если пересчёт длился дольше lock_timeout, блокировку мог взять другой запрос: снимаются только свои.
+            locks.release([_lock_key(entries[index][0]) for index in owned], token)
+
+    deadline = time.monotonic() + wait_timeout
+    while waiting:
+        records = cache.get_many([entries[index][0] for index in waiting])
+        for index in list(waiting):
+            key, version, compute = entries[index]
+            record = records.get(key)
+            if record is not None and record['version'] == version:
+                results[index] = (record['value'], WAIT)
+                waiting.remove(index)
+            elif time.monotonic() >= deadline:
+                # Вычисляющий запрос не успел или упал: блокировка истечёт сама.
+                results[index] = (compute(), MISS)
+                waiting.remove(index)
+        if waiting:
+            time.sleep(0.05)
+
+    return results
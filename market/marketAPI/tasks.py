@@ -1,34 +1,72 @@
+import time
+from datetime import timedelta
+
 from celery import shared_task
-from django.core.mail import send_mail
+from django.conf import settings
+from django.utils import timezone
 
 # from market.celery import app
-import environ
+from . import catalog_changes, outbox
+from .models import EmailOutbox
+from .services import run_catalog_import
+
+
+@shared_task
+def dispatch_email_outbox():
+    """
+    Отправляет накопившиеся письма из outbox пачками.
+
+    Запускается после фиксации транзакции с заказом и периодически из celery beat,
+    чтобы подхватить письма, отложенные после ошибок отправки.
+
+    Возвращает:
+        int: Количество отправленных писем.
+    """
+    return outbox.dispatch()
 
-env = environ.Env()
-environ.Env.read_env()
 
 @shared_task
-def send_order_confirmation_email(order, products_list, total_price, to_email):
+def import_partner_catalog(import_id):
+    """
+    Загружает большой каталог партнёра в фоне (очередь imports).
 
-    subject = 'Подтверждение заказа'
-    message = (
-        f'Заказ №{order} создан успешно!\n\n'
-        f'Список товаров:\n{", ".join(products_list)}\n\n'
-        f'Общая стоимость: {total_price} руб.'
-    )
-    from_email = env("EMAIL_HOST")
+    Задача получает только id записи CatalogImport с файлом: сообщение в брокере остаётся
+    маленьким, а даты и другие типы YAML не проходят через сериализатор kombu.
+    """
+    return run_catalog_import(import_id)
 
 
-    send_mail(subject, message, from_email, [to_email])
+@shared_task
+def purge_email_outbox():
+    """
+    Удаляет отправленные письма из outbox старше EMAIL_OUTBOX_RETENTION_DAYS дней (очередь maintenance).
+
+    Возвращает:
+        int: Количество удалённых писем.
+    """
+    border = timezone.now() - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)
+    deleted, _ = EmailOutbox.objects.filter(status=EmailOutbox.SENT, sent_at__lt=border).delete()
+    return deleted
+
+
+@shared_task
+def purge_catalog_changes():
+    """
+    Удаляет записи журнала изменений каталога старше CATALOG_CHANGES_RETENTION_DAYS дней (очередь maintenance).
+
+    Возвращает:
+        int: Количество удалённых записей.
+    """
+    return catalog_changes.purge()
 
 
 @shared_task
-def send_order_confirmation_to_suppliers(data: list):
-    for sup in data:
-        subject = f"Уведомление о заказе: {sup.get("product")} был заказан"
-        message = (
-            f"Уважаемый(ая) {sup.get("shop")},\n\nМы получили заказ на {sup.get("product")}. Пожалуйста, подготовьте"
-                   f" продукт к отправке.\n\nС уважением, [Название вашей компании]"
-        )
-        from_email = env("EMAIL_HOST")
-        send_mail(subject, message, from_email, [sup.get("email")])
+def queue_probe(sent_at, busy=0):
+    """
+    Служебная задача для бенчмарка очередей: возвращает время ожидания в очереди
+    и, если задан busy, занимает воркер на указанное число секунд.
+    """
+    waited = time.time() - sent_at
+    if busy:
+        time.sleep(busy)
+    return waited
@@ -0,0 +1,126 @@
+import uuid
+
+from asgiref.sync import sync_to_async
+
+from rest_framework import exceptions, throttling
+from rest_framework.settings import api_settings
+
+from . import async_cache
+
+# Скользящее окно в sorted set: элементы - запросы, score - время запроса в микросекундах.
+# Время берётся у Redis, поэтому окно одинаково для всех воркеров независимо от их часов.
+SLIDING_WINDOW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+local window = tonumber(ARGV[1]) * 1000000
+local limit = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], math.ceil(window / 1000))
+    return {1, 0}
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, math.max(0, tonumber(oldest[2]) + window - now)}
+"""
+
+# Окно хранится отдельно от списка времён запросов DRF (ключ throttle_<scope>_<ident>): классы DRF
+# в fallback-режиме или старые воркеры при выкатке пишут туда строку, и ZADD получил бы WRONGTYPE.
+SLIDING_WINDOW_PREFIX = 'throttle_sw:'
+
+
+class RedisSlidingWindowMixin:
+    """
+    Хранит окно запросов троттлинга в Redis и проверяет его одним Lua-скриптом.
+
+    Проверка и запись запроса выполняются атомарно за одно обращение к Redis, поэтому
+    параллельные воркеры не перезаписывают историю друг друга, как это происходит
+    со списком времён запросов во встроенных классах DRF. Область (scope) и частота
+    (DEFAULT_THROTTLE_RATES) задаются как в DRF. Если кэш не Redis (например, в тестах),
+    используется реализация DRF.
+    """
+
+    _scripts = {}
+
+    def _get_script(self):
+        get_client = getattr(getattr(self.cache, 'client', None), 'get_client', None)
+        if get_client is None:
+            return None
+        client = get_client(write=True)
+        script = self._scripts.get(id(client))
+        if script is None:
+            script = self._scripts[id(client)] = client.register_script(SLIDING_WINDOW_SCRIPT)
+        return script
+
+    def window_key(self):
+        """
+        Ключ sorted set окна в Redis для текущего self.key.
+        """
+        return self.cache.make_key(SLIDING_WINDOW_PREFIX + self.key)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        script = self._get_script()
+        if script is None:
+            return super().allow_request(request, view)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        allowed, self._wait = script(keys=[self.window_key()],
+                                     args=[self.duration, self.num_requests, uuid.uuid4().hex])
+        return bool(allowed)
+
+    async def aallow_request(self, request, view=None):
+        """
+        Асинхронный allow_request() для async-представлений: скрипт выполняется асинхронным
+        клиентом Redis, без Redis проверка DRF выполняется в потоке.
+        """
+        if self.rate is None:
+            return True
+
+        script = async_cache.script(SLIDING_WINDOW_SCRIPT)
+        if script is None:
+            return await sync_to_async(super().allow_request)(request, view)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        allowed, self._wait = await script(keys=[self.window_key()],
+                                           args=[self.duration, self.num_requests, uuid.uuid4().hex])
+        return bool(allowed)
+
+    def wait(self):
+        if hasattr(self, '_wait'):
+            return self._wait / 1000000
+        return super().wait()
+
+
+class AnonRateThrottle(RedisSlidingWindowMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(RedisSlidingWindowMixin, throttling.UserRateThrottle):
+    pass
+
+
+async def athrottle(request):
+    """
+    Проверяет запрос async-представления классами DEFAULT_THROTTLE_CLASSES.
+
+    Исключения:
+        Throttled: Запрос отклонён, как в DRF.
+    """
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if isinstance(throttle, RedisSlidingWindowMixin):
+            allowed = await throttle.aallow_request(request)
+        else:
+            allowed = await sync_to_async(throttle.allow_request)(request, None)
+        if not allowed:
+            raise exceptions.Throttled(throttle.wait())
@@ -2,32 +2,40 @@ from itertools import product
 
 from django.shortcuts import render
 
-import yaml
 import logging
+from datetime import timedelta
+from django.conf import settings
 from django.core.mail import send_mail
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.http import JsonResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.generics import GenericAPIView
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import ProductCategory, Product, ExtraParameter, BasketProduct, OrderProduct, Order, UserType, \
-    Basket, Shop
+from .models import Product, BasketProduct, OrderProduct, Order, Basket, Shop, CatalogImport
 from .serializer import DetailedProductSerializer, BasketProductSerializer, \
-    OrderProductSerializer, ProductSerializer, BasketProductCreateSerializer, MarketUserSerializer
+    OrderSerializer, ProductSerializer, BasketProductCreateSerializer, MarketUserSerializer, ShopSalesDailySerializer, \
+    ProductSalesDailySerializer, CatalogChangesSerializer
 
-import environ
+from .idempotency import idempotent
+from .reference import user_types
+from .services import InsufficientStock, reserve_stock, release_stock, record_sales, import_catalog, \
+    catalog_scopes, parse_catalog
 
-from .tasks import send_order_confirmation_to_suppliers, send_order_confirmation_email
+from . import catalog_cache, catalog_changes, outbox
+from .tasks import dispatch_email_outbox, import_partner_catalog
 
 logger = logging.getLogger(__name__)
-env = environ.Env()
-environ.Env.read_env()
 
 class UpdateUserAddressView(APIView):
     """
@@ -95,48 +103,63 @@ class PartnerUpdateView(GenericAPIView):
 
         Возвращает:
             JsonResponse: Ответ с информацией о статусе операции. В случае
-            успешного выполнения возвращает {'Status': 'OK'}. В случае ошибки
+            успешного выполнения возвращает {'Status': 'OK'}. Большие каталоги (больше
+            PARTNER_IMPORT_ASYNC_THRESHOLD товаров) загружаются в очереди imports,
+            тогда возвращается {'Status': 'Queued', 'Import': id записи CatalogImport}
+            со статусом 202. В случае ошибки
             возвращает объект JsonResponse с соответствующим сообщением и кодом состояния.
         """
-        if request.user.type_id == UserType.objects.get(type="customer").id:
+        if request.user.type_id == user_types.id_for("customer"):
             return JsonResponse({'Status': False, 'Error': 'Shop only'}, status=403)
 
         file = request.data.get('file')
         if not file:
             return JsonResponse({'Status': False, 'Error': 'No file provided'}, status=400)
 
+        content = file.read()
         try:
-            data = yaml.safe_load(file.read())
+            data = parse_catalog(content)
         except Exception as e:
             logger.error(f"Error loading YAML: {e}")
             return JsonResponse({'Status': False, 'Error': 'Invalid YAML file'}, status=400)
 
         shop_id = request.user.shop.id
 
-        for category in data.get('categories'):
-            ProductCategory.objects.update_or_create(
-                id=category.get('id'),
-                name=category.get('name')
-            )
-        for good in data.get('goods'):
-            Product.objects.update_or_create(
-                id=good.get('id'),
-                model=good.get('model'),
-                name=good.get('name'),
-                price=good.get('price'),
-                product_quantity=good.get('quantity'),
-                category_id=good.get('category'),
-                shop_id=shop_id
-            )
-            for parameter, value in good.get('parameters').items():
-                ExtraParameter.objects.update_or_create(
-                    name=parameter,
-                    value=value,
-                    product_id=good.get('id')
-                )
+        if len(data.get('goods') or []) > settings.PARTNER_IMPORT_ASYNC_THRESHOLD:
+            staged = CatalogImport.objects.create(shop_id=shop_id, content=content)
+            transaction.on_commit(lambda: import_partner_catalog.delay(staged.pk))
+            return JsonResponse({'Status': 'Queued', 'Import': staged.pk}, status=202)
+
+        import_catalog(shop_id, data)
 
         return JsonResponse({'Status': 'OK'})
 
+def catalog_entries(shop_ids, category=None):
+    """
+    Запросы каталога по магазинам для catalog_cache.cached_querysets().
+
+    Параметры:
+        shop_ids (iterable): Магазины, принимающие заказы.
+        category (str, optional): id категории для фильтрации.
+    """
+    entries = []
+    for shop_id in shop_ids:
+        queryset = Product.objects.filter(shop_id=shop_id).order_by('pk')
+        scopes = [('shop', shop_id)]
+        if category is not None:
+            queryset = queryset.filter(category_id=category)
+            scopes.append(('category', int(category)))
+        entries.append((queryset, scopes))
+    return entries
+
+
+def merge_catalog(shop_products):
+    """
+    Объединяет товары магазинов в один список, упорядоченный по id.
+    """
+    return sorted((product for products in shop_products for product in products), key=lambda product: product.pk)
+
+
 class ProductView(GenericAPIView):
     """
     Представление для получения списка продуктов или деталей конкретного продукта.
@@ -172,18 +195,70 @@ class ProductView(GenericAPIView):
 
         Возвращает:
             Response: Ответ с сериализованными данными о продуктах. Если `pk` не указан,
-            возвращает список всех продуктов (с фильтрацией по магазинам, которые принимают заказы).
-            Если `pk` указан, возвращает детали конкретного продукта.
+            возвращает список всех продуктов (с фильтрацией по магазинам, которые принимают заказы
+            и, если передан параметр category, по категории). Если `pk` указан, возвращает детали
+            конкретного продукта.
+
+        Примечание:
+            Товары каждого магазина кэшируются отдельно в версионном кэше каталога: загрузка
+            каталога магазина сбрасывает только его записи, остальные магазины остаются в кэше.
         """
         if pk is None:
-            products = Product.objects.filter(shop__accepting_status=True)
+            category = request.query_params.get('category')
+            if category is not None and not category.isdecimal():
+                return Response({'Status': False, 'Error': 'Invalid category'}, status=status.HTTP_400_BAD_REQUEST)
+
+            shop_ids = Shop.objects.filter(accepting_status=True).values_list('pk', flat=True)
+            products = merge_catalog(catalog_cache.cached_querysets(catalog_entries(shop_ids, category)))
             serializer = self.get_serializer_class()(products, many=True)
         else:
-            product = Product.objects.get(pk=pk)
-            serializer = self.get_serializer_class()(product)
+            products = Product.objects.filter(pk=pk).prefetch_related('extra_parameters').cached(('product', pk))
+            if not products:
+                return Response({'Status': False, 'Error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+            serializer = self.get_serializer_class()(products[0])
         return Response(serializer.data)
 
 
+class ProductChangesView(GenericAPIView):
+    """
+    Изменения каталога после курсора для инкрементальной синхронизации.
+
+    Без параметра since возвращает текущий курсор: клиент запоминает его, выгружает полный
+    список products/ и дальше запрашивает только изменения. Ответ содержит текущие данные
+    изменённых товаров и id удалённых, курсор для следующего запроса и признак has_more.
+
+    Параметры запроса:
+        since (int): Курсор из прошлого ответа.
+        limit (int): Записей журнала на странице, не больше CATALOG_CHANGES_PAGE_SIZE.
+    """
+    serializer_class = CatalogChangesSerializer
+
+    def get(self, request):
+        """
+        Обрабатывает GET-запрос для получения изменений каталога.
+
+        Возвращает:
+            Response: Изменения после курсора, ошибку 400 при неверных параметрах или 410,
+            если записи после курсора уже удалены из журнала и нужна полная синхронизация.
+        """
+        since = request.query_params.get('since')
+        limit = request.query_params.get('limit', '')
+        # isdigit() пропускает надстрочные цифры вроде '²', на которых int() падает.
+        if (since is not None and not since.isdecimal()) or (limit and not limit.isdecimal()):
+            return Response({'Status': False, 'Error': 'Invalid since or limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if since is None:
+            data = {'cursor': catalog_changes.current_cursor(), 'has_more': False, 'upserted': [], 'deleted': []}
+        else:
+            page_size = settings.CATALOG_CHANGES_PAGE_SIZE
+            try:
+                data = catalog_changes.changes(int(since), min(int(limit or page_size), page_size) or page_size)
+            except catalog_changes.CursorExpired:
+                return Response({'Status': False, 'Error': 'Cursor expired, full resync required'},
+                                status=status.HTTP_410_GONE)
+        return Response(self.get_serializer(data).data)
+
+
 class BasketProductViewSet(viewsets.GenericViewSet):
     """
     Представление для управления продуктами в корзине пользователя.
@@ -220,7 +295,7 @@ class BasketProductViewSet(viewsets.GenericViewSet):
             return Response([], status=status.HTTP_200_OK)
 
         # Получаем продукты в корзине
-        queryset = self.queryset.filter(basket=basket)
+        queryset = self.queryset.filter(basket=basket).select_related('product')
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -267,29 +342,59 @@ class BasketProductViewSet(viewsets.GenericViewSet):
         return Response(serializer.errors, status=400)
 
 
+class OrderHistoryPagination(CursorPagination):
+    """
+    Курсорная пагинация истории заказов по дате создания.
+
+    Курсор опирается на индекс (user, created_at), поэтому стоимость страницы не зависит
+    от того, сколько всего заказов у покупателя и насколько далеко он пролистал. Первичный ключ
+    задаёт однозначный порядок заказов, созданных в одно и то же время.
+    """
+    ordering = ('-created_at', '-pk')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
 class OrderProductModelViewSet(viewsets.ModelViewSet):
     """
         Обработчик для управления заказами продуктов.
 
-        Этот класс предоставляет методы для создания, чтения, обновления и удаления экземпляров OrderProduct
+        Этот класс предоставляет историю заказов текущего пользователя и создание нового заказа
         через REST API. Основное внимание уделяется созданию нового заказа продукта, который включает в себя
         обработку корзины пользователя и отправку подтверждения заказа по электронной почте.
 
+        История заказов возвращается постранично (курсор по дате создания), каждый заказ содержит
+        свои позиции, которые подгружаются одним запросом на страницу.
+
         Атрибуты:
-            queryset (QuerySet): Набор данных для модели OrderProduct.
-            serializer_class (Serializer): Сериализатор, используемый для валидации и
-                преобразования данных OrderProduct.
+            serializer_class (Serializer): Сериализатор заказа с вложенными позициями.
+            pagination_class (CursorPagination): Пагинация истории заказов.
+            permission_classes (list): Доступ только для аутентифицированных пользователей.
         """
-    queryset = OrderProduct.objects.all()
-    serializer_class = OrderProductSerializer
+    serializer_class = OrderSerializer
+    pagination_class = OrderHistoryPagination
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'head', 'options']
 
+    def get_queryset(self):
+        """
+        Возвращает заказы текущего пользователя вместе с позициями.
+
+        Позиции хранят снимок товара на момент заказа, поэтому join с Product не нужен.
+        """
+        return Order.objects.filter(user=self.request.user).prefetch_related('order_products')
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         Создает новый заказ на основе продуктов в корзине пользователя.
 
         Этот метод извлекает продукты из корзины текущего пользователя, создает новый экземпляр заказа и
         соответствующие экземпляры OrderProduct. Он также рассчитывает общую стоимость заказа, очищает корзину
-        и отправляет подтверждение заказа по электронной почте.
+        и записывает письма покупателю и поставщикам в outbox в той же транзакции. В outbox попадают
+        только id заказа и магазинов: тексты писем формирует и отправляет задача dispatch_email_outbox
+        после фиксации транзакции.
 
         Параметры:
             request (Request): Объект запроса, содержащий данные о заказе и
@@ -304,38 +409,128 @@ class OrderProductModelViewSet(viewsets.ModelViewSet):
         Примечание:
             Если в корзине нет продуктов, будет создан пустой заказ.
             Убедитесь, что корзина пользователя не пуста перед вызовом этого метода.
+            Товар резервируется на складе в той же транзакции, что и заказ. Если какой-либо позиции
+            не хватает, заказ не создаётся, корзина не меняется, а ответ со статусом 409 содержит
+            отчёт по каждой такой позиции.
+            Клиент может передать заголовок Idempotency-Key: повтор запроса с тем же ключом
+            вернёт ответ первой попытки и не создаст второй заказ.
         """
         basket = request.user.basket
-        basketproducts = basket.position.all()
-        order = Order.objects.create(user=request.user,
-                                     status='active',
-                                     delivery_address=request.data.get("delivery_address", request.user.address))
-        total_price = 0
-        products_list = []
-        for basketproduct in basketproducts:
-            order_product = OrderProduct.objects.create(order=order, product=basketproduct.product, quantity=basketproduct.quantity)
-            total_price += order_product.product.price * order_product.quantity
-            products_list.append(f"{order_product.product.name} - {order_product.quantity} шт. по цене {order_product.product.price} руб.")
-
-        order.total_price = total_price
-        order.save()
-        basket.position.all().delete()
-
-        send_order_confirmation_email.delay(order.pk, products_list, total_price, request.user.email)
-
-        data_for_suppliers = [
-            {
-                'product': product.name,
-                'shop': product.shop.name,
-                'email': product.shop.user.email
-            }
-            for product in order.product.all()
-        ]
-        send_order_confirmation_to_suppliers.delay(data_for_suppliers)
-
+        try:
+            with transaction.atomic():
+                basketproducts = list(basket.position.select_related('product'))
+                reserve_stock((basketproduct.product_id, basketproduct.quantity) for basketproduct in basketproducts)
+                catalog_cache.invalidate(*catalog_scopes(
+                    (basketproduct.product_id, basketproduct.product.shop_id) for basketproduct in basketproducts))
+
+                order = Order.objects.create(user=request.user,
+                                             status='active',
+                                             delivery_address=request.data.get("delivery_address", request.user.address))
+                order_products = OrderProduct.objects.bulk_create([
+                    OrderProduct(order=order, product_id=basketproduct.product_id, quantity=basketproduct.quantity,
+                                 unit_price=basketproduct.product.price, product_name=basketproduct.product.name,
+                                 shop_id=basketproduct.product.shop_id)
+                    for basketproduct in basketproducts
+                ])
+                total_price = 0
+                for order_product in order_products:
+                    total_price += order_product.unit_price * order_product.quantity
+
+                order.total_price = total_price
+                order.save()
+                record_sales(((order_product.product_id, order_product.shop_id, order_product.quantity,
+                               order_product.unit_price) for order_product in order_products),
+                             timezone.localdate(order.created_at))
+                basket.position.all().delete()
+
+                outbox.enqueue_order(order, {order_product.shop_id for order_product in order_products})
+                transaction.on_commit(dispatch_email_outbox.delay)
+        except InsufficientStock as e:
+            return Response({'Status': False, 'Error': 'Insufficient stock', 'lines': e.lines},
+                            status=status.HTTP_409_CONFLICT)
 
         return Response({'message': f'Заказ № {order.pk} успешно создан'}, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """
+        Отменяет активный заказ пользователя и возвращает зарезервированный товар на склад.
+
+        Параметры:
+            request (Request): Объект запроса.
+            pk (int): Номер заказа.
+
+        Возвращает:
+            Response: Ответ со статусом 200 при успешной отмене, 404 если заказ не найден
+            или уже не активен.
+        """
+        with transaction.atomic():
+            cancelled = Order.objects.filter(pk=pk, user=request.user, status='active').update(status='cancelled')
+            if not cancelled:
+                return Response({'Status': False, 'Error': 'Active order not found'}, status=status.HTTP_404_NOT_FOUND)
+            lines = list(OrderProduct.objects.filter(order_id=pk).values_list(
+                'product_id', 'shop_id', 'quantity', 'unit_price'))
+            release_stock((product_id, quantity) for product_id, _, quantity, _ in lines)
+            catalog_cache.invalidate(*catalog_scopes((product_id, shop_id) for product_id, shop_id, _, _ in lines))
+            created_at = Order.objects.values_list('created_at', flat=True).get(pk=pk)
+            record_sales(lines, timezone.localdate(created_at), sign=-1)
+
+        return Response({'message': f'Заказ № {pk} отменён'})
+
+
+class SalesReportView(GenericAPIView):
+    """
+    Отчёт о продажах магазина по дням.
+
+    Данные берутся из дневных сводок, которые обновляются при оформлении и отмене заказов,
+    поэтому стоимость отчёта зависит от числа дней в периоде, а не от числа заказанных позиций.
+    Доступен только пользователям-магазинам и только по своему магазину.
+
+    Параметры запроса:
+        date_from, date_to (YYYY-MM-DD): Период отчёта, по умолчанию последние 30 дней.
+        group (str): 'shop' (по умолчанию) - итоги магазина по дням, 'product' - по товарам и дням.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_serializer_class(self):
+        if self.request.query_params.get('group') == 'product':
+            return ProductSalesDailySerializer
+        return ShopSalesDailySerializer
+
+    def get(self, request):
+        """
+        Обрабатывает GET-запрос для получения отчёта о продажах.
+
+        Возвращает:
+            Response: Список строк отчёта, упорядоченный по дням, или ошибку 400 при неверных датах
+            и 403 для пользователей без магазина.
+        """
+        if request.user.shop_id is None:
+            return Response({'Status': False, 'Error': 'Shop only'}, status=status.HTTP_403_FORBIDDEN)
+
+        today = timezone.localdate()
+        dates = {'date_from': today - timedelta(days=30), 'date_to': today}
+        for name in dates:
+            value = request.query_params.get(name)
+            if not value:
+                continue
+            try:
+                # None - неверный формат, ValueError - несуществующая дата вроде 2024-02-30.
+                dates[name] = parse_date(value)
+            except ValueError:
+                dates[name] = None
+            if dates[name] is None:
+                return Response({'Status': False, 'Error': f'Invalid {name}'}, status=status.HTTP_400_BAD_REQUEST)
+        date_from, date_to = dates['date_from'], dates['date_to']
+        if date_from > date_to:
+            return Response({'Status': False, 'Error': 'date_from is after date_to'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer_class = self.get_serializer_class()
+        rows = serializer_class.Meta.model.objects.filter(
+            shop_id=request.user.shop_id, day__range=(date_from, date_to)
+        ).order_by('day')
+        return Response(serializer_class(rows, many=True).data)
+
 
 def trigger_error(request):
     division_by_zero = 1 / 0
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+Общие фикстуры для тестов marketAPI.
+"""
+from contextlib import contextmanager
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from marketAPI import reference, views
+from marketAPI.models import UserType, User, Shop, ProductCategory, Product, Basket, BasketProduct
+
+
+@pytest.fixture(autouse=True)
+def reference_cache():
+    """Справочники в памяти процесса не должны переживать откат транзакции теста."""
+    reference.user_types.invalidate()
+    reference.categories.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def no_profiling(settings):
+    """Выборка профилировщика случайна: по умолчанию тесты идут без него."""
+    settings.PROFILING_ENABLED = False
+
+
+@pytest.fixture
+def no_celery(monkeypatch):
+    monkeypatch.setattr(views.dispatch_email_outbox, 'delay', lambda *args, **kwargs: None)
+
+
+@pytest.fixture
+def catalog():
+    for user_type in ('admin', 'customer', 'shop'):
+        UserType.objects.update_or_create(type=user_type)
+    shop = Shop.objects.create(name='Связной', url='testurl')
+    User.objects.create_user(email='test_shop@oknhwe.com', password='12345asdf',
+                             type=UserType.objects.get(type='shop'), shop=shop)
+    category = ProductCategory.objects.create(name='Смартфоны')
+    return [
+        Product.objects.create(name=f'Смартфон {i}', model=f'model/{i}', price=1000 * (i + 1),
+                               product_quantity=5, category=category, shop=shop)
+        for i in range(2)
+    ]
+
+
+@pytest.fixture
+def make_customer(catalog):
+    """Создаёт покупателя с заполненной корзиной и возвращает авторизованный APIClient."""
+    def factory(email, basket_lines=()):
+        user = User.objects.create_user(email=email, password='12345asdf',
+                                        type=UserType.objects.get(type='customer'))
+        basket = Basket.objects.create(user=user)
+        for product, quantity in basket_lines:
+            BasketProduct.objects.create(basket=basket, product=product, quantity=quantity)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client
+    return factory
+
+
+@pytest.fixture
+def sql_queries():
+    """
+    Собирает SQL-запросы приложения внутри блока with.
+
+    EXPLAIN-запросы, которые добавляет профилировщик silk, не учитываются.
+    """
+    @contextmanager
+    def capture():
+        queries = []
+        with CaptureQueriesContext(connection) as context:
+            yield queries
+        queries += [query['sql'] for query in context.captured_queries if not query['sql'].startswith('EXPLAIN')]
+    return capture
@@ -0,0 +1,62 @@
+import pytest
+
+from django.db import connection
+from django.test import Client
+
+from marketAPI.admin import EstimatedCountPaginator
+from marketAPI.models import Basket, BasketProduct, ExtraParameter, Order, Product, User
+
+
+@pytest.fixture
+def admin_client(catalog):
+    client = Client()
+    client.force_login(User.objects.create_superuser(email='admin@oknhwe.com', password='12345asdf'))
+    return client
+
+
+def add_rows(catalog, n, start=0):
+    shop, category = catalog[0].shop, catalog[0].category
+    for i in range(start, start + n):
+        product = Product.objects.create(name=f'Чехол {i}', model=f'case/{i}', price=100, product_quantity=5,
+                                         category=category, shop=shop)
+        user = User.objects.create_user(email=f'customer{i}@oknhwe.com', password=None)
+        BasketProduct.objects.create(basket=Basket.objects.create(user=user), product=product)
+        Order.objects.create(user=user, status='new')
+        ExtraParameter.objects.create(name='Цвет', value='чёрный', product=product)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ['/admin/marketAPI/product/', '/admin/marketAPI/order/',
+                                 '/admin/marketAPI/basketproduct/', '/admin/marketAPI/extraparameter/'])
+def test_changelist_query_count_does_not_depend_on_rows(url, admin_client, catalog, settings, sql_queries):
+    settings.CACHALOT_ENABLED = False
+    # Первый запрос загружает сессию и права в кэши процесса, он не учитывается.
+    admin_client.get(url)
+    counts = []
+    for start, n in ((0, 2), (2, 20)):
+        add_rows(catalog, n, start)
+        with sql_queries() as queries:
+            response = admin_client.get(url)
+        assert response.status_code == 200
+        counts.append(len(queries))
+    assert counts[0] == counts[1], counts
+
+
+@pytest.mark.django_db
+def test_paginator_uses_table_statistics_for_unfiltered_big_table(catalog, settings, sql_queries):
+    add_rows(catalog, 3)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    queryset = Product.objects.order_by('pk')
+
+    settings.ADMIN_ESTIMATED_COUNT_THRESHOLD = 1
+    with sql_queries() as queries:
+        assert EstimatedCountPaginator(queryset, 100).count == 5
+    assert not any('COUNT(' in sql for sql in queries)
+    # С фильтром оценка неприменима: число строк считается точно.
+    assert EstimatedCountPaginator(queryset.filter(name__startswith='Чехол'), 100).count == 3
+
+    settings.ADMIN_ESTIMATED_COUNT_THRESHOLD = 10
+    with sql_queries() as queries:
+        assert EstimatedCountPaginator(queryset, 100).count == 5
+    assert any('COUNT(' in sql for sql in queries)
@@ -0,0 +1,74 @@
+"""
+Тесты async-представлений каталога и корзины под ASGI.
+"""
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from marketAPI.models import User
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+def asgi_get(path, **headers):
+    return async_to_sync(AsyncClient().get)(path, headers=headers)
+
+
+def asgi_post(path, data, **headers):
+    return async_to_sync(AsyncClient().post)(path, data, content_type='application/json', headers=headers)
+
+
+@pytest.mark.django_db
+def test_async_catalog_matches_sync_views(catalog, sql_queries):
+    """
+    Под ASGI каталог отдаётся async-представлением с тем же ответом, повторный запрос
+    берёт товары из кэша каталога.
+    """
+    sync_list = APIClient().get('/products/').json()
+    response = asgi_get('/products/')
+    assert response.status_code == 200
+    assert response.json() == sync_list
+    assert response.resolver_match.func.__name__ == 'products'
+
+    with sql_queries() as queries:
+        assert asgi_get('/products/').json() == sync_list
+    assert not [sql for sql in queries if sql.startswith('SELECT') and '"marketAPI_product"' in sql]
+
+    product = catalog[0]
+    assert asgi_get(f'/product/{product.pk}/').json() == APIClient().get(f'/product/{product.pk}/').json()
+    assert asgi_get('/product/999999/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_async_basket(catalog, make_customer):
+    make_customer('customer@oknhwe.com')
+    token = Token.objects.get(user=User.objects.get(email='customer@oknhwe.com')).key
+    auth = {'Authorization': f'Token {token}'}
+
+    response = asgi_post('/basket/', {'product': catalog[0].pk, 'quantity': 2}, **auth)
+    assert response.status_code == 201
+    assert response.json()['quantity'] == 2
+
+    assert asgi_post('/basket/', {'product': catalog[0].pk}, **auth).status_code == 400
+    missing = asgi_post('/basket/', {'product': 999999}, **auth)
+    assert missing.status_code == 400 and 'product' in missing.json()
+    for invalid in ({'product': '²'}, {'product': True}, {'product': catalog[1].pk, 'quantity': '--5'},
+                    {'product': catalog[1].pk, 'quantity': '²'}, {'product': catalog[1].pk, 'quantity': 10 ** 30}):
+        response = asgi_post('/basket/', invalid, **auth)
+        assert response.status_code == 400 and list(response.json()) == list(invalid)[-1:], invalid
+    assert asgi_get('/products/?category=%C2%B2').status_code == 400
+
+    sync_client = APIClient()
+    sync_client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+    assert asgi_get('/basket/', **auth).json() == sync_client.get('/basket/').json()
+
+    assert asgi_post('/basket/', {}).status_code == 401
+    assert asgi_get('/basket/', Authorization='Token wrong').status_code == 401
@@ -0,0 +1,94 @@
+"""
+Тесты кэшированной аутентификации по токену.
+"""
+import pytest
+
+from django.core.cache import cache
+
+from marketAPI.authentication import CACHED_USER_FIELDS, local_cache
+from marketAPI.models import User
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    local_cache.clear()
+    yield
+    local_cache.clear()
+
+
+def token_queries(queries):
+    return [sql for sql in queries if sql.startswith('SELECT') and 'authtoken_token' in sql]
+
+
+@pytest.mark.django_db
+def test_token_is_resolved_from_cache(make_customer, sql_queries):
+    """
+    Повторные запросы с тем же токеном не обращаются к таблице токенов,
+    даже если локальный кэш процесса пуст.
+    """
+    client = make_customer('customer@oknhwe.com')
+    with sql_queries() as queries:
+        assert client.get('/orders/').status_code == 200
+    assert len(token_queries(queries)) == 1
+
+    with sql_queries() as queries:
+        assert client.get('/orders/').status_code == 200
+    assert token_queries(queries) == []
+
+    local_cache.clear()
+    with sql_queries() as queries:
+        assert client.get('/orders/').status_code == 200
+    assert token_queries(queries) == []
+
+
+@pytest.mark.django_db
+def test_logout_invalidates_token(make_customer, django_capture_on_commit_callbacks):
+    """
+    Выход сбрасывает токен сразу и ещё раз после фиксации: параллельный запрос мог успеть
+    снова положить его в кэш до коммита удаления.
+    """
+    client = make_customer('customer@oknhwe.com')
+    assert client.get('/orders/').status_code == 200
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        assert client.post('/auth/token/logout/').status_code == 204
+    assert callbacks
+    assert client.get('/orders/').status_code == 401
+
+
+@pytest.mark.django_db
+def test_password_change_and_deactivation_invalidate_user(make_customer, django_capture_on_commit_callbacks):
+    client = make_customer('customer@oknhwe.com')
+    assert client.get('/orders/').status_code == 200
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post('/auth/users/set_password/',
+                               {'current_password': '12345asdf', 'new_password': 'n3w-Passw0rd!'})
+    assert response.status_code == 204
+    assert client.get('/orders/').status_code == 200
+    assert client.get('/orders/').wsgi_request.user.check_password('n3w-Passw0rd!')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user = User.objects.get(email='customer@oknhwe.com')
+        user.is_active = False
+        user.save()
+    assert client.get('/orders/').status_code == 401
+
+
+@pytest.mark.django_db
+def test_shared_cache_holds_no_password_hash(make_customer):
+    """
+    В общем кэше пользователь хранится только полями CACHED_USER_FIELDS, остальное загружается из базы.
+    """
+    client = make_customer('customer@oknhwe.com')
+    assert client.get('/orders/').status_code == 200
+    user = User.objects.get(email='customer@oknhwe.com')
+    stored = cache.get(f'auth:user:{user.pk}')
+    assert set(stored) == set(CACHED_USER_FIELDS)
+
+    local_cache.clear()
+    cached = client.get('/orders/').wsgi_request.user
+    assert (cached.pk, cached.type_id, cached.is_active) == (user.pk, user.type_id, True)
+    assert 'password' in cached.get_deferred_fields()
+    assert cached.email == user.email
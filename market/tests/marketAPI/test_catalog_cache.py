@@ -0,0 +1,135 @@
+"""
+Тесты версионного кэша каталога.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from django.core.cache import cache
+
+from rest_framework.test import APIClient
+
+from marketAPI import catalog_cache, locks, single_flight
+from marketAPI.models import Shop, Product, ProductCategory
+from marketAPI.services import import_catalog
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def product_queries(queries):
+    return [sql for sql in queries if sql.startswith('SELECT') and '"marketAPI_product"' in sql]
+
+
+@pytest.mark.django_db
+def test_catalog_import_invalidates_only_its_shop(catalog, sql_queries, django_capture_on_commit_callbacks):
+    """
+    Повторный запрос каталога обслуживается из кэша, а загрузка каталога другого магазина
+    сбрасывает только записи этого магазина.
+    """
+    other = Shop.objects.create(name='Евросеть', url='otherurl')
+    category = ProductCategory.objects.get()
+    Product.objects.create(name='Телефон', model='model/x', price=500, product_quantity=1,
+                           category=category, shop=other)
+
+    client = APIClient()
+    response = client.get('/products/')
+    assert len(response.json()) == Product.objects.count()
+
+    before = catalog_cache.stats()
+    with sql_queries() as queries:
+        assert client.get('/products/').json() == response.json()
+    assert product_queries(queries) == []
+    assert catalog_cache.stats()['hits'] - before['hits'] == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        import_catalog(other.pk, {
+            'categories': [],
+            'goods': [{'id': 1000, 'model': 'model/y', 'name': 'Планшет', 'price': 700, 'quantity': 2,
+                       'category': category.pk, 'parameters': {'Цвет': 'чёрный'}}],
+        })
+    assert catalog_cache.stats()['invalidations'] > before['invalidations']
+
+    before = catalog_cache.stats()
+    with sql_queries() as queries:
+        products = client.get('/products/').json()
+    assert len(product_queries(queries)) == 1
+    assert 'Планшет' in [product['name'] for product in products]
+    assert catalog_cache.stats()['hits'] - before['hits'] == 1
+    assert catalog_cache.stats()['misses'] - before['misses'] == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('category', ['abc', '²', '-1'])
+def test_invalid_category_is_rejected(category):
+    """
+    Фильтр по категории принимает только десятичные id, остальное - 400, а не ошибка сервера.
+    """
+    assert APIClient().get('/products/', {'category': category}).status_code == 400
+
+
+def test_concurrent_misses_compute_once():
+    """
+    Из N одновременных промахов по одному ключу значение вычисляет только один запрос,
+    а после смены версии остальные получают старое значение, пока идёт пересчёт.
+    """
+    calls = []
+    started = threading.Event()
+
+    def compute(value):
+        def slow():
+            calls.append(value)
+            started.set()
+            time.sleep(0.3)
+            return value
+        return slow
+
+    def fetch(version):
+        return single_flight.fetch_many([('catalog:test', version, compute(version))], timeout=60)[0]
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(fetch, [1] * 10))
+    assert calls == [1]
+    assert {value for value, _ in results} == {1}
+    assert sorted(outcome for _, outcome in results) == [single_flight.MISS] + [single_flight.WAIT] * 9
+
+    started.clear()
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        owner = pool.submit(fetch, 2)
+        assert started.wait(timeout=5)
+        others = list(pool.map(fetch, [2] * 9))
+    assert calls == [1, 2]
+    assert owner.result() == (2, single_flight.MISS)
+    assert others == [(1, single_flight.STALE)] * 9
+
+
+def test_early_refresh():
+    """
+    С большим коэффициентом beta свежая запись пересчитывается заранее.
+    """
+    cache.set('catalog:test', {'version': 1, 'value': 'old', 'delta': 1, 'expires': time.time() + 60})
+    value, outcome = single_flight.fetch_many([('catalog:test', 1, lambda: 'new')], timeout=60, beta=1e9)[0]
+    assert (value, outcome) == ('new', single_flight.EARLY_REFRESH)
+
+
+def test_slow_recompute_keeps_lock_taken_by_another_request():
+    """
+    Пересчёт, переживший lock_timeout, не снимает блокировку, которую взял другой запрос.
+    """
+    def compute():
+        # Блокировка истекла, и пересчёт начал другой запрос.
+        cache.delete('catalog:test:lock')
+        assert locks.acquire('catalog:test:lock', 'other', 60)
+        return 'value'
+
+    try:
+        assert single_flight.fetch_many([('catalog:test', 1, compute)], timeout=60)[0] == ('value', single_flight.MISS)
+        assert not locks.acquire('catalog:test:lock', 'third', 60)
+    finally:
+        cache.delete('catalog:test:lock')
@@ -0,0 +1,39 @@
+import pytest
+from cachalot.api import cachalot_disabled
+
+from marketAPI import index_advisor
+from marketAPI.models import Order, Product, User
+
+
+def test_statements_differing_only_in_values_are_grouped():
+    groups = index_advisor.group([
+        # silk подставляет значения в текст запроса, execute_wrapper передаёт их отдельно.
+        ('SELECT "t"."id" FROM "t" WHERE ("t"."status" = new AND "t"."id" IN (1, 2, 3)) LIMIT 21', None, 3.0),
+        ('SELECT "t"."id" FROM "t" WHERE ("t"."status" = %s AND "t"."id" IN (%s)) LIMIT 21', ('paid', 7), 2.0),
+        ('SELECT "t"."id" FROM "t" WHERE "t"."name" = \'Смартфон\'', None, 1.0),
+    ])
+
+    assert [(item.calls, item.total_ms) for item in groups] == [(2, 5.0), (1, 1.0)]
+    assert groups[0].fingerprint == 'SELECT "t"."id" FROM "t" WHERE ("t"."status" = ? AND "t"."id" IN (?)) LIMIT ?'
+    assert groups[0].example[1] == ('paid', 7)
+
+
+@pytest.mark.django_db
+def test_index_is_suggested_only_for_scanned_filter_columns(catalog):
+    user = User.objects.get(email='test_shop@oknhwe.com')
+    Order.objects.bulk_create([Order(user=user, status='new' if i % 10 else 'paid') for i in range(50)])
+
+    with cachalot_disabled(all_queries=True), index_advisor.capture() as samples:
+        for _ in range(3):
+            list(Order.objects.filter(status='paid').order_by('-created_at'))
+            # Внешний ключ уже проиндексирован.
+            list(Product.objects.filter(shop=catalog[0].shop_id))
+    suggestions = index_advisor.advise(samples)
+
+    assert [(item.model, item.index.fields) for item in suggestions] == [(Order, ['status', 'created_at'])]
+    suggestion = suggestions[0]
+    assert suggestion.query_group.calls == 3
+    assert suggestion.rows == 50
+    assert suggestion.before_ms is not None and suggestion.after_ms is not None
+    # Индекс создавался в откатываемой транзакции.
+    assert 'status' not in str(Order.objects.filter(status='paid').explain())
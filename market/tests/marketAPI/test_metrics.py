@@ -0,0 +1,68 @@
+"""
+Тесты метрик Prometheus.
+"""
+import time
+
+import pytest
+
+from rest_framework.test import APIClient
+
+from marketAPI import metrics
+from marketAPI.tasks import purge_email_outbox
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+
+
+@pytest.mark.django_db
+def test_requests_queries_and_cache_are_exported(catalog):
+    client = APIClient()
+    client.get('/products/')
+    client.get('/products/')
+
+    body = client.get('/metrics').content.decode()
+    assert 'http_requests_total{method="GET",status="200",view="product-list"} 2' in body
+    assert 'http_request_duration_seconds_count{view="product-list"} 2' in body
+    assert 'http_request_duration_seconds_bucket{le="+Inf",view="product-list"} 2' in body
+    assert 'db_queries_total{view="product-list"}' in body
+    assert 'catalog_cache_requests_total{outcome="misses"} 1' in body
+    assert 'catalog_cache_requests_total{outcome="hits"} 1' in body
+    assert '# TYPE http_request_duration_seconds histogram' in body
+
+
+@pytest.mark.django_db
+def test_histogram_buckets_are_cumulative():
+    metrics.http_duration.observe(0.03, view='test')
+    body = metrics.render()
+    assert 'http_request_duration_seconds_bucket{le="0.025",view="test"}' not in body
+    assert 'http_request_duration_seconds_bucket{le="0.05",view="test"} 1' in body
+    assert 'http_request_duration_seconds_bucket{le="10",view="test"} 1' in body
+    assert 'http_request_duration_seconds_sum{view="test"} 0.03' in body
+
+
+@pytest.mark.django_db
+def test_celery_tasks_report_duration_and_queue_wait():
+    purge_email_outbox.apply(headers={'published_at': time.time() - 2})
+
+    body = metrics.render()
+    assert 'celery_tasks_total{state="SUCCESS",task="marketAPI.tasks.purge_email_outbox"} 1' in body
+    assert 'celery_task_duration_seconds_count{task="marketAPI.tasks.purge_email_outbox"} 1' in body
+    assert 'celery_task_queue_wait_seconds_bucket{le="1",task="marketAPI.tasks.purge_email_outbox"}' not in body
+    assert 'celery_task_queue_wait_seconds_bucket{le="5",task="marketAPI.tasks.purge_email_outbox"} 1' in body
+
+
+def test_metrics_token(settings):
+    settings.METRICS_TOKEN = 'secret'
+    client = APIClient()
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_metrics_without_token_are_internal_only(settings):
+    settings.METRICS_TOKEN = ''
+    settings.METRICS_ALLOWED_IPS = ['127.0.0.1', '10.0.0.2']
+    assert APIClient(REMOTE_ADDR='203.0.113.5').get('/metrics').status_code == 403
+    assert APIClient(REMOTE_ADDR='10.0.0.2').get('/metrics').status_code == 200
@@ -0,0 +1,179 @@
+"""
+Тесты истории и оформления заказов.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from marketAPI import locks
+from marketAPI.models import User, Order, OrderProduct, Basket, BasketProduct, Product
+
+
+def create_orders(user, products, count):
+    orders = Order.objects.bulk_create([Order(user=user, status='active', total_price=0) for _ in range(count)])
+    OrderProduct.objects.bulk_create([
+        OrderProduct(order=order, product=product, quantity=1) for order in orders for product in products
+    ])
+
+
+@pytest.mark.django_db
+def test_order_history_is_scoped_and_paginated(catalog, make_customer):
+    """
+    История заказов содержит только заказы текущего пользователя, сгруппированные с позициями,
+    отдаётся постранично по курсору, а число запросов на страницу не зависит от числа заказов.
+    """
+    client = make_customer('customer@oknhwe.com')
+    other = make_customer('other@oknhwe.com')
+    create_orders(User.objects.get(email='other@oknhwe.com'), catalog, 3)
+
+    response = other.get('/orders/')
+    assert response.status_code == 200
+    assert len(response.json()['results']) == 3
+
+    customer = User.objects.get(email='customer@oknhwe.com')
+    create_orders(customer, catalog, 5)
+    with CaptureQueriesContext(connection) as small:
+        response = client.get('/orders/', {'page_size': 2})
+    page = response.json()
+    assert len(page['results']) == 2
+    assert all(len(order['order_products']) == len(catalog) for order in page['results'])
+    assert all(key in page['results'][0]['order_products'][0]['product'] for key in ['id', 'name', 'price'])
+
+    seen = []
+    url = '/orders/?page_size=2'
+    while url:
+        page = client.get(url).json()
+        seen += [order['id'] for order in page['results']]
+        url = page['next']
+    assert sorted(seen) == sorted(Order.objects.filter(user=customer).values_list('pk', flat=True))
+
+    create_orders(customer, catalog, 50)
+    with CaptureQueriesContext(connection) as large:
+        client.get('/orders/', {'page_size': 2})
+    assert len(large) == len(small)
+
+
+@pytest.mark.django_db
+def test_order_history_pages_orders_with_same_timestamp(catalog, make_customer):
+    """
+    Заказы с одинаковым временем создания отдаются по курсору ровно по одному разу.
+    """
+    client = make_customer('customer@oknhwe.com')
+    customer = User.objects.get(email='customer@oknhwe.com')
+    create_orders(customer, catalog, 5)
+    created_at = Order.objects.filter(user=customer).first().created_at
+    Order.objects.filter(user=customer).update(created_at=created_at)
+
+    seen = []
+    url = '/orders/?page_size=2'
+    while url:
+        page = client.get(url).json()
+        seen += [order['id'] for order in page['results']]
+        url = page['next']
+    assert seen == sorted(Order.objects.filter(user=customer).values_list('pk', flat=True), reverse=True)
+
+
+@pytest.mark.django_db
+def test_checkout_with_idempotency_key(catalog, make_customer, no_celery):
+    """
+    Повтор оформления заказа с тем же Idempotency-Key возвращает первый ответ и не создаёт второй заказ.
+    """
+    client = make_customer('customer@oknhwe.com', [(catalog[0], 1)])
+
+    first = client.post('/orders/', data={'delivery_address': 'Москва'}, headers={'Idempotency-Key': 'retry-1'})
+    assert first.status_code == 201
+    BasketProduct.objects.create(basket=Basket.objects.get(user__email='customer@oknhwe.com'), product=catalog[1])
+
+    retry = client.post('/orders/', data={'delivery_address': 'Москва'}, headers={'Idempotency-Key': 'retry-1'})
+    assert retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert Order.objects.count() == 1
+
+    other = client.post('/orders/', data={'delivery_address': 'Москва'}, headers={'Idempotency-Key': 'retry-2'})
+    assert other.status_code == 201
+    assert Order.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_idempotency_key_rejects_other_request_and_retries_errors(catalog, make_customer, no_celery):
+    """
+    Ключ с другим телом запроса получает 422, а ответ с ошибкой не сохраняется: после
+    исправления корзины повтор с тем же ключом оформляет заказ.
+    """
+    client = make_customer('customer@oknhwe.com', [(catalog[0], 10)])
+    headers = {'Idempotency-Key': 'retry-after-error'}
+
+    assert client.post('/orders/', data={'delivery_address': 'Москва'}, headers=headers).status_code == 409
+    BasketProduct.objects.filter(product=catalog[0]).update(quantity=1)
+    assert client.post('/orders/', data={'delivery_address': 'Москва'}, headers=headers).status_code == 201
+
+    other = client.post('/orders/', data={'delivery_address': 'Казань'}, headers=headers)
+    assert other.status_code == 422
+    assert Order.objects.count() == 1
+
+
+def test_idempotency_lock_is_released_only_by_owner():
+    """
+    Попытка, пережившая свою блокировку, не снимает блокировку повтора. Блокировки берутся
+    через locks.acquire, как в декораторе: в Redis токен хранится без сериализации django_redis.
+    """
+    lock_key = 'idempotency:test:lock'
+    assert locks.acquire(lock_key, 'first', 30)
+    # Блокировка первой попытки истекла и перешла к повтору.
+    cache.delete(lock_key)
+    assert locks.acquire(lock_key, 'second', 30)
+    try:
+        locks.release([lock_key], 'first')
+        assert not locks.acquire(lock_key, 'third', 30)
+        locks.release([lock_key], 'second')
+        assert locks.acquire(lock_key, 'third', 30)
+        locks.release([lock_key], 'third')
+    finally:
+        cache.delete(lock_key)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_duplicates_wait_for_first_attempt(catalog, make_customer, no_celery):
+    """
+    Параллельные повторы с одним ключом ждут первую попытку и получают её ответ.
+    """
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        pytest.skip('Параллельная запись требует файловой SQLite или PostgreSQL')
+
+    client = make_customer('customer@oknhwe.com', [(catalog[0], 1)])
+
+    def checkout(_):
+        try:
+            response = client.post('/orders/', data={'delivery_address': 'Москва'},
+                                   headers={'Idempotency-Key': 'parallel'})
+            return response.status_code, response.json()
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(checkout, range(5)))
+
+    assert {code for code, _ in results} == {201}
+    assert len({body['message'] for _, body in results}) == 1
+    assert Order.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_order_lines_keep_price_snapshot(catalog, make_customer, no_celery):
+    """
+    Позиции заказа хранят цену и название на момент оформления: новая выгрузка поставщика их не меняет.
+    """
+    product = catalog[0]
+    client = make_customer('customer@oknhwe.com', [(product, 2)])
+    client.post('/orders/')
+
+    Product.objects.filter(pk=product.pk).update(price=9999, name='Новое название')
+
+    line = client.get('/orders/').json()['results'][0]['order_products'][0]
+    assert line['product'] == {'id': product.pk, 'name': product.name, 'price': '1000.00'}
+    assert Order.objects.get().total_price == 2000
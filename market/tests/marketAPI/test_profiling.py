@@ -0,0 +1,67 @@
+"""
+Тесты выборочного профилирования.
+"""
+import pytest
+
+from rest_framework.test import APIClient
+from silk.models import Request
+
+from marketAPI.profiling import sample_rate, traces_sampler
+
+
+@pytest.fixture
+def profiling(settings):
+    settings.PROFILING_ENABLED = True
+    settings.PROFILING_SAMPLE_RATE = 0.0
+    settings.PROFILING_ROUTE_RATES = {'/product/': 1.0, '/products/': 0.0}
+    settings.PROFILING_SLOW_REQUEST_MS = 60 * 1000
+    return settings
+
+
+def test_sample_rate_by_route(profiling):
+    profiling.PROFILING_ROUTE_RATES = {'/orders/': 0.05, '/orders/1/cancel/': 1.0}
+    assert sample_rate('/orders/') == 0.05
+    assert sample_rate('/orders/1/cancel/') == 1.0
+    assert sample_rate('/basket/') == 0.0
+
+    profiling.PROFILING_ENABLED = False
+    assert sample_rate('/orders/1/cancel/') == 0.0
+
+
+@pytest.mark.django_db
+def test_only_sampled_and_slow_requests_are_recorded(catalog, profiling):
+    client = APIClient()
+
+    client.get('/products/')
+    assert not Request.objects.exists()
+
+    client.get(f'/product/{catalog[0].pk}/')
+    assert list(Request.objects.values_list('path', flat=True)) == [f'/product/{catalog[0].pk}/']
+
+    profiling.PROFILING_SLOW_REQUEST_MS = 0.001
+    client.get('/products/?category=1')
+    slow = Request.objects.get(path='/products/')
+    assert slow.query_params == 'category=1'
+    assert slow.num_sql_queries == slow.queries.count() > 0
+
+    profiling.PROFILING_ENABLED = False
+    client.get('/products/')
+    client.get(f'/product/{catalog[0].pk}/')
+    assert Request.objects.count() == 2
+
+    profiling.PROFILING_ENABLED = True
+    for disabled in (0, None):
+        profiling.PROFILING_SLOW_REQUEST_MS = disabled
+        client.get('/products/')
+        assert Request.objects.count() == 2
+
+
+def test_traces_sampler_keeps_parent_decision(profiling):
+    profiling.PROFILING_ROUTE_RATES = {'/orders/': 0.05}
+    environ = {'PATH_INFO': '/orders/'}
+    assert traces_sampler({'wsgi_environ': environ}) == 0.05
+    assert traces_sampler({'wsgi_environ': environ, 'parent_sampled': True}) == 1.0
+    assert traces_sampler({'asgi_scope': {'path': '/orders/'}, 'parent_sampled': False}) == 0.0
+
+    profiling.PROFILING_ENABLED = False
+    assert traces_sampler({'wsgi_environ': environ, 'parent_sampled': True}) == 0.0
@@ -0,0 +1,186 @@
+"""
+Бюджеты SQL-запросов и времени для основных эндпоинтов.
+
+Каждый сценарий выполняется на наборах данных растущего размера. Число запросов должно быть
+одинаковым для всех размеров и не больше бюджета. Так ловятся N+1 в сериализаторах и циклы
+с запросом на каждую позицию в оформлении заказа и загрузке каталога.
+
+Время ответа на самом большом наборе должно расти заметно медленнее объёма данных. Время зависит
+от загрузки машины, поэтому эта проверка запускается только с переменной окружения BENCHMARK=1.
+
+Запросы считаются без cachalot и с пустым кэшем каталога: бюджет - это холодный путь.
+"""
+import os
+import time
+
+import pytest
+import yaml
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from marketAPI import catalog_changes, reference
+from marketAPI.models import Basket, BasketProduct, ExtraParameter, Product, ProductCategory, Shop, User, UserType
+
+# Самый большой набор укладывается в одну пачку bulk_create на SQLite (999 параметров в запросе).
+SIZES = (5, 25, 100)
+
+# При росте данных в SIZES[-1] / SIZES[0] = 20 раз время ответа не должно вырасти больше чем в GROWTH_LIMIT раз.
+GROWTH_LIMIT = 5
+
+benchmark = pytest.mark.skipif(not os.environ.get('BENCHMARK'), reason='timing checks run with BENCHMARK=1')
+
+
+def make_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+    return client
+
+
+def make_shop(n, parameters=0):
+    shop = Shop.objects.create(name=f'Магазин {n}', url='testurl')
+    category = ProductCategory.objects.create(name='Смартфоны')
+    products = Product.objects.bulk_create([
+        Product(name=f'Смартфон {i}', model=f'model/{i}', price=1000 + i, product_quantity=10,
+                category=category, shop=shop)
+        for i in range(n)
+    ])
+    ExtraParameter.objects.bulk_create([
+        ExtraParameter(name=f'Параметр {j}', value=str(j), product=product)
+        for product in products for j in range(parameters)
+    ])
+    return shop, products
+
+
+def make_customer(products):
+    user = User.objects.create_user(email='customer@oknhwe.com', password='12345asdf')
+    basket = Basket.objects.create(user=user)
+    BasketProduct.objects.bulk_create([BasketProduct(basket=basket, product=product) for product in products])
+    return make_client(user)
+
+
+def products_list(n):
+    make_shop(n, parameters=3)
+    return APIClient(), 'get', '/products/', {}
+
+
+def product_detail(n):
+    _, products = make_shop(1, parameters=n)
+    return APIClient(), 'get', f'/product/{products[0].pk}/', {}
+
+
+def product_changes(n):
+    cursor = catalog_changes.current_cursor()
+    _, products = make_shop(n, parameters=3)
+    catalog_changes.record(product.pk for product in products)
+    return APIClient(), 'get', '/products/changes/', {'data': {'since': cursor}}
+
+
+def basket_list(n):
+    _, products = make_shop(n)
+    return make_customer(products), 'get', '/basket/', {}
+
+
+def basket_create(n):
+    _, products = make_shop(n + 1)
+    return make_customer(products[:n]), 'post', '/basket/', {'data': {'product': products[n].pk, 'quantity': 1}}
+
+
+def order_create(n):
+    _, products = make_shop(n)
+    return make_customer(products), 'post', '/orders/', {'data': {'delivery_address': 'Москва'}}
+
+
+def partner_update(n):
+    shop = Shop.objects.create(name='Связной', url='testurl')
+    user = User.objects.create_user(email='shop@oknhwe.com', password='12345asdf',
+                                    type=UserType.objects.get(type='shop'), shop=shop)
+    data = {
+        'shop': 'Связной',
+        'categories': [{'id': 224, 'name': 'Смартфоны'}],
+        'goods': [{'id': 1000 + i, 'category': 224, 'model': f'model/{i}', 'name': f'Смартфон {i}',
+                   'price': 1000 + i, 'quantity': 5, 'parameters': {'Цвет': 'чёрный', 'Память (Гб)': 128}}
+                  for i in range(n)],
+    }
+    file = SimpleUploadedFile('shop.yaml', yaml.safe_dump(data, allow_unicode=True).encode())
+    return make_client(user), 'post', '/update/', {'data': {'file': file}, 'format': 'multipart'}
+
+
+BUDGETS = [
+    (products_list, 200, 2),
+    (product_detail, 200, 2),
+    (product_changes, 200, 3),
+    (basket_list, 200, 3),
+    (basket_create, 201, 6),
+    (order_create, 201, 15),
+    (partner_update, 200, 10),
+]
+
+
+def measure(sql_queries, scenario, n):
+    """
+    Готовит данные сценария, выполняет запрос и откатывает данные.
+
+    Возвращает:
+        tuple: (статус ответа, число SQL-запросов без точек сохранения, время ответа в секундах).
+    """
+    with transaction.atomic():
+        client, method, path, kwargs = scenario(n)
+        cache.clear()
+        reference.user_types.invalidate()
+        reference.categories.invalidate()
+        with sql_queries() as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            elapsed = time.perf_counter() - started
+        transaction.set_rollback(True)
+    count = len([sql for sql in queries if not sql.startswith(('SAVEPOINT', 'RELEASE'))])
+    return response.status_code, count, elapsed
+
+
+def run_scenario(scenario, sql_queries):
+    """
+    Выполняет сценарий на всех наборах SIZES по два раза.
+
+    Возвращает:
+        tuple: (статусы, максимальное число запросов, лучшее время) по размерам наборов.
+    """
+    for user_type in ('admin', 'customer', 'shop'):
+        UserType.objects.update_or_create(type=user_type)
+
+    # Первый запрос процесса дольше остальных (ленивые импорты, прогрев), он не учитывается.
+    measure(sql_queries, scenario, SIZES[0])
+    # Время - лучшее из двух запусков, чтобы случайная пауза не выдавалась за рост.
+    results = {n: [measure(sql_queries, scenario, n) for _ in range(2)] for n in SIZES}
+
+    statuses = {n: {status for status, _, _ in runs} for n, runs in results.items()}
+    counts = {n: max(count for _, count, _ in runs) for n, runs in results.items()}
+    times = {n: min(elapsed for _, _, elapsed in runs) for n, runs in results.items()}
+    return statuses, counts, times
+
+
+@pytest.fixture
+def scenario_settings(settings, no_celery):
+    settings.CACHALOT_ENABLED = False
+    settings.CATALOG_CHANGES_SETTLE_SECONDS = 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('scenario, expected_status, budget', BUDGETS, ids=[entry[0].__name__ for entry in BUDGETS])
+def test_query_count_does_not_grow_with_data(scenario, expected_status, budget, scenario_settings, sql_queries):
+    statuses, counts, _ = run_scenario(scenario, sql_queries)
+    assert all(found == {expected_status} for found in statuses.values()), statuses
+    assert len(set(counts.values())) == 1, f'query count grows with data: {counts}'
+    assert counts[SIZES[0]] <= budget, f'{counts[SIZES[0]]} queries, budget {budget}'
+
+
+@benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize('scenario', [entry[0] for entry in BUDGETS], ids=[entry[0].__name__ for entry in BUDGETS])
+def test_latency_does_not_grow_with_data(scenario, scenario_settings, sql_queries):
+    _, _, times = run_scenario(scenario, sql_queries)
+    assert times[SIZES[-1]] < times[SIZES[0]] * GROWTH_LIMIT, f'latency grows with data: {times}'
@@ -0,0 +1,44 @@
+"""
+Тесты справочников в памяти процесса.
+"""
+import pytest
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from marketAPI.models import User, UserType, ProductCategory
+from marketAPI.reference import user_types, categories
+
+
+@pytest.mark.django_db
+def test_lookups_do_not_query_database(catalog, sql_queries):
+    category = ProductCategory.objects.get()
+    shop = UserType.objects.get(type='shop')
+    user_types.get(shop.pk)
+    categories.get(category.pk)
+
+    with sql_queries() as queries:
+        assert user_types.get_by_name('shop') == shop
+        assert categories.get(category.pk).name == 'Смартфоны'
+        assert categories.id_for('Смартфоны') == category.pk
+    assert queries == []
+
+    ProductCategory.objects.create(name='Планшеты')
+    assert categories.id_for('Планшеты') is not None
+
+
+@pytest.mark.django_db
+def test_new_user_defaults_to_customer(catalog):
+    user = User.objects.create_user(email='customer@oknhwe.com', password='12345asdf')
+    assert user.type == UserType.objects.get(type='customer')
+
+
+@pytest.mark.django_db
+def test_partner_update_rejects_customer_without_type_query(make_customer, sql_queries):
+    client = make_customer('customer@oknhwe.com')
+    upload = {'file': SimpleUploadedFile('shop.yaml', b'goods: []')}
+    client.post('/update/', upload, format='multipart')
+
+    with sql_queries() as queries:
+        response = client.post('/update/', upload, format='multipart')
+    assert response.status_code == 403
+    assert not [sql for sql in queries if sql.startswith('SELECT') and 'marketAPI_usertype' in sql]
@@ -0,0 +1,66 @@
+"""
+Тесты дневных сводок продаж.
+"""
+import pytest
+
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from marketAPI.models import User, Order, ProductSalesDaily, ShopSalesDaily
+
+
+def report(group=None):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=User.objects.get(email='test_shop@oknhwe.com'))
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client.get('/reports/sales/', {'group': group} if group else {}).json()
+
+
+@pytest.mark.django_db
+def test_sales_rollups(catalog, make_customer, no_celery):
+    """
+    Оформление заказа пополняет дневные сводки, отмена вычитает, пересчёт из заказов даёт те же цифры.
+    """
+    first, second = catalog
+    make_customer('customer@oknhwe.com', [(first, 2), (second, 1)]).post('/orders/')
+    other = make_customer('other@oknhwe.com', [(first, 1)])
+    other.post('/orders/')
+
+    today = str(timezone.localdate())
+    assert report() == [{'day': today, 'units': 4, 'revenue': '5000.00'}]
+    assert sorted(report('product'), key=lambda row: row['product']) == [
+        {'day': today, 'product': first.pk, 'units': 3, 'revenue': '3000.00'},
+        {'day': today, 'product': second.pk, 'units': 1, 'revenue': '2000.00'},
+    ]
+
+    other.post(f'/orders/{Order.objects.get(user__email="other@oknhwe.com").pk}/cancel/')
+    expected = [{'day': today, 'units': 3, 'revenue': '4000.00'}]
+    assert report() == expected
+
+    ShopSalesDaily.objects.all().delete()
+    ProductSalesDaily.objects.all().delete()
+    call_command('rebuild_sales_rollups')
+    assert report() == expected
+
+    response = make_customer('third@oknhwe.com').get('/reports/sales/')
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_invalid_report_dates_are_rejected(catalog):
+    """
+    Неверный формат и несуществующие даты дают 400 в отчёте и CommandError в пересчёте сводок.
+    """
+    client = APIClient()
+    client.force_authenticate(User.objects.get(email='test_shop@oknhwe.com'))
+    for params in ({'date_from': 'abc'}, {'date_from': '2024-02-30'}, {'date_to': '2024-13-01'},
+                   {'date_from': '2024-02-02', 'date_to': '2024-02-01'}):
+        assert client.get('/reports/sales/', params).status_code == 400, params
+    assert client.get('/reports/sales/', {'date_from': '2024-02-29', 'date_to': ''}).status_code == 200
+
+    for value in ('abc', '2024-02-30'):
+        with pytest.raises(CommandError):
+            call_command('rebuild_sales_rollups', date_from=value)
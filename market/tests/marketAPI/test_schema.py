@@ -0,0 +1,84 @@
+"""
+Тесты заранее построенной схемы OpenAPI.
+"""
+import gzip
+import json
+
+import pytest
+
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework.test import APIClient
+
+from marketAPI import schema
+
+
+@pytest.fixture
+def schema_file(settings, tmp_path):
+    settings.OPENAPI_SCHEMA_FILE = tmp_path / 'openapi.json'
+    schema.reset()
+    yield settings.OPENAPI_SCHEMA_FILE
+    schema.reset()
+
+
+def live_schema():
+    request = RequestFactory().get('/api/schema/', HTTP_ACCEPT='application/vnd.oai.openapi+json')
+    response = SpectacularAPIView.as_view()(request)
+    response.render()
+    return json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_built_schema_matches_live_generator(schema_file):
+    call_command('build_openapi_schema')
+    call_command('build_openapi_schema', '--check')
+
+    response = APIClient().get('/api/schema/', {'format': 'json'})
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/vnd.oai.openapi+json'
+    assert json.loads(response.content) == live_schema()
+    assert '/orders/' in json.loads(response.content)['paths']
+
+
+@pytest.mark.django_db
+def test_schema_is_served_gzipped_with_etag(schema_file, monkeypatch):
+    client = APIClient()
+    response = client.get('/api/schema/', HTTP_ACCEPT_ENCODING='gzip')
+    assert response['Content-Type'] == 'application/vnd.oai.openapi'
+    assert response['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.content).startswith(b'openapi: ')
+
+    # Без файла схема строится первым запросом, дальше не перестраивается.
+    monkeypatch.setattr(schema, 'generate', lambda: pytest.fail('schema regenerated'))
+    response = client.get('/api/schema/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_gzip_has_own_etag_and_respects_quality(schema_file):
+    client = APIClient()
+    plain = client.get('/api/schema/')
+    compressed = client.get('/api/schema/', HTTP_ACCEPT_ENCODING='br, gzip;q=0.5')
+    assert 'Content-Encoding' not in plain and compressed['Content-Encoding'] == 'gzip'
+    assert compressed['ETag'] == plain['ETag'][:-1] + '-gzip"'
+    # ETag несжатого ответа не подходит к сжатому.
+    assert client.get('/api/schema/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=plain['ETag']).status_code == 200
+
+    for header in ('gzip;q=0', 'identity', '*;q=0', 'gzip; q=0.0, deflate'):
+        response = client.get('/api/schema/', HTTP_ACCEPT_ENCODING=header)
+        assert 'Content-Encoding' not in response, header
+    assert client.get('/api/schema/', HTTP_ACCEPT_ENCODING='*')['Content-Encoding'] == 'gzip'
+
+
+@pytest.mark.django_db
+def test_cached_schema_is_bound_to_code_version(schema_file, monkeypatch):
+    built = []
+    monkeypatch.setattr(schema, 'generate', lambda: built.append(1) or {'openapi': '3.0.3'})
+    monkeypatch.setattr(schema, '_code_version', lambda: 'old')
+    schema.load()
+    schema.load()
+    monkeypatch.setattr(schema, '_code_version', lambda: 'new')
+    schema.load()
+    assert len(built) == 2
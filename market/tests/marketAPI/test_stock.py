@@ -0,0 +1,83 @@
+"""
+Тесты резервирования товара на складе при оформлении заказа.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from django.db import connection
+
+from marketAPI.models import BasketProduct, Order
+
+
+@pytest.mark.django_db
+def test_checkout_reserves_and_cancel_releases(catalog, make_customer, no_celery):
+    """
+    Оформление заказа списывает товар со склада, при нехватке товара заказ не создаётся
+    и возвращается отчёт по позициям, отмена заказа возвращает товар на склад.
+    """
+    first, second = catalog
+    client = make_customer('customer@oknhwe.com', [(first, 2), (second, 5)])
+
+    response = client.post('/orders/', data={'delivery_address': 'Москва'})
+    assert response.status_code == 201
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert (first.product_quantity, second.product_quantity) == (3, 0)
+
+    other = make_customer('other@oknhwe.com', [(first, 1), (second, 1)])
+    response = other.post('/orders/', data={'delivery_address': 'Москва'})
+    assert response.status_code == 409
+    assert response.json()['lines'] == [{'product': second.pk, 'requested': 1, 'available': 0}]
+    first.refresh_from_db()
+    assert first.product_quantity == 3
+    assert Order.objects.count() == 1
+    assert BasketProduct.objects.filter(basket__user__email='other@oknhwe.com').count() == 2
+
+    order = Order.objects.get()
+    response = client.post(f'/orders/{order.pk}/cancel/')
+    assert response.status_code == 200
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert (first.product_quantity, second.product_quantity) == (5, 5)
+
+    response = client.post(f'/orders/{order.pk}/cancel/')
+    assert response.status_code == 404
+    second.refresh_from_db()
+    assert second.product_quantity == 5
+
+
+@pytest.mark.django_db(transaction=True)
+def test_parallel_checkouts_do_not_oversell(catalog, make_customer, no_celery, record_property):
+    """
+    Нагрузочный тест: много параллельных заказов одного и того же товара.
+    Успешных заказов ровно столько, сколько единиц было на складе, остаток не уходит в минус.
+    С BENCHMARK=1 пропускная способность (заказов в секунду) записывается в отчёт pytest
+    (свойство checkouts_per_second, например в --junitxml).
+    """
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        pytest.skip('Параллельная запись требует файловой SQLite или PostgreSQL')
+
+    product = catalog[0]
+    clients = [make_customer(f'customer{i}@oknhwe.com', [(product, 1)]) for i in range(20)]
+
+    def checkout(client):
+        try:
+            return client.post('/orders/', data={'delivery_address': 'Москва'}).status_code
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        codes = list(pool.map(checkout, clients))
+    elapsed = time.perf_counter() - started
+
+    product.refresh_from_db()
+    assert codes.count(201) == 5
+    assert codes.count(409) == len(clients) - 5
+    assert product.product_quantity == 0
+    assert Order.objects.count() == 5
+    if os.environ.get('BENCHMARK'):
+        record_property('checkouts_per_second', round(len(clients) / elapsed, 1))
@@ -0,0 +1,235 @@
+"""
+Тесты фоновых задач уведомлений и outbox писем.
+"""
+from types import SimpleNamespace
+
+import pytest
+from kombu.transport.redis import Channel as RedisChannel
+
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from market.celery import app
+from marketAPI import outbox
+from marketAPI.models import CatalogImport, EmailOutbox, Order, OrderProduct, Product, Shop, User, UserType
+from marketAPI.tasks import dispatch_email_outbox, import_partner_catalog, purge_email_outbox, queue_probe
+
+
+@pytest.fixture
+def from_email(settings):
+    # EMAIL_HOST - адрес SMTP-сервера, отправитель берётся из DEFAULT_FROM_EMAIL.
+    settings.EMAIL_HOST = 'smtp.oknhwe.com'
+    settings.DEFAULT_FROM_EMAIL = 'market@oknhwe.com'
+    return settings.DEFAULT_FROM_EMAIL
+
+
+@pytest.fixture
+def connections_opened(monkeypatch):
+    opened = []
+    original_open = EmailBackend.open
+
+    def counting_open(self):
+        opened.append(self)
+        return original_open(self)
+
+    monkeypatch.setattr(EmailBackend, 'open', counting_open)
+    return opened
+
+
+def create_order(shops, lines_per_shop, category, email='customer@oknhwe.com'):
+    """Создаёт заказ с позициями нескольких магазинов напрямую, как его сохраняет оформление заказа."""
+    customer = User.objects.create_user(email=email, password='12345asdf',
+                                        type=UserType.objects.get(type='customer'))
+    order = Order.objects.create(user=customer, status='active', total_price=0)
+    lines = []
+    for shop in shops:
+        products = Product.objects.bulk_create([
+            Product(name=f'Товар {i}', model=f'model/{i}', price=100, product_quantity=10, category=category, shop=shop)
+            for i in range(lines_per_shop)
+        ])
+        lines += [OrderProduct(order=order, product=product, quantity=2, unit_price=product.price,
+                               product_name=product.name, shop=shop) for product in products]
+    OrderProduct.objects.bulk_create(lines)
+    return order
+
+
+def create_shops(count, prefix='shop'):
+    shops = Shop.objects.bulk_create([Shop(name=f'{prefix}{i}', url='testurl') for i in range(count)])
+    shop_type = UserType.objects.get(type='shop')
+    User.objects.bulk_create([User(email=f'{shop.name}@oknhwe.com', type=shop_type, shop=shop) for shop in shops])
+    return shops
+
+
+def dispatch_order(order, sql_queries):
+    """Записывает письма о заказе в outbox, как оформление заказа, и отправляет их диспетчером."""
+    outbox.enqueue_order(order, order.order_products.values_list('shop_id', flat=True).distinct())
+    with sql_queries() as queries:
+        sent = outbox.dispatch()
+    return sent, len(queries)
+
+
+@pytest.mark.django_db
+def test_supplier_notifications_are_batched_per_shop(catalog, from_email, connections_opened, sql_queries):
+    """
+    30 позиций двух магазинов дают два письма-сводки и подтверждение покупателю, отправленные
+    через одно соединение.
+    """
+    order = create_order(create_shops(2), 15, catalog[0].category)
+
+    assert dispatch_order(order, sql_queries)[0] == 3
+    assert len(connections_opened) == 1
+    assert {message.to[0] for message in mail.outbox} == {'customer@oknhwe.com', 'shop0@oknhwe.com',
+                                                          'shop1@oknhwe.com'}
+    assert {message.from_email for message in mail.outbox} == {from_email}
+    digests = [message for message in mail.outbox if message.to[0] != 'customer@oknhwe.com']
+    assert all(message.body.count('- Товар') == 15 for message in digests)
+
+
+@pytest.mark.django_db
+def test_supplier_notifications_cost_does_not_grow_with_order(catalog, from_email, connections_opened, sql_queries):
+    """
+    Заказ из 5000 позиций 50 магазинов стоит столько же запросов и SMTP-соединений, сколько маленький.
+    """
+    small = create_order(create_shops(2, 'small'), 1, catalog[0].category, 'small@oknhwe.com')
+    _, small_queries = dispatch_order(small, sql_queries)
+    connections_opened.clear()
+
+    large = create_order(create_shops(50), 100, catalog[0].category)
+    sent, large_queries = dispatch_order(large, sql_queries)
+    assert sent == 51
+    assert large_queries == small_queries
+    assert len(connections_opened) == 1
+
+
+@pytest.mark.django_db
+def test_checkout_writes_outbox_in_transaction(catalog, make_customer, no_celery):
+    """
+    Оформление заказа записывает письма покупателю и магазину в outbox, неудачное оформление - не записывает.
+    """
+    first, second = catalog
+    make_customer('customer@oknhwe.com', [(first, 1), (second, 1)]).post('/orders/')
+    assert sorted(EmailOutbox.objects.values_list('kind', 'body')) == [('order_confirmation', ''),
+                                                                      ('supplier_digest', '')]
+
+    make_customer('other@oknhwe.com', [(first, 100)]).post('/orders/')
+    assert Order.objects.count() == 1
+    assert EmailOutbox.objects.count() == 2
+
+    assert outbox.dispatch() == 2
+    confirmation = next(message for message in mail.outbox if message.to == ['customer@oknhwe.com'])
+    assert f'Заказ №{Order.objects.get().pk} создан успешно!' in confirmation.body
+    assert 'Смартфон 0 - 1 шт. по цене 1000.00 руб., Смартфон 1 - 1 шт. по цене 2000.00 руб.' in confirmation.body
+    digest = next(message for message in mail.outbox if message.to == ['test_shop@oknhwe.com'])
+    assert digest.subject == 'Уведомление о заказе: заказано товаров - 2'
+
+
+@pytest.mark.django_db
+def test_outbox_dispatch_coalesces_per_recipient(settings, from_email):
+    """
+    Диспетчер отправляет письма одному получателю одним письмом и помечает их отправленными.
+    """
+    settings.EMAIL_OUTBOX_RATE_LIMIT = 0
+    outbox.enqueue([('shop@oknhwe.com', f'Заказ {i}', f'Текст {i}') for i in range(3)]
+                   + [('customer@oknhwe.com', 'Подтверждение заказа', 'Текст')])
+
+    assert outbox.dispatch() == 2
+    assert len(mail.outbox) == 2
+    digest = next(message for message in mail.outbox if message.to == ['shop@oknhwe.com'])
+    assert all(f'Текст {i}' in digest.body for i in range(3))
+    assert digest.from_email == from_email
+    assert EmailOutbox.objects.filter(status=EmailOutbox.SENT).count() == 4
+    assert outbox.dispatch() == 0
+
+
+@pytest.mark.django_db
+def test_outbox_dispatch_retries_with_backoff(settings, monkeypatch):
+    """
+    Ошибка отправки откладывает письмо с растущей паузой, после последней попытки оно помечается failed.
+    """
+    settings.EMAIL_OUTBOX_RATE_LIMIT = 0
+    settings.EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+
+    def broken_send(self, messages):
+        raise ConnectionError('SMTP is down')
+
+    monkeypatch.setattr(EmailBackend, 'send_messages', broken_send)
+    outbox.enqueue([('shop@oknhwe.com', 'Заказ', 'Текст')])
+
+    assert outbox.dispatch() == 0
+    item = EmailOutbox.objects.get()
+    assert (item.status, item.attempts, item.last_error) == (EmailOutbox.PENDING, 1, 'SMTP is down')
+    assert item.next_attempt_at > timezone.now()
+    assert outbox.dispatch() == 0
+
+    EmailOutbox.objects.update(next_attempt_at=timezone.now())
+    outbox.dispatch()
+    item.refresh_from_db()
+    assert (item.status, item.attempts) == (EmailOutbox.FAILED, 2)
+
+
+def test_tasks_are_routed_to_dedicated_queues():
+    """
+    Письма, загрузки каталогов и обслуживание уходят в разные очереди со своими лимитами.
+    """
+    assert app.amqp.router.route({}, dispatch_email_outbox.name)['queue'].name == 'notifications'
+    assert app.amqp.router.route({}, import_partner_catalog.name)['queue'].name == 'imports'
+    assert app.amqp.router.route({}, purge_email_outbox.name)['queue'].name == 'maintenance'
+    assert import_partner_catalog.acks_late and import_partner_catalog.time_limit == 30 * 60
+    assert not dispatch_email_outbox.acks_late and dispatch_email_outbox.time_limit == 60
+
+
+def test_notifications_are_polled_before_other_queues():
+    """
+    Порядок ключей в BRPOP транспорта Redis: сначала письма, затем прочие задачи, загрузки и обслуживание.
+    """
+    channel = SimpleNamespace(sep=RedisChannel.sep, **app.conf.broker_transport_options)
+    channel.priority = lambda n: RedisChannel.priority(channel, n)
+    tasks = [dispatch_email_outbox, queue_probe, import_partner_catalog, purge_email_outbox]
+    routes = [app.amqp.router.route({}, task.name) for task in tasks]
+    keys = [RedisChannel._q_for_pri(channel, route['queue'].name, route.get('priority', app.conf.task_default_priority))
+            for route in routes]
+    queues = [route['queue'].name for route in routes]
+    # Так kombu строит команду BRPOP: по возрастанию priority_steps, внутри шага - по очередям.
+    polled = [RedisChannel._q_for_pri(channel, queue, pri) for pri in channel.priority_steps for queue in queues]
+    assert [polled.index(key) for key in keys] == sorted(polled.index(key) for key in keys)
+    assert len(set(keys)) == len(keys)
+
+
+@pytest.mark.django_db
+def test_large_catalog_is_staged_and_queued_by_id(catalog, settings, monkeypatch, django_capture_on_commit_callbacks):
+    """
+    Большой каталог сохраняется в CatalogImport, в брокер уходит только id записи: даты YAML
+    не проходят через сериализатор kombu. Повторная доставка задачи не загружает каталог снова.
+    """
+    settings.PARTNER_IMPORT_ASYNC_THRESHOLD = 1
+    sent = []
+    monkeypatch.setattr(import_partner_catalog, 'delay', lambda *args: sent.append(args))
+    first, second = catalog
+    content = '\n'.join([
+        'shop: Связной',
+        'updated: 2024-05-01',
+        'categories:',
+        f'  - {{id: {first.category_id}, name: Смартфоны}}',
+        'goods:',
+        *(f'  - {{id: {product.pk}, category: {product.category_id}, model: {product.model}, name: Новый {product.pk}, '
+          f'price: 10, quantity: 3, parameters: {{}}}}' for product in catalog),
+    ]).encode()
+
+    client = APIClient()
+    client.force_authenticate(User.objects.get(email='test_shop@oknhwe.com'))
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post('/update/', {'file': SimpleUploadedFile('shop.yaml', content)}, format='multipart')
+    assert response.status_code == 202
+    staged = CatalogImport.objects.get()
+    assert sent == [(staged.pk,)]
+    assert Product.objects.get(pk=first.pk).name == first.name
+
+    assert import_partner_catalog(*sent[0]) == CatalogImport.DONE
+    assert import_partner_catalog(*sent[0]) is None
+    staged.refresh_from_db()
+    assert (staged.status, bytes(staged.content), staged.finished_at is not None) == (CatalogImport.DONE, b'', True)
+    assert sorted(Product.objects.values_list('name', flat=True)) == [f'Новый {first.pk}', f'Новый {second.pk}']
@@ -0,0 +1,77 @@
+"""
+Тесты троттлинга.
+"""
+from io import StringIO
+
+import pytest
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+
+from rest_framework.test import APIRequestFactory
+
+from marketAPI.throttling import AnonRateThrottle, UserRateThrottle
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+def test_throttle_keeps_drf_scopes_and_rates():
+    """
+    Классы сохраняют области и частоты DEFAULT_THROTTLE_RATES; без Redis работают как в DRF.
+    """
+    assert AnonRateThrottle().rate == '30/minute'
+    assert UserRateThrottle().rate == '60/minute'
+
+    request = APIRequestFactory().get('/products/', REMOTE_ADDR='10.0.0.1')
+    request.user = AnonymousUser()
+    results = [AnonRateThrottle().allow_request(request, None) for _ in range(31)]
+    assert results == [True] * 30 + [False]
+
+    throttle = AnonRateThrottle()
+    assert not throttle.allow_request(request, None)
+    assert 0 < throttle.wait() <= 60
+
+
+def test_sliding_window_does_not_share_drf_history_key(monkeypatch):
+    """
+    Окно в Redis хранится под своим ключом: под ключом DRF может лежать список времён запросов.
+    """
+    calls = []
+
+    def script(keys, args):
+        calls.append(keys)
+        return 1, 0
+
+    request = APIRequestFactory().get('/products/', REMOTE_ADDR='10.0.0.1')
+    request.user = AnonymousUser()
+    throttle = AnonRateThrottle()
+    monkeypatch.setattr(AnonRateThrottle, '_get_script', lambda self: script)
+    assert throttle.allow_request(request, None)
+
+    assert calls == [[cache.make_key('throttle_sw:' + throttle.key)]]
+    assert calls[0][0] != cache.make_key(throttle.key)
+
+
+def test_bench_throttles_resets_window_between_phases(monkeypatch):
+    """
+    bench_throttles очищает окно перед каждым этапом: при параллельной нагрузке пропускается ровно лимит.
+    """
+    def script(keys, args):
+        # Окно в кэше под ключом без префикса версии, как его удаляет cache.delete().
+        key = keys[0].split(':', 2)[2]
+        window = cache.get(key, 0)
+        if window >= int(args[1]):
+            return 0, 1000000
+        cache.set(key, window + 1)
+        return 1, 0
+
+    monkeypatch.setattr(AnonRateThrottle, '_get_script', lambda self: script)
+    out = StringIO()
+    call_command('bench_throttles', requests=20, limit=5, threads=1, stdout=out)
+    lines = out.getvalue().splitlines()
+    assert [line.split(': ', 1)[0] for line in lines[1:]] == ['drf', 'redis']
+    assert all(line.endswith('5 of 15 concurrent requests allowed with limit 5') for line in lines[1:])